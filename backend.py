@@ -1,7 +1,11 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, url_for
 import os
+import threading
+import uuid
+from werkzeug.utils import secure_filename
 from moviepy.video.io.VideoFileClip import VideoFileClip
 from backend.main import SubtitleRemover
+from backend.tools.job_queue import JobStore, JobRunner, FINISHED_STATUSES, STATUS_DONE
 
 app = Flask(__name__)
 
@@ -11,6 +15,18 @@ PROCESSED_FOLDER = 'processed'
 os.makedirs(TEMP_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# 上传时每次写入磁盘的数据块大小
+CHUNK_SIZE = 1024 * 1024
+# 同时处理的视频数量，其余任务排队等待
+MAX_WORKERS = 1
+# 任务表，服务重启后排队中的任务继续处理
+JOB_DB_PATH = 'jobs.db'
+# 处理完成的任务及结果文件保留时间（秒），以及最多保留的数量
+RESULT_RETENTION = 24 * 3600
+MAX_RETAINED_RESULTS = 100
+# 处理过程中更新任务进度的间隔（秒）
+PROGRESS_INTERVAL = 1
+
 
 def compress_video(input_path, output_path, target_size_mb=20, resolution=(720, 1280), fps=30):
     """
@@ -35,59 +51,186 @@ def compress_video(input_path, output_path, target_size_mb=20, resolution=(720,
         raise RuntimeError(f"Video compression failed: {str(e)}")
 
 
-def process_video(video_path, output_path):
+def process_video(video_path, output_path, ctx=None):
     """
     使用 SubtitleRemover 处理视频，并进行压缩。
+    :param ctx 任务上下文(job_queue.JobContext)，用于汇报进度与检查取消，去字幕占进度的90%，压缩占10%
     """
     subtitle_area=(0.64375, 0.1625, 0.0, 1.0)
     subtitle_remover = SubtitleRemover(video_path,subtitle_area)
-    subtitle_remover.run()
+    finished = threading.Event()
+
+    def report_progress():
+        while not finished.wait(PROGRESS_INTERVAL):
+            ctx.progress(getattr(subtitle_remover, 'progress_total', 0) * 0.9)
+
+    if ctx is not None:
+        threading.Thread(target=report_progress, daemon=True).start()
+    try:
+        subtitle_remover.run()
+    finally:
+        finished.set()
 
     processed_video_path = subtitle_remover.video_out_name
     if not os.path.exists(processed_video_path):
         raise FileNotFoundError("Subtitle removal failed. Processed file not found.")
 
+    if ctx is not None:
+        # 去字幕无法中途停止，在压缩前检查是否已取消
+        ctx.check_cancelled()
+        ctx.progress(90)
     compress_video(processed_video_path, output_path, target_size_mb=20, resolution=(720, 1280), fps=30)
     return output_path
 
 
-@app.route('/process', methods=['POST'])
-def process():
+def create_worker():
     """
-    API 接口：接收文件，处理后返回处理后的视频文件。
+    每个工作线程调用一次，返回该线程的处理函数。
+    注意：SubtitleRemover的构造函数需要传入视频路径，模型随实例一起加载，无法在任务之间复用，
+    因此目前每个任务仍会重新创建SubtitleRemover并加载模型，工作线程只限制了同时处理的任务数量。
+    SubtitleRemover支持先加载模型、再按任务传入视频后，可以在这里创建一次并传给process_video。
     """
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
+    def process(job, ctx):
+        process_video(job['input_path'], job['output_path'], ctx)
+    return process
 
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
 
-    # 创建临时文件
-    input_path = os.path.join(TEMP_FOLDER, file.filename)
+RUNNER = None
+RUNNER_LOCK = threading.Lock()
 
-    # 保存上传的文件
-    file.save(input_path)
 
-    try:
-        # 调用视频处理函数
-        compressed_video_path = process_video(input_path, os.path.join(PROCESSED_FOLDER, file.filename))
+def get_runner():
+    """
+    第一次调用时启动工作线程（debug模式下只在实际处理请求的子进程中启动）。
+    """
+    global RUNNER
+    with RUNNER_LOCK:
+        if RUNNER is None:
+            RUNNER = JobRunner(JobStore(JOB_DB_PATH), create_worker, num_workers=MAX_WORKERS,
+                               retention=RESULT_RETENTION, max_finished=MAX_RETAINED_RESULTS)
+            RUNNER.start()
+        return RUNNER
 
-        # 返回处理后的视频
-        return send_file(compressed_video_path, as_attachment=True)
 
-    except FileNotFoundError as e:
-        return jsonify({'error': str(e)}), 500
+def save_stream(stream, output_path):
+    """
+    分块将上传数据写入磁盘，不在内存中保存整个文件。
+    """
+    size = 0
+    with open(output_path, 'wb') as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def job_response(job):
+    job_id = job['id']
+    response = {'job_id': job_id, 'status': job['status'], 'filename': job['filename'],
+                'progress': round(job['progress'], 1), 'created': job['created'], 'updated': job['updated'],
+                'status_url': url_for('job_status', job_id=job_id)}
+    if job['status'] == STATUS_DONE:
+        response['result_url'] = url_for('job_result', job_id=job_id)
+    if job.get('error'):
+        response['error'] = job['error']
+    return response
 
-    except Exception as e:
-        return jsonify({'error': f"Unexpected error occurred: {str(e)}"}), 500
 
-    finally:
-        # 清理临时文件
+@app.route('/process', methods=['POST'])
+def process():
+    """
+    API 接口：接收文件并加入处理队列，立即返回任务id。
+    支持两种上传方式：
+    1. multipart/form-data，文件字段名为file
+    2. 请求体为文件内容(可使用chunked传输)，文件名通过X-Filename请求头或filename参数指定
+    处理进度通过 GET /jobs/<job_id> 查询，处理完成后通过 GET /jobs/<job_id>/result 下载(支持Range断点续传)。
+    """
+    if request.mimetype == 'multipart/form-data':
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        file = request.files['file']
+        filename, stream = file.filename, file.stream
+    else:
+        filename, stream = request.headers.get('X-Filename') or request.args.get('filename'), request.stream
+    filename = secure_filename(filename or '')
+    if filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+
+    # 任务id作为文件名前缀，避免同名文件互相覆盖
+    job_id = uuid.uuid4().hex
+    input_path = os.path.join(TEMP_FOLDER, f'{job_id}_{filename}')
+    output_path = os.path.join(PROCESSED_FOLDER, f'{job_id}_{filename}')
+    try:
+        # 保存上传的文件
+        size = save_stream(stream, input_path)
+    except Exception as e:
         if os.path.exists(input_path):
             os.remove(input_path)
+        return jsonify({'error': f"Upload failed: {str(e)}"}), 400
+    if size == 0:
+        os.remove(input_path)
+        return jsonify({'error': 'Empty file'}), 400
+
+    job = get_runner().submit(filename, input_path, output_path, job_id)
+    return jsonify(job_response(job)), 202
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+    API 接口：最近的任务列表，可通过status参数筛选。
+    """
+    jobs = get_runner().store.list(request.args.get('status'), request.args.get('limit', 100, type=int))
+    return jsonify([job_response(job) for job in jobs])
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    API 接口：查询任务状态与进度，status为queued, running, cancelling, done, failed或cancelled。
+    """
+    job = get_runner().store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    API 接口：取消任务，排队中的任务立即取消，处理中的任务在当前阶段结束后停止。
+    """
+    job = get_runner().store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in FINISHED_STATUSES:
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    return jsonify(job_response(get_runner().cancel(job_id)))
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """
+    API 接口：下载处理后的视频，分块传输，支持Range请求。
+    """
+    job = get_runner().store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != STATUS_DONE:
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+    if not os.path.exists(job['output_path']):
+        return jsonify({'error': 'Processed file not found'}), 410
+    # conditional=True时支持Range与If-Range请求
+    return send_file(os.path.abspath(job['output_path']), as_attachment=True, download_name=job['filename'],
+                     conditional=True)
 
 
 if __name__ == '__main__':
     print("Backend service running on http://127.0.0.1:5000")
+    # debug模式下reloader的父进程只负责监视文件变化，工作线程在子进程中启动
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        get_runner()
     app.run(debug=True, port=5000)
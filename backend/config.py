@@ -10,31 +10,17 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 import configparser
 import os
 import re
-import time
+from functools import cached_property
 from pathlib import Path
-from fsplit.filesplit import Filesplit
-import paddle
 from tools.constant import *
 
 
 # 项目的base目录
 BASE_DIR = str(Path(os.path.abspath(__file__)).parent)
 
-# ×××××××××××××××××××× [不要改]读取配置文件 start ××××××××××××××××××××
-# 读取settings.ini配置
-settings_config = configparser.ConfigParser()
+# ×××××××××××××××××××× [不要改]配置文件路径 start ××××××××××××××××××××
+# settings.ini配置
 MODE_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'settings.ini')
-if not os.path.exists(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'settings.ini')):
-    # 如果没有配置文件，默认使用中文
-    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'settings.ini'), mode='w', encoding='utf-8') as f:
-        f.write('[DEFAULT]\n')
-        f.write('Interface = 简体中文\n')
-        f.write('Language = ch\n')
-        f.write('Mode = fast')
-settings_config.read(MODE_CONFIG_PATH, encoding='utf-8')
-
-# 读取interface下的语言配置,e.g. ch.ini
-interface_config = configparser.ConfigParser()
 INTERFACE_KEY_NAME_MAP = {
     '简体中文': 'ch',
     '繁體中文': 'chinese_cht',
@@ -44,10 +30,7 @@ INTERFACE_KEY_NAME_MAP = {
     'Tiếng Việt': 'vi',
     'Español': 'es'
 }
-interface_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interface',
-                              f"{INTERFACE_KEY_NAME_MAP[settings_config['DEFAULT']['Interface']]}.ini")
-interface_config.read(interface_file, encoding='utf-8')
-# ×××××××××××××××××××× [不要改]读取配置文件 end ××××××××××××××××××××
+# ×××××××××××××××××××× [不要改]配置文件路径 end ××××××××××××××××××××
 
 
 # ×××××××××××××××××××× [不要改]判断程序运行路径是否合法 start ××××××××××××××××××××
@@ -60,54 +43,21 @@ if re.search(r"[\u4e00-\u9fa5]+", BASE_DIR):
 # 如果路径包含空格，设置路径为非法
 if re.search(r"\s", BASE_DIR):
     IS_LEGAL_PATH = False
-# 如果为程序存放在非法路径则一直提示用户路径不合法
-while not IS_LEGAL_PATH:
-    print(interface_config['Main']['IllegalPathWarning'])
-    time.sleep(3)
 # ×××××××××××××××××××× [不要改]判断程序运行路径是否合法 end ××××××××××××××××××××
 
 
-# ×××××××××××××××××××× [不要改]判断是否使用GPU start ××××××××××××××××××××
-# 是否使用GPU
-USE_GPU = False
-# 如果paddlepaddle编译了gpu的版本
-if paddle.is_compiled_with_cuda():
-    # 查看是否有可用的gpu
-    if len(paddle.static.cuda_places()) > 0:
-        # 如果有GPU则使用GPU
-        USE_GPU = True
-# ×××××××××××××××××××× [不要改]判断是否使用GPU start ××××××××××××××××××××
-
-
-# ×××××××××××××××××××× [不要改]读取语言、模型路径、字典路径 start ××××××××××××××××××××
-# 设置识别语言
-REC_CHAR_TYPE = settings_config['DEFAULT']['Language']
-
-# 设置识别模式
-MODE_TYPE = settings_config['DEFAULT']['Mode']
-ACCURATE_MODE_ON = False
-if MODE_TYPE == 'accurate':
-    ACCURATE_MODE_ON = True
-if MODE_TYPE == 'fast':
-    ACCURATE_MODE_ON = False
-if MODE_TYPE == 'auto':
-    if USE_GPU:
-        ACCURATE_MODE_ON = True
-    else:
-        ACCURATE_MODE_ON = False
-# 模型文件目录
-# 默认模型版本 V4
-MODEL_VERSION = 'V4'
+# ×××××××××××××××××××× [不要改]模型、字典目录与语言列表 start ××××××××××××××××××××
 # 文本检测模型
 DET_MODEL_BASE = os.path.join(BASE_DIR, 'models')
 # 设置文本识别模型 + 字典
 REC_MODEL_BASE = os.path.join(BASE_DIR, 'models')
 # 默认字典路径为中文
 DICT_BASE = os.path.join(BASE_DIR, 'ppocr', 'utils', 'dict')
-# V3, V4模型默认图形识别的shape为3, 48, 320
-REC_IMAGE_SHAPE = '3,48,320'
-REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_det')
+# 默认模型版本 V4
+DEFAULT_MODEL_VERSION = 'V4'
+DET_MODEL_FAST_PATH = os.path.join(DET_MODEL_BASE, DEFAULT_MODEL_VERSION, 'ch_det_fast')
+# 模型分片合并后的缓存目录，与模型目录位于同一文件系统时可以硬链接，不占用额外空间
+MODEL_CACHE_DIR = os.path.join(BASE_DIR, 'models', '.cache')
 
 LATIN_LANG = [
     'af', 'az', 'bs', 'cs', 'cy', 'da', 'de', 'es', 'et', 'fr', 'ga', 'hr',
@@ -130,86 +80,249 @@ OTHER_LANG = [
 ]
 MULTI_LANG = LATIN_LANG + ARABIC_LANG + CYRILLIC_LANG + DEVANAGARI_LANG + \
              OTHER_LANG
-
-# 定义字典路径
-DICT_PATH = os.path.join(DICT_BASE, f'{REC_CHAR_TYPE}_dict.txt')
-DET_MODEL_FAST_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-
-
-# 如果设置了识别文本语言类型，则设置为对应的语言
-if REC_CHAR_TYPE in MULTI_LANG:
-    # 定义文本检测与识别模型
-    # 使用快速模式时，调用轻量级模型
-    if MODE_TYPE == 'fast':
-        DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    # 使用自动模式时，检测有没有使用GPU，根据GPU判断模型
-    elif MODE_TYPE == 'auto':
-        # 如果使用GPU，则使用大模型
-        if USE_GPU:
-            DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
-            # 英文模式的ch模型识别效果好于fast
-            if REC_CHAR_TYPE == 'en':
-                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'ch_rec')
-                DICT_PATH = os.path.join(DICT_BASE, f'ch_dict.txt')
+# ×××××××××××××××××××× [不要改]模型、字典目录与语言列表 end ××××××××××××××××××××
+
+
+# ×××××××××××××××××××× [不要改]按需解析的配置 start ××××××××××××××××××××
+# 是否有可用GPU，每个进程只探测一次
+_use_gpu = None
+
+
+def detect_gpu():
+    """
+    判断是否使用GPU，仅在第一次调用时导入paddle
+    """
+    global _use_gpu
+    if _use_gpu is None:
+        import paddle
+        _use_gpu = False
+        # 如果paddlepaddle编译了gpu的版本
+        if paddle.is_compiled_with_cuda():
+            # 查看是否有可用的gpu
+            if len(paddle.static.cuda_places()) > 0:
+                # 如果有GPU则使用GPU
+                _use_gpu = True
+    return _use_gpu
+
+
+def merge_model_shards(model_dir):
+    """
+    查看该路径下是否有模型完整文件，没有的话合并小文件生成完整文件
+    合并结果缓存在MODEL_CACHE_DIR中并校验大小与哈希，多进程同时启动时只合并一次(见tools/model_assets.py)
+    """
+    from tools.model_assets import ModelAssetManager
+    ModelAssetManager(MODEL_CACHE_DIR).ensure(model_dir)
+
+
+class Settings:
+    """
+    依赖settings.ini与运行环境的配置项，首次访问时才解析并缓存：
+    读取界面语言配置、判断是否使用GPU、确定模型与字典路径(必要时合并模型文件)
+    通过 config.XXX 访问，e.g. config.USE_GPU, config.REC_MODEL_PATH
+    """
+
+    @cached_property
+    def settings_config(self):
+        settings_config = configparser.ConfigParser()
+        if not os.path.exists(MODE_CONFIG_PATH):
+            # 如果没有配置文件，默认使用中文
+            with open(MODE_CONFIG_PATH, mode='w', encoding='utf-8') as f:
+                f.write('[DEFAULT]\n')
+                f.write('Interface = 简体中文\n')
+                f.write('Language = ch\n')
+                f.write('Mode = fast')
+        settings_config.read(MODE_CONFIG_PATH, encoding='utf-8')
+        return settings_config
+
+    @cached_property
+    def interface_config(self):
+        # 读取interface下的语言配置,e.g. ch.ini
+        interface_config = configparser.ConfigParser()
+        interface_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interface',
+                                      f"{INTERFACE_KEY_NAME_MAP[self.settings_config['DEFAULT']['Interface']]}.ini")
+        interface_config.read(interface_file, encoding='utf-8')
+        return interface_config
+
+    @property
+    def USE_GPU(self):
+        return detect_gpu()
+
+    @cached_property
+    def REC_CHAR_TYPE(self):
+        # 设置识别语言
+        return self.settings_config['DEFAULT']['Language']
+
+    @cached_property
+    def MODE_TYPE(self):
+        # 设置识别模式
+        return self.settings_config['DEFAULT']['Mode']
+
+    @cached_property
+    def ACCURATE_MODE_ON(self):
+        if self.MODE_TYPE == 'accurate':
+            return True
+        if self.MODE_TYPE == 'auto':
+            return self.USE_GPU
+        return False
+
+    @cached_property
+    def models(self):
+        """
+        确定模型版本、文本检测与识别模型路径、字典路径以及识别模型输入shape
+        """
+        REC_CHAR_TYPE = self.REC_CHAR_TYPE
+        MODE_TYPE = self.MODE_TYPE
+        MODEL_VERSION = DEFAULT_MODEL_VERSION
+        # V3, V4模型默认图形识别的shape为3, 48, 320
+        REC_IMAGE_SHAPE = '3,48,320'
+        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
+        DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_det')
+        # 定义字典路径
+        DICT_PATH = os.path.join(DICT_BASE, f'{REC_CHAR_TYPE}_dict.txt')
+
+        # 如果设置了识别文本语言类型，则设置为对应的语言
+        if REC_CHAR_TYPE in MULTI_LANG:
+            # 定义文本检测与识别模型
+            # 使用快速模式时，调用轻量级模型
+            if MODE_TYPE == 'fast':
+                DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
+            # 使用自动模式时，检测有没有使用GPU，根据GPU判断模型
+            elif MODE_TYPE == 'auto':
+                # 如果使用GPU，则使用大模型
+                if self.USE_GPU:
+                    DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
+                    # 英文模式的ch模型识别效果好于fast
+                    if REC_CHAR_TYPE == 'en':
+                        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'ch_rec')
+                        DICT_PATH = os.path.join(DICT_BASE, f'ch_dict.txt')
+                    else:
+                        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
+                else:
+                    DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
+                    REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
             else:
+                DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
                 REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-        else:
-            DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-            REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    else:
-        DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-    # 如果默认版本(V4)没有大模型，则切换为默认版本(V4)的fast模型
-    if not os.path.exists(REC_MODEL_PATH):
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    # 如果默认版本(V4)既没有大模型，又没有fast模型，则使用V3版本的大模型
-    if not os.path.exists(REC_MODEL_PATH):
-        MODEL_VERSION = 'V3'
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-    # 如果V3版本没有大模型，则使用V3版本的fast模型
-    if not os.path.exists(REC_MODEL_PATH):
-        MODEL_VERSION = 'V3'
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-
-    if REC_CHAR_TYPE in LATIN_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'latin_rec_fast')
-        DICT_PATH = os.path.join(DICT_BASE, f'latin_dict.txt')
-    elif REC_CHAR_TYPE in ARABIC_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'arabic_rec_fast')
-        DICT_PATH = os.path.join(DICT_BASE, f'arabic_dict.txt')
-    elif REC_CHAR_TYPE in CYRILLIC_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'cyrillic_rec_fast')
-        DICT_PATH = os.path.join(DICT_BASE, f'cyrillic_dict.txt')
-    elif REC_CHAR_TYPE in DEVANAGARI_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'devanagari_rec_fast')
-        DICT_PATH = os.path.join(DICT_BASE, f'devanagari_dict.txt')
-
-    # 定义图像识别shape
-    if MODEL_VERSION == 'V2':
-        REC_IMAGE_SHAPE = '3,32,320'
-    else:
-        REC_IMAGE_SHAPE = '3,48,320'
+            # 如果默认版本(V4)没有大模型，则切换为默认版本(V4)的fast模型
+            if not os.path.exists(REC_MODEL_PATH):
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
+            # 如果默认版本(V4)既没有大模型，又没有fast模型，则使用V3版本的大模型
+            if not os.path.exists(REC_MODEL_PATH):
+                MODEL_VERSION = 'V3'
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
+            # 如果V3版本没有大模型，则使用V3版本的fast模型
+            if not os.path.exists(REC_MODEL_PATH):
+                MODEL_VERSION = 'V3'
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
+
+            if REC_CHAR_TYPE in LATIN_LANG:
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'latin_rec_fast')
+                DICT_PATH = os.path.join(DICT_BASE, f'latin_dict.txt')
+            elif REC_CHAR_TYPE in ARABIC_LANG:
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'arabic_rec_fast')
+                DICT_PATH = os.path.join(DICT_BASE, f'arabic_dict.txt')
+            elif REC_CHAR_TYPE in CYRILLIC_LANG:
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'cyrillic_rec_fast')
+                DICT_PATH = os.path.join(DICT_BASE, f'cyrillic_dict.txt')
+            elif REC_CHAR_TYPE in DEVANAGARI_LANG:
+                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'devanagari_rec_fast')
+                DICT_PATH = os.path.join(DICT_BASE, f'devanagari_dict.txt')
+
+            # 定义图像识别shape
+            if MODEL_VERSION == 'V2':
+                REC_IMAGE_SHAPE = '3,32,320'
+            else:
+                REC_IMAGE_SHAPE = '3,48,320'
+
+            merge_model_shards(REC_MODEL_PATH)
+            merge_model_shards(DET_MODEL_PATH)
+        return {
+            'MODEL_VERSION': MODEL_VERSION,
+            'REC_IMAGE_SHAPE': REC_IMAGE_SHAPE,
+            'REC_MODEL_PATH': REC_MODEL_PATH,
+            'DET_MODEL_PATH': DET_MODEL_PATH,
+            'DICT_PATH': DICT_PATH,
+        }
+
 
-    # 查看该路径下是否有文本模型识别完整文件，没有的话合并小文件生成完整文件
-    if 'inference.pdiparams' not in (os.listdir(REC_MODEL_PATH)):
-        fs = Filesplit()
-        fs.merge(input_dir=REC_MODEL_PATH)
-    # 查看该路径下是否有文本模型识别完整文件，没有的话合并小文件生成完整文件
-    if 'inference.pdiparams' not in (os.listdir(DET_MODEL_PATH)):
-        fs = Filesplit()
-        fs.merge(input_dir=DET_MODEL_PATH)
-# ×××××××××××××××××××× [不要改]读取语言、模型路径、字典路径 end ××××××××××××××××××××
+# 通过 config.XXX 访问的按需解析配置项
+LAZY_SETTINGS = ('settings_config', 'interface_config', 'USE_GPU', 'REC_CHAR_TYPE', 'MODE_TYPE', 'ACCURATE_MODE_ON')
+LAZY_MODEL_SETTINGS = ('MODEL_VERSION', 'REC_IMAGE_SHAPE', 'REC_MODEL_PATH', 'DET_MODEL_PATH', 'DICT_PATH')
+
+_settings = None
+
+
+def get_settings():
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
+
+
+def reload_settings():
+    """
+    重新读取settings.ini(e.g. 界面中修改了识别语言或模式后)，GPU探测结果保留
+    """
+    global _settings
+    _settings = Settings()
+    return _settings
+
+
+def check_legal_path():
+    """
+    程序存放在非法路径时抛出异常，提示用户移动程序
+    """
+    if not IS_LEGAL_PATH:
+        raise RuntimeError(get_settings().interface_config['Main']['IllegalPathWarning'])
+
+
+def __getattr__(name):
+    if name in LAZY_SETTINGS:
+        return getattr(get_settings(), name)
+    if name in LAZY_MODEL_SETTINGS:
+        return get_settings().models[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+# ×××××××××××××××××××× [不要改]按需解析的配置 end ××××××××××××××××××××
 
 
 # --------------------- 请根据自己的实际情况改 start-----------------
 # 是否生成TXT文本字幕
 GENERATE_TXT = True
+# 输出的字幕格式，可选: srt, vtt(WebVTT), ass, txt, jsonl(每行一个JSON, 包含index, start, end(毫秒), text)
+# 字幕文件与视频同名，保存在视频所在目录
+SUBTITLE_FORMATS = ['srt']
 
 # 每张图中同时识别6个文本框中的文本，GPU显存越大，该数值可以设置越大
 REC_BATCH_NUM = 6
 # DB算法每个batch识别多少张，默认为10
 MAX_BATCH_SIZE = 10
+# 视频帧提取与OCR识别并行，识别线程把等待中的视频帧合并为一批(最多MAX_BATCH_SIZE张)，
+# 收到第一帧后最多等待该时间(秒)以凑齐一批
+OCR_BATCH_MAX_WAIT = 0.01
+
+# OCR模型服务地址，多个字幕提取任务共享同一份已加载的模型(需先运行 python tools/ocr_server.py 启动服务)
+# Linux/macOS为Unix socket路径, e.g. '/tmp/vse_ocr.sock'，Windows为命名管道, e.g. r'\\.\pipe\vse_ocr'
+# 为None或服务不可用时，在字幕提取进程中加载模型
+OCR_SERVER_ADDRESS = None
+# 服务端将不同任务的请求合并批处理：每批最多合并的图片数，以及收到第一个请求后最多等待的时间(秒)
+OCR_SERVER_MAX_BATCH = 8
+OCR_SERVER_MAX_WAIT = 0.01
+
+# 推理参数调优结果(由 python tools/benchmark/autotune.py 生成)
+# 文件存在且与当前模型、设备一致时，启动时用其中的cpu_threads、enable_mkldnn、rec_batch_num、det_limit_side_len覆盖默认值
+# 设置为None则不加载
+TUNE_PROFILE_PATH = os.path.join(BASE_DIR, 'tune_profile.json')
+
+# DB文本检测后处理使用连通域(connectedComponentsWithStats)代替轮廓查找文本框，文本框较多时更快
+# 检测框与默认方式略有差异(IoU >= 0.8)，可能影响字幕去重与区域过滤，默认关闭
+DET_DB_USE_COMPONENTS = False
+
+# 使用VideoSubFinder提取字幕帧时，直接识别VSF保存的字幕区域图片(RGBImages)，不再从视频中解码对应的视频帧
+# VSF没有保存图片时自动回退为解码视频帧
+VSF_OCR_ON_IMAGES = True
+# 并行读取VSF字幕帧图片的线程数
+VSF_IMAGE_READ_THREADS = 4
 
 # 默认字幕出现区域为下方
 DEFAULT_SUBTITLE_AREA = SubtitleArea.UNKNOWN
@@ -230,9 +343,12 @@ WATERMARK_AREA_NUM = 5
 # 文本相似度阈值
 # 用于去重时判断两行字幕是不是同一行，这个值越高越严格。 e.g. 0.99表示100个字里面有99各个字一模一样才算相似
 # 采用动态算法实现相似度阈值判断: 对于短文本要求较低的阈值，对于长文本要求较高的阈值
-# 如：文本较短，人民、入民，0.5就算相似
+# 如：文本较短，人民、入民，0.5就算相似(短文本允许一个字不同，阈值不低于0.5，见tools/similarity.py)
 THRESHOLD_TEXT_SIMILARITY = 0.8
 
+# 是否将同一条字幕多帧的识别结果按置信度逐字投票融合，关闭时取识别出的最长文本
+TEXT_FUSION = True
+
 # 字幕提取中置信度低于0.75的不要
 DROP_SCORE = 0.75
 
@@ -245,12 +361,20 @@ DEBUG_OCR_LOSS = False
 # 是否不删除缓存数据，以方便调试
 DEBUG_NO_DELETE_CACHE = False
 
+# 是否记录各阶段耗时, 开启后在字幕文件旁输出 视频名.profile.json(耗时报告) 与 视频名.trace.json(可用chrome://tracing打开)
+PROFILE = False
+
 # 是否删除空时间轴
 DELETE_EMPTY_TIMESTAMP = True
 
 # 是否重新分词, 用于解决没有语句没有空格
 WORD_SEGMENTATION = True
 
+# 文本框阅读顺序: horizontal_ltr(横排从左到右), horizontal_rtl(横排从右到左, 如阿拉伯语),
+# vertical_rtl(竖排从右到左, 如日文竖排字幕), vertical_ltr(竖排从左到右)
+# 为None时根据识别语言自动选择
+READING_ORDER = None
+
 # --------------------- 请根据自己的实际情况改 end-----------------------------
 
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
@@ -13,25 +13,21 @@ import unicodedata
 from threading import Thread
 from pathlib import Path
 import cv2
-from Levenshtein import ratio
 from PIL import Image
 from numpy import average, dot, linalg
 from tqdm import tqdm
 import sys
 
 sys.path.insert(0, os.path.dirname(__file__))
-import importlib
 import config
-from tools import reformat
-from tools.infer import utility
-from tools.infer.predict_det import TextDetector
-from tools.ocr import OcrRecogniser, get_coordinates
+from tools.ocr import get_coordinates
+from tools import ocr_server
+from tools import instrument
 from tools import subtitle_ocr
 import threading
 import platform
 import multiprocessing
 import time
-import pysrt
 
 
 class SubtitleDetect:
@@ -40,11 +36,15 @@ class SubtitleDetect:
     """
 
     def __init__(self):
+        # paddle只在需要文本检测时导入
+        from tools.infer import utility
+        from tools.infer.predict_det import TextDetector
         # 获取参数对象
-        importlib.reload(config)
         args = utility.parse_args()
         args.det_algorithm = 'DB'
         args.det_model_dir = config.DET_MODEL_PATH
+        args.det_db_use_components = config.DET_DB_USE_COMPONENTS
+        args.tune_profile = config.TUNE_PROFILE_PATH
         self.text_detector = TextDetector(args)
 
     def detect_subtitle(self, img):
@@ -58,7 +58,9 @@ class SubtitleExtractor:
     """
 
     def __init__(self, vd_path, sub_area=None):
-        importlib.reload(config)
+        # 重新读取settings.ini，界面中可能修改了识别语言或模式
+        config.reload_settings()
+        config.check_legal_path()
         # 线程锁
         self.lock = threading.RLock()
         # 用户指定的字幕区域位置
@@ -120,6 +122,10 @@ class SubtitleExtractor:
         self.vsf_running = False
         # 用于通知任务完成
         self.completed_event = threading.Event()  
+        # 指定视频帧提取方式: fps, det, vsf, 为None时根据平台与配置自动选择
+        self.extract_mode = None
+        # 是否记录各阶段耗时
+        self.profile = config.PROFILE
 
     def run(self):
         """
@@ -129,6 +135,10 @@ class SubtitleExtractor:
         start_time = time.time()
         self.completed_event.clear()  # 重置事件
         self.lock.acquire()
+        # 重置性能埋点
+        inst = instrument.get_instrument()
+        inst.reset()
+        inst.enable(self.profile)
         # 重置进度条
         self.update_progress(ocr=0, frame_extract=0)
         # 打印视频帧数与帧率
@@ -141,15 +151,11 @@ class SubtitleExtractor:
         print(config.interface_config['Main']['StartProcessFrame'])
         # 创建一个字幕OCR识别进程
         subtitle_ocr_process = self.start_subtitle_ocr_async()
-        if self.sub_area is not None:
-            if platform.system() in ['Windows', 'Linux']:
-                # 使用GPU且使用accurate模式时才开放此方法：
-                if config.USE_GPU and config.MODE_TYPE == 'accurate':
-                    self.extract_frame_by_det()
-                else:
-                    self.extract_frame_by_vsf()
-            else:
-                self.extract_frame_by_fps()
+        extract_mode = self.extract_mode if self.extract_mode is not None else self.get_extract_mode()
+        if extract_mode == 'det':
+            self.extract_frame_by_det()
+        elif extract_mode == 'vsf':
+            self.extract_frame_by_vsf()
         else:
             self.extract_frame_by_fps()
 
@@ -182,32 +188,49 @@ class SubtitleExtractor:
         # 判断是否使用了vsf提取字幕
         if self.use_vsf:
             # 如果使用了vsf提取字幕，则使用vsf的字幕生成方法
-            self.generate_subtitle_file_vsf()
+            track = self.generate_subtitle_file_vsf()
         else:
             # 如果未使用vsf提取字幕，则使用常规字幕生成方法
-            self.generate_subtitle_file()
+            track = self.generate_subtitle_file()
         if config.WORD_SEGMENTATION:
-            reformat.execute(os.path.join(os.path.splitext(self.video_path)[0] + '.srt'), config.REC_CHAR_TYPE)
+            from tools import reformat
+            reformat.normalize_track(track, config.REC_CHAR_TYPE)
+        self.save_subtitle(track)
         print(config.interface_config['Main']['FinishGenerateSub'], f"{round(time.time() - start_time, 2)}s")
+        if self.profile:
+            self.export_profile(time.time() - start_time)
         self.update_progress(ocr=100, frame_extract=100)
         self.isFinished = True
         # 删除缓存文件
         self.empty_cache()
         self.lock.release()
-        if config.GENERATE_TXT:
-            self.srt2txt(os.path.join(os.path.splitext(self.video_path)[0] + '.srt'))
         self.completed_event.set()  # 设置任务完成事件
 
+    def get_extract_mode(self):
+        """
+        根据平台与配置选择视频帧提取方式
+        """
+        if self.sub_area is not None:
+            if platform.system() in ['Windows', 'Linux']:
+                # 使用GPU且使用accurate模式时才开放此方法：
+                if config.USE_GPU and config.MODE_TYPE == 'accurate':
+                    return 'det'
+                else:
+                    return 'vsf'
+        return 'fps'
+
     def extract_frame_by_fps(self):
         """
         根据帧率，定时提取视频帧，容易丢字幕，但速度快，将提取到的视频帧加入ocr识别任务队列
         """
         # 删除缓存
         self.__delete_frame_cache()
+        inst = instrument.get_instrument()
         # 当前视频帧的帧号
         current_frame_no = 0
         while self.video_cap.isOpened():
-            ret, frame = self.video_cap.read()
+            with inst.span(instrument.SPAN_DECODE):
+                ret, frame = self.video_cap.read()
             # 如果读取视频帧失败（视频读到最后一帧）
             if not ret:
                 break
@@ -216,12 +239,14 @@ class SubtitleExtractor:
                 current_frame_no += 1
                 # subtitle_ocr_task_queue: (total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间，subtitle_area字幕区域)
                 task = (self.frame_count, current_frame_no, None, None, None, self.default_subtitle_area)
-                self.subtitle_ocr_task_queue.put(task)
+                self.put_ocr_task(task)
                 # 跳过剩下的帧
                 for i in range(int(self.fps // config.EXTRACT_FREQUENCY) - 1):
-                    ret, _ = self.video_cap.read()
+                    with inst.span(instrument.SPAN_DECODE):
+                        ret, _ = self.video_cap.read()
                     if ret:
                         current_frame_no += 1
+                        inst.count(instrument.COUNTER_FRAMES_SKIPPED)
                         # 更新进度条
                         self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
 
@@ -248,9 +273,11 @@ class SubtitleExtractor:
         start_end_frame_no = []
         start_frame = None
         if self.ocr is None:
-            self.ocr = OcrRecogniser()
+            self.ocr = ocr_server.get_recogniser(config.OCR_SERVER_ADDRESS)
+        inst = instrument.get_instrument()
         while self.video_cap.isOpened():
-            ret, frame = self.video_cap.read()
+            with inst.span(instrument.SPAN_DECODE):
+                ret, frame = self.video_cap.read()
             # 如果读取视频帧失败（视频读到最后一帧）
             if not ret:
                 break
@@ -329,27 +356,27 @@ class SubtitleExtractor:
 
             while len(ocr_args_list) > 1:
                 total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
-                if current_frame_no in compare_ocr_result_cache:
-                    predict_result = compare_ocr_result_cache[current_frame_no]
+                if ocr_info_frame_no in compare_ocr_result_cache:
+                    predict_result = compare_ocr_result_cache[ocr_info_frame_no]
                     dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
                 else:
                     dt_box, rec_res = None, None
                 # subtitle_ocr_task_queue: (total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间， subtitle_area字幕区域)
                 task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
                 # 添加任务
-                self.subtitle_ocr_task_queue.put(task)
+                self.put_ocr_task(task)
                 self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
 
         while len(ocr_args_list) > 0:
             total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
-            if current_frame_no in compare_ocr_result_cache:
-                predict_result = compare_ocr_result_cache[current_frame_no]
+            if ocr_info_frame_no in compare_ocr_result_cache:
+                predict_result = compare_ocr_result_cache[ocr_info_frame_no]
                 dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
             else:
                 dt_box, rec_res = None, None
             task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
             # 添加任务
-            self.subtitle_ocr_task_queue.put(task)
+            self.put_ocr_task(task)
         self.video_cap.release()
 
     def extract_frame_by_vsf(self):
@@ -357,66 +384,49 @@ class SubtitleExtractor:
        通过调用videoSubFinder获取字幕帧
        """
         self.use_vsf = True
+        from tools import vsf
+        duration_ms = (self.frame_count / self.fps) * 1000
+        last_frame = {'total_ms': 0}
+
+        rgb_images_dir = os.path.join(self.temp_output_dir, vsf.RGB_IMAGES_DIR)
+        # 不识别VSF图片时不需要查找命令行输出的帧对应的图片
+        image_index = vsf.RGBImageWatcher(rgb_images_dir) if config.VSF_OCR_ON_IMAGES else None
 
-        def count_process():
-            duration_ms = (self.frame_count / self.fps) * 1000
-            last_total_ms = 0
-            processed_image = set()
-            rgb_images_path = os.path.join(self.temp_output_dir, 'RGBImages')
-            while self.vsf_running and not self.isFinished:
-                # 如果还没有rgb_images_path说明vsf还没处理完
-                if not os.path.exists(rgb_images_path):
-                    # 继续等待
-                    continue
-                try:
-                    # 将列表按文件名排序
-                    rgb_images = sorted(os.listdir(rgb_images_path))
-                    for rgb_image in rgb_images:
-                        # 如果当前图片已被处理，则跳过
-                        if rgb_image in processed_image:
-                            continue
-                        processed_image.add(rgb_image)
-                        # 根据vsf生成的文件名读取时间
-                        h, m, s, ms = rgb_image.split('__')[0].split('_')
-                        total_ms = int(ms) + int(s) * 1000 + int(m) * 60 * 1000 + int(h) * 60 * 60 * 1000
-                        if total_ms > last_total_ms:
-                            frame_no = int(total_ms / self.fps)
-                            task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area)
-                            self.subtitle_ocr_task_queue.put(task)
-                        last_total_ms = total_ms
-                        if total_ms / duration_ms >= 1:
-                            self.update_progress(frame_extract=100)
-                            return
-                        else:
-                            self.update_progress(frame_extract=(total_ms / duration_ms) * 100)
-                # 文件被清理了
-                except FileNotFoundError:
+        def on_vsf_frame(name, image_path=None):
+            """
+            VSF找到一个字幕帧，加入OCR任务队列并更新进度
+            :param name VSF输出的帧名或RGBImages中的图片文件名
+            :param image_path VSF保存的字幕帧图片，OCR直接识别该图片，不再从视频中解码
+            """
+            total_ms = vsf.parse_frame_time(name)
+            if total_ms is None:
+                return
+            if total_ms > last_frame['total_ms']:
+                frame_no = int(total_ms / self.fps)
+                if image_path is None and image_index is not None:
+                    image_path = image_index.find(name)
+                task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area,
+                        image_path if config.VSF_OCR_ON_IMAGES else None)
+                self.put_ocr_task(task)
+            last_frame['total_ms'] = total_ms
+            self.update_progress(frame_extract=min(total_ms / duration_ms, 1) * 100)
+
+        def watch_rgb_images(stop_event):
+            """
+            检查VSF写入RGBImages目录的新图片
+            """
+            watcher = vsf.RGBImageWatcher(rgb_images_dir)
+            for name in watcher.watch(stop_event):
+                if self.isFinished:
                     return
+                on_vsf_frame(name, os.path.join(rgb_images_dir, name))
 
-        def vsf_output(out, ):
-            duration_ms = (self.frame_count / self.fps) * 1000
-            last_total_ms = 0
-            for line in iter(out.readline, b''):
-                line = line.decode("utf-8")
-                # print('line', line, type(line), line.startswith('Frame: '))
-                if line.startswith('Frame: '):
-                    line = line.replace("\n", "")
-                    line = line.replace("Frame: ", "")
-                    h, m, s, ms = line.split('__')[0].split('_')
-                    total_ms = int(ms) + int(s) * 1000 + int(m) * 60 * 1000 + int(h) * 60 * 60 * 1000
-                    if total_ms > last_total_ms:
-                        frame_no = int(total_ms / self.fps)
-                        task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area)
-                        self.subtitle_ocr_task_queue.put(task)
-                    last_total_ms = total_ms
-                    if total_ms / duration_ms >= 1:
-                        self.update_progress(frame_extract=100)
-                        return
-                    else:
-                        self.update_progress(frame_extract=(total_ms / duration_ms) * 100)
-                else:
-                    print(line.strip())
-            out.close()
+        def read_vsf_output(out):
+            """
+            解析VSF命令行输出的帧名，读完全部输出避免VSF阻塞
+            """
+            for name in vsf.iter_progress(out):
+                on_vsf_frame(name)
 
         # 删除缓存
         self.__delete_frame_cache()
@@ -442,23 +452,38 @@ class SubtitleExtractor:
             cmd = f"{path_vsf} --use_cuda -c -r -i \"{self.video_path}\" -o \"{self.temp_output_dir}\" -ces \"{self.vsf_subtitle}\" "
             cmd += f"-te {top_end} -be {bottom_end} -le {left_end} -re {right_end} -nthr {cpu_count} -nocrthr {cpu_count}"
             self.vsf_running = True
-            # 计算进度
-            Thread(target=count_process, daemon=True).start()
+            # VSF运行的同时把新出现的字幕帧加入OCR任务队列
+            # 上次运行遗留的图片
+            shutil.rmtree(rgb_images_dir, True)
+            stop_event = threading.Event()
+            watcher_thread = Thread(target=watch_rgb_images, daemon=True, args=(stop_event,))
+            watcher_thread.start()
             import subprocess
             subprocess.run(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            # 处理完VSF最后写入的图片再添加OCR任务结束标志
+            stop_event.set()
+            watcher_thread.join()
             self.vsf_running = False
         else:
             # 定义执行命令
             cmd = f"{path_vsf} -c -r -i \"{self.video_path}\" -o \"{self.temp_output_dir}\" -ces \"{self.vsf_subtitle}\" "
             if config.USE_GPU:
                 cmd += "--use_cuda "
-            cmd += f"-te {top_end} -be {bottom_end} -le {left_end} -re {right_end} -nthr {cpu_count} -dsi"
+            cmd += f"-te {top_end} -be {bottom_end} -le {left_end} -re {right_end} -nthr {cpu_count}"
+            if config.VSF_OCR_ON_IMAGES:
+                # VSF保存字幕帧图片供OCR直接识别，先删除上次运行遗留的图片
+                shutil.rmtree(rgb_images_dir, True)
+            else:
+                # -dsi: 不保存字幕帧图片
+                cmd += " -dsi"
             self.vsf_running = True
             import subprocess
             p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1,
                                  close_fds='posix' in sys.builtin_module_names, shell=True)
-            Thread(target=vsf_output, daemon=True, args=(p.stderr,)).start()
+            output_thread = Thread(target=read_vsf_output, daemon=True, args=(p.stderr,))
+            output_thread.start()
             p.wait()
+            output_thread.join()
             self.vsf_running = False
 
     def filter_watermark(self):
@@ -571,62 +596,66 @@ class SubtitleExtractor:
 
     def generate_subtitle_file(self):
         """
-        生成srt格式的字幕文件
+        生成字幕轨道
+        :return tools.subtitle_track.SubtitleTrack
         """
-        if not self.use_vsf:
+        from tools.subtitle_track import SubtitleTrack
+        inst = instrument.get_instrument()
+        with inst.span(instrument.SPAN_DEDUP):
             subtitle_content = self._remove_duplicate_subtitle()
-            srt_filename = os.path.join(os.path.splitext(self.video_path)[0] + '.srt')
-            # 保存持续时间不足1秒的字幕行，用于后续处理
-            post_process_subtitle = []
-            with open(srt_filename, mode='w', encoding='utf-8') as f:
-                for index, content in enumerate(subtitle_content):
-                    line_code = index + 1
-                    frame_start = self._frame_to_timecode(int(content[0]))
-                    # 比较起始帧号与结束帧号， 如果字幕持续时间不足1秒，则将显示时间设为1s
-                    if abs(int(content[1]) - int(content[0])) < self.fps:
-                        frame_end = self._frame_to_timecode(int(int(content[0]) + self.fps))
-                        post_process_subtitle.append(line_code)
-                    else:
-                        frame_end = self._frame_to_timecode(int(content[1]))
-                    frame_content = content[2]
-                    subtitle_line = f'{line_code}\n{frame_start} --> {frame_end}\n{frame_content}\n'
-                    f.write(subtitle_line)
-            print(f"[NO-VSF]{config.interface_config['Main']['SubLocation']} {srt_filename}")
-            # 返回持续时间低于1s的字幕行
-            return post_process_subtitle
+        track = SubtitleTrack()
+        for content in subtitle_content:
+            start_ms = self._frame_to_milliseconds(int(content[0]))
+            # 比较起始帧号与结束帧号， 如果字幕持续时间不足1秒，则将显示时间设为1s
+            if abs(int(content[1]) - int(content[0])) < self.fps:
+                end_ms = self._frame_to_milliseconds(int(int(content[0]) + self.fps))
+            else:
+                end_ms = self._frame_to_milliseconds(int(content[1]))
+            track.append(start_ms, end_ms, content[2].rstrip('\n'))
+        return track
 
     def generate_subtitle_file_vsf(self):
-        if not self.use_vsf:
-            return
-        subs = pysrt.open(self.vsf_subtitle)
-        sub_no_map = {}
-        for sub in subs:
-            sub.start.no = self._timestamp_to_frameno(sub.start.ordinal)
-            sub_no_map[sub.start.no] = sub
-
-        subtitle_content = self._remove_duplicate_subtitle()
+        """
+        按VSF输出的时间轴生成字幕轨道
+        :return tools.subtitle_track.SubtitleTrack
+        """
+        from tools.subtitle_track import SubtitleTrack
+        subs = SubtitleTrack.from_srt(self.vsf_subtitle)
+        start_nos = [self._timestamp_to_frameno(start) for start in subs.starts]
+        # 开始帧号 -> VSF字幕行的结束时间
+        end_ms_map = dict(zip(start_nos, subs.ends))
+
+        inst = instrument.get_instrument()
+        with inst.span(instrument.SPAN_DEDUP):
+            subtitle_content = self._remove_duplicate_subtitle()
         subtitle_content_start_map = {int(a[0]): a for a in subtitle_content}
-        final_subtitles = []
-        for sub in subs:
-            found = sub.start.no in subtitle_content_start_map
-            if found:
-                subtitle_content_line = subtitle_content_start_map[sub.start.no]
-                sub.text = subtitle_content_line[2]
-                end_no = int(subtitle_content_line[1])
-                sub.end = sub_no_map[end_no].end if end_no in sub_no_map else sub.end
-                sub.index = len(final_subtitles) + 1
-                final_subtitles.append(sub)
-
-            if not found and not config.DELETE_EMPTY_TIMESTAMP:
+        track = SubtitleTrack()
+        for start_no, start_ms, end_ms in zip(start_nos, subs.starts, subs.ends):
+            if start_no in subtitle_content_start_map:
+                subtitle_content_line = subtitle_content_start_map[start_no]
+                end_ms = end_ms_map.get(int(subtitle_content_line[1]), end_ms)
+                track.append(start_ms, end_ms, subtitle_content_line[2].rstrip('\n'))
+            elif not config.DELETE_EMPTY_TIMESTAMP:
                 # 保留时间轴
-                sub.text = ""
-                sub.index = len(final_subtitles) + 1
-                final_subtitles.append(sub)
-                continue
+                track.append(start_ms, end_ms, '')
+        return track
 
-        srt_filename = os.path.join(os.path.splitext(self.video_path)[0] + '.srt')
-        pysrt.SubRipFile(final_subtitles).save(srt_filename, encoding='utf-8')
-        print(f"[VSF]{config.interface_config['Main']['SubLocation']} {srt_filename}")
+    def save_subtitle(self, track):
+        """
+        将字幕轨道写出为config.SUBTITLE_FORMATS中的格式，字幕文件与视频同名
+        """
+        from tools import subtitle_track
+        formats = list(config.SUBTITLE_FORMATS)
+        if config.GENERATE_TXT:
+            formats.append('txt')
+        inst = instrument.get_instrument()
+        with inst.span(instrument.SPAN_SRT_WRITE):
+            paths = subtitle_track.save(track, os.path.splitext(self.video_path)[0], formats,
+                                        (self.frame_width, self.frame_height))
+        tag = '[VSF]' if self.use_vsf else '[NO-VSF]'
+        for path in paths.values():
+            print(f"{tag}{config.interface_config['Main']['SubLocation']} {path}")
+        return paths
 
     def _detect_watermark_area(self):
         """
@@ -646,7 +675,8 @@ class SubtitleExtractor:
         while line:
             frame_no = line.split('\t')[0]
             text_position = line.split('\t')[1].split('(')[1].split(')')[0].split(', ')
-            content = line.split('\t')[2]
+            # 保留文本及其后的置信度
+            content = '\t'.join(line.split('\t')[2:])
             frame_no_list.append(frame_no)
             coordinates_list.append((int(text_position[0]),
                                      int(text_position[1]),
@@ -688,42 +718,25 @@ class SubtitleExtractor:
         f.close()
         return Counter(y_coordinates_list).most_common(1)
 
-    def _frame_to_timecode(self, frame_no):
+    def _frame_to_milliseconds(self, frame_no):
         """
         将视频帧转换成时间
         :param frame_no: 视频的帧号，i.e. 第几帧视频帧
-        :returns: SMPTE格式时间戳 as string, 如'01:02:12:032' 或者 '01:02:12;032'
+        :returns: 毫秒
         """
         # 设置当前帧号
         cap = cv2.VideoCapture(self.video_path)
         cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
         ret, _ = cap.read()
         # 获取当前帧号对应的时间戳
-        if ret:
-            milliseconds = cap.get(cv2.CAP_PROP_POS_MSEC)
-            if milliseconds <= 0:
-                return '{0:02d}:{1:02d}:{2:02d},{3:03d}'.format(int(frame_no / (3600 * self.fps)),
-                                                                int(frame_no / (60 * self.fps) % 60),
-                                                                int(frame_no / self.fps % 60),
-                                                                int(frame_no % self.fps))
-            seconds = milliseconds // 1000
-            milliseconds = int(milliseconds % 1000)
-            minutes = 0
-            hours = 0
-            if seconds >= 60:
-                minutes = int(seconds // 60)
-                seconds = int(seconds % 60)
-            if minutes >= 60:
-                hours = int(minutes // 60)
-                minutes = int(minutes % 60)
-            smpte_token = ','
-            cap.release()
-            return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, smpte_token, milliseconds)
-        else:
-            return '{0:02d}:{1:02d}:{2:02d},{3:03d}'.format(int(frame_no / (3600 * self.fps)),
-                                                            int(frame_no / (60 * self.fps) % 60),
-                                                            int(frame_no / self.fps % 60),
-                                                            int(frame_no % self.fps))
+        milliseconds = cap.get(cv2.CAP_PROP_POS_MSEC) if ret else 0
+        cap.release()
+        if milliseconds <= 0:
+            # 无法读取时间戳时按帧率计算，毫秒部分沿用原来的帧号余数
+            seconds = int(frame_no / (3600 * self.fps)) * 3600 + int(frame_no / (60 * self.fps) % 60) * 60 + \
+                int(frame_no / self.fps % 60)
+            return seconds * 1000 + int(frame_no % self.fps)
+        return int(milliseconds)
 
     def _timestamp_to_frameno(self, time_ms):
         return int(time_ms / self.fps)
@@ -738,43 +751,38 @@ class SubtitleExtractor:
         self._concat_content_with_same_frameno()
         with open(self.raw_subtitle_path, mode='r', encoding='utf-8') as r:
             lines = r.readlines()
-        RawInfo = namedtuple('RawInfo', 'no content')
+        from tools import similarity
+        from tools.text_fusion import fuse_texts
+        RawInfo = namedtuple('RawInfo', 'no content score char_probs')
         content_list = []
         for line in lines:
-            frame_no = line.split('\t')[0]
-            content = line.split('\t')[2]
-            content_list.append(RawInfo(frame_no, content))
+            frame_no, _, text, score, char_probs = self._parse_raw_line(line)
+            content_list.append(RawInfo(frame_no, text + '\n', score, char_probs))
         # 去重后的字幕列表
         unique_subtitle_list = []
-        idx_i = 0
         content_list_len = len(content_list)
-        # 循环遍历每行字幕，记录开始时间与结束时间
-        while idx_i < content_list_len:
-            i = content_list[idx_i]
-            start_frame = i.no
-            idx_j = idx_i
-            while idx_j < content_list_len:
-                # 计算当前行与下一行的Levenshtein距离
-                # 判决idx_j的下一帧是否与idx_i不同，若不同（或者是最后一帧）则找到结束帧
-                if idx_j + 1 == content_list_len or ratio(i.content.replace(' ', ''), content_list[idx_j + 1].content.replace(' ', '')) < config.THRESHOLD_TEXT_SIMILARITY:
-                    # 若找到终点帧,定义字幕结束帧帧号
-                    end_frame = content_list[idx_j].no
-                    if not self.use_vsf:
-                        if end_frame == start_frame and idx_j + 1 < content_list_len:
-                            # 针对只有一帧的情况，以下一帧的开始时间为准(除非是最后一帧)
-                            end_frame = content_list[idx_j + 1][0]
-                    # 寻找最长字幕
-                    similar_list = content_list[idx_i:idx_j + 1]
-                    similar_content_strip_list = [item.content.replace(' ', '') for item in similar_list]
-                    index, _ = max(enumerate(similar_content_strip_list), key=lambda x: len(x[1]))
-
-                    # 添加进列表
-                    unique_subtitle_list.append((start_frame, end_frame, similar_list[index].content))
-                    idx_i = idx_j + 1
-                    break
-                else:
-                    idx_j += 1
-                    continue
+        # 根据相邻行与片段首行的相似度切分字幕片段，记录开始时间与结束时间
+        spans = similarity.segment([item.content for item in content_list], config.THRESHOLD_TEXT_SIMILARITY)
+        for idx_i, idx_j in spans:
+            start_frame = content_list[idx_i].no
+            # 定义字幕结束帧帧号
+            end_frame = content_list[idx_j].no
+            if not self.use_vsf:
+                if end_frame == start_frame and idx_j + 1 < content_list_len:
+                    # 针对只有一帧的情况，以下一帧的开始时间为准(除非是最后一帧)
+                    end_frame = content_list[idx_j + 1][0]
+            similar_list = content_list[idx_i:idx_j + 1]
+            if config.TEXT_FUSION:
+                # 按置信度对多帧识别结果逐字投票融合
+                content = fuse_texts([(item.content.rstrip('\n'), item.score, item.char_probs)
+                                      for item in similar_list]) + '\n'
+            else:
+                # 寻找最长字幕
+                similar_content_strip_list = [item.content.replace(' ', '') for item in similar_list]
+                index, _ = max(enumerate(similar_content_strip_list), key=lambda x: len(x[1]))
+                content = similar_list[index].content
+            # 添加进列表
+            unique_subtitle_list.append((start_frame, end_frame, content))
         return unique_subtitle_list
 
     def _concat_content_with_same_frameno(self):
@@ -786,11 +794,9 @@ class SubtitleExtractor:
         content_list = []
         frame_no_list = []
         for line in lines:
-            frame_no = line.split('\t')[0]
+            frame_no, coordinate, text, score, char_probs = self._parse_raw_line(line)
             frame_no_list.append(frame_no)
-            coordinate = line.split('\t')[1]
-            content = line.split('\t')[2]
-            content_list.append([frame_no, coordinate, content])
+            content_list.append([frame_no, coordinate, text, score, char_probs])
 
         # 找出那些不止一行的帧号
         frame_no_list = [i[0] for i in Counter(frame_no_list).most_common() if i[1] > 1]
@@ -805,9 +811,20 @@ class SubtitleExtractor:
             content = []
             for j in i[1]:
                 content.append(content_list[j][2])
-            content = ' '.join(content).replace('\n', ' ') + '\n'
+            content = ' '.join(content)
+            # 合并后的置信度为各行置信度按文本长度加权的平均值
+            total_len = sum(max(len(content_list[j][2]), 1) for j in i[1])
+            score = sum(content_list[j][3] * max(len(content_list[j][2]), 1) for j in i[1]) / total_len
+            # 逐字置信度按同样的顺序拼接，连接用的空格使用合并后的置信度
+            char_probs = []
+            for n, j in enumerate(i[1]):
+                if n > 0:
+                    char_probs.append(score)
+                char_probs.extend(content_list[j][4] or [content_list[j][3]] * len(content_list[j][2]))
             for k in i[1]:
                 content_list[k][2] = content
+                content_list[k][3] = score
+                content_list[k][4] = char_probs
 
         # 将多余的字幕行删除
         to_delete = []
@@ -819,9 +836,39 @@ class SubtitleExtractor:
                 content_list.remove(i)
 
         with open(self.raw_subtitle_path, mode='w', encoding='utf-8') as f:
-            for frame_no, coordinate, content in content_list:
-                content = unicodedata.normalize('NFKC', content)
-                f.write(f'{frame_no}\t{coordinate}\t{content}')
+            for frame_no, coordinate, content, score, char_probs in content_list:
+                content, char_probs = self._normalize_with_char_probs(content, char_probs)
+                f.write(f'{frame_no}\t{coordinate}\t{content}\t{score:.4f}\t'
+                        f'{subtitle_ocr.char_probs_to_str(char_probs) if char_probs else ""}\n')
+
+    @staticmethod
+    def _normalize_with_char_probs(content, char_probs):
+        """
+        NFKC规范化文本，逐字置信度随规范化后的字符展开(e.g. 全角、合字)，无法逐字对应时丢弃逐字置信度
+        """
+        normalized = unicodedata.normalize('NFKC', content)
+        if not char_probs or len(char_probs) != len(content):
+            return normalized, None
+        if normalized == content:
+            return normalized, char_probs
+        parts = [unicodedata.normalize('NFKC', c) for c in content]
+        if ''.join(parts) != normalized:
+            return normalized, None
+        return normalized, [p for part, p in zip(parts, char_probs) for _ in part]
+
+    @staticmethod
+    def _parse_raw_line(line):
+        """
+        解析raw txt中的一行
+        :return (帧号, 坐标, 文本, 置信度, 逐字置信度)，旧格式没有置信度时置信度为1，没有逐字置信度或与文本长度不一致时为None
+        """
+        items = line.rstrip('\n').split('\t')
+        frame_no, coordinate, text = items[0], items[1], items[2]
+        score = float(items[3]) if len(items) > 3 else 1.0
+        char_probs = subtitle_ocr.char_probs_from_str(items[4]) if len(items) > 4 else None
+        if char_probs is not None and len(char_probs) != len(text):
+            char_probs = None
+        return frame_no, coordinate, text, score, char_probs
 
     def _unite_coordinates(self, coordinates_list):
         """
@@ -889,7 +936,7 @@ class SubtitleExtractor:
         比较两张图片预测出的字幕区域文本是否相同
         """
         if self.ocr is None:
-            self.ocr = OcrRecogniser()
+            self.ocr = ocr_server.get_recogniser(config.OCR_SERVER_ADDRESS)
         if img1_no in result_cache:
             area_text1 = result_cache[img1_no]['text']
         else:
@@ -909,10 +956,8 @@ class SubtitleExtractor:
                 delete_no_list.append(no)
         for no in delete_no_list:
             del result_cache[no]
-        if ratio(area_text1, area_text2) > config.THRESHOLD_TEXT_SIMILARITY:
-            return True
-        else:
-            return False
+        from tools import similarity
+        return similarity.is_similar(area_text1, area_text2, config.THRESHOLD_TEXT_SIMILARITY)
 
     @staticmethod
     def __is_coordinate_similar(coordinate1, coordinate2):
@@ -951,6 +996,33 @@ class SubtitleExtractor:
             if os.path.exists(self.temp_output_dir):
                 shutil.rmtree(self.temp_output_dir, True)
 
+    def put_ocr_task(self, task):
+        """
+        添加OCR识别任务，并记录任务队列深度
+        """
+        self.subtitle_ocr_task_queue.put(task)
+        inst = instrument.get_instrument()
+        inst.count(instrument.COUNTER_FRAMES_SAMPLED)
+        if inst.enabled:
+            try:
+                inst.gauge('task_queue_depth', self.subtitle_ocr_task_queue.qsize())
+            except NotImplementedError:
+                # macOS不支持multiprocessing.Queue.qsize
+                pass
+
+    def export_profile(self, total_seconds):
+        """
+        合并OCR进程的埋点数据，打印各阶段耗时并导出JSON报告与Chrome trace
+        """
+        inst = instrument.get_instrument()
+        inst.load(subtitle_ocr.get_profile_path(self.raw_subtitle_path))
+        print(inst.report())
+        profile_prefix = os.path.splitext(self.video_path)[0]
+        inst.export_json(f'{profile_prefix}.profile.json', video=self.video_path, total_seconds=total_seconds,
+                         frame_count=self.frame_count, fps=self.fps)
+        inst.export_chrome_trace(f'{profile_prefix}.trace.json')
+        print(f'{profile_prefix}.profile.json')
+
     def update_progress(self, ocr=None, frame_extract=None):
         """
         更新进度条
@@ -990,6 +1062,11 @@ class SubtitleExtractor:
                                                                                 'DROP_SCORE': config.DROP_SCORE,
                                                                                 'SUB_AREA_DEVIATION_RATE': config.SUB_AREA_DEVIATION_RATE,
                                                                                 'DEBUG_OCR_LOSS': config.DEBUG_OCR_LOSS,
+                                                                                'PROFILE': self.profile,
+                                                                                'OCR_SERVER_ADDRESS': config.OCR_SERVER_ADDRESS,
+                                                                                'MAX_BATCH_SIZE': config.MAX_BATCH_SIZE,
+                                                                                'OCR_BATCH_MAX_WAIT': config.OCR_BATCH_MAX_WAIT,
+                                                                                'VSF_IMAGE_READ_THREADS': config.VSF_IMAGE_READ_THREADS,
                                                                                 }
                                                                        )
         self.subtitle_ocr_task_queue = task_queue
@@ -998,15 +1075,6 @@ class SubtitleExtractor:
         Thread(target=get_ocr_progress, daemon=True).start()
         return process
 
-    @staticmethod
-    def srt2txt(srt_file):
-        subs = pysrt.open(srt_file, encoding='utf-8')
-        output_path = os.path.join(os.path.dirname(srt_file), Path(srt_file).stem + '.txt')
-        print(output_path)
-        with open(output_path, 'w') as f:
-            for sub in subs:
-                f.write(f'{sub.text}\n')
-
 
 if __name__ == '__main__':
     multiprocessing.set_start_method("spawn")
@@ -267,6 +267,32 @@ class DetResizeForTest(object):
         data['shape'] = np.array([src_h, src_w, ratio_h, ratio_w])
         return data
 
+    def resize_shape(self, h, w):
+        """
+        target (resize_h, resize_w) for an image of size (h, w), same as __call__
+        """
+        if self.resize_type == 1:
+            resize_h, resize_w = self.image_shape
+            return int(resize_h), int(resize_w)
+        if self.resize_type == 2:
+            ratio = float(self.resize_long) / max(h, w)
+            max_stride = 128
+            resize_h = (int(h * ratio) + max_stride - 1) // max_stride * max_stride
+            resize_w = (int(w * ratio) + max_stride - 1) // max_stride * max_stride
+            return resize_h, resize_w
+        limit_side_len = self.limit_side_len
+        if self.limit_type == 'max':
+            ratio = float(limit_side_len) / max(h, w) if max(h, w) > limit_side_len else 1.
+        elif self.limit_type == 'min':
+            ratio = float(limit_side_len) / min(h, w) if min(h, w) < limit_side_len else 1.
+        elif self.limit_type == 'resize_long':
+            ratio = float(limit_side_len) / max(h, w)
+        else:
+            raise Exception('not support limit type, image ')
+        resize_h = max(int(round(int(h * ratio) / 32) * 32), 32)
+        resize_w = max(int(round(int(w * ratio) / 32) * 32), 32)
+        return resize_h, resize_w
+
     def resize_image_type1(self, img):
         resize_h, resize_w = self.image_shape
         ori_h, ori_w = img.shape[:2]  # (h, w, c)
@@ -38,6 +38,7 @@ class DBPostProcess(object):
                  unclip_ratio=2.0,
                  use_dilation=False,
                  score_mode="fast",
+                 use_components=False,
                  **kwargs):
         self.thresh = thresh
         self.box_thresh = box_thresh
@@ -45,6 +46,12 @@ class DBPostProcess(object):
         self.unclip_ratio = unclip_ratio
         self.min_size = 3
         self.score_mode = score_mode
+        # find text regions with connected components instead of contours,
+        # see boxes_from_components. Off by default: boxes differ slightly from
+        # the contour path (IoU >= 0.8, corners within a few pixels)
+        self.use_components = use_components
+        # components filling at least this ratio of their bounding rect take the axis-aligned path
+        self.axis_aligned_fill_ratio = 0.85
         assert score_mode in [
             "slow", "fast"
         ], "Score mode must be in [slow, fast] but got: {}".format(score_mode)
@@ -73,31 +80,118 @@ class DBPostProcess(object):
         boxes = []
         scores = []
         for index in range(num_contours):
-            contour = contours[index]
-            points, sside = self.get_mini_boxes(contour)
-            if sside < self.min_size:
-                continue
-            points = np.array(points)
-            if self.score_mode == "fast":
-                score = self.box_score_fast(pred, points.reshape(-1, 2))
-            else:
-                score = self.box_score_slow(pred, contour)
-            if self.box_thresh > score:
+            result = self.box_from_contour(pred, contours[index], width,
+                                           height, dest_width, dest_height)
+            if result is None:
                 continue
+            boxes.append(result[0])
+            scores.append(result[1])
+        return np.array(boxes, dtype=np.int16), scores
+
+    def box_from_contour(self, pred, contour, width, height, dest_width,
+                         dest_height):
+        '''
+        min area box of a contour, scored, unclipped and scaled to dest size
+        return: (box, score), or None when the box is filtered out
+        '''
+        points, sside = self.get_mini_boxes(contour)
+        if sside < self.min_size:
+            return None
+        points = np.array(points)
+        if self.score_mode == "fast":
+            score = self.box_score_fast(pred, points.reshape(-1, 2))
+        else:
+            score = self.box_score_slow(pred, contour)
+        if self.box_thresh > score:
+            return None
+
+        box = self.unclip(points).reshape(-1, 1, 2)
+        box, sside = self.get_mini_boxes(box)
+        if sside < self.min_size + 2:
+            return None
+        box = np.array(box)
+
+        box[:, 0] = np.clip(
+            np.round(box[:, 0] / width * dest_width), 0, dest_width)
+        box[:, 1] = np.clip(
+            np.round(box[:, 1] / height * dest_height), 0, dest_height)
+        return box.astype(np.int16), score
+
+    def boxes_from_components(self, pred, _bitmap, dest_width, dest_height):
+        '''
+        same output as boxes_from_bitmap, but text regions are found with
+        connected components, which gives the bounding rect and pixel count of
+        every region in one pass. regions that (nearly) fill their bounding
+        rect are horizontal text: their min area box is the bounding rect, so
+        scores come from an integral image and unclip is analytic. only the
+        remaining (rotated) regions go through the contour/polygon path.
+        '''
+        bitmap = _bitmap
+        height, width = bitmap.shape
+        num_labels, labels, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            bitmap.astype(np.uint8), 8, cv2.CV_32S, cv2.CCL_GRANA)
+        stats = stats[1:min(num_labels, self.max_candidates + 1)]
+        if len(stats) == 0:
+            return np.zeros((0, 4, 2), dtype=np.int16), []
+        left = stats[:, cv2.CC_STAT_LEFT]
+        top = stats[:, cv2.CC_STAT_TOP]
+        right = left + stats[:, cv2.CC_STAT_WIDTH] - 1
+        bottom = top + stats[:, cv2.CC_STAT_HEIGHT] - 1
+        area = stats[:, cv2.CC_STAT_AREA]
+        # min area rect size of the pixel centers, as cv2.minAreaRect on the contour
+        rect_w = (right - left).astype(np.float64)
+        rect_h = (bottom - top).astype(np.float64)
+        axis_aligned = area >= self.axis_aligned_fill_ratio * (
+            stats[:, cv2.CC_STAT_WIDTH] * stats[:, cv2.CC_STAT_HEIGHT])
+
+        if self.score_mode == "fast":
+            # mean of pred over the bounding rect
+            integral = cv2.integral(pred, sdepth=cv2.CV_64F)
+            sums = integral[bottom + 1, right + 1] - integral[top, right + 1] \
+                - integral[bottom + 1, left] + integral[top, left]
+            scores = sums / ((rect_w + 1) * (rect_h + 1))
+        else:
+            # mean of pred over the region pixels
+            sums = np.bincount(labels.ravel(), weights=pred.ravel(),
+                               minlength=num_labels)[1:len(stats) + 1]
+            scores = sums / area
+
+        # unclip a w x h rectangle by distance d = area * ratio / perimeter,
+        # its min area box grows to (w + 2d) x (h + 2d)
+        perimeter = np.maximum(2 * (rect_w + rect_h), 1e-6)
+        distance = rect_w * rect_h * self.unclip_ratio / perimeter
+        keep = axis_aligned & (np.minimum(rect_w, rect_h) >= self.min_size) & \
+            (scores >= self.box_thresh) & \
+            (np.minimum(rect_w, rect_h) + 2 * distance >= self.min_size + 2)
+        x0 = np.clip(np.round((left - distance) / width * dest_width), 0, dest_width)
+        x1 = np.clip(np.round((right + distance) / width * dest_width), 0, dest_width)
+        y0 = np.clip(np.round((top - distance) / height * dest_height), 0, dest_height)
+        y1 = np.clip(np.round((bottom + distance) / height * dest_height), 0, dest_height)
+        fast_boxes = np.stack([np.stack([x0, y0], axis=1), np.stack([x1, y0], axis=1),
+                               np.stack([x1, y1], axis=1), np.stack([x0, y1], axis=1)],
+                              axis=1).astype(np.int16)
 
-            box = self.unclip(points).reshape(-1, 1, 2)
-            box, sside = self.get_mini_boxes(box)
-            if sside < self.min_size + 2:
+        boxes = []
+        box_scores = []
+        for index in range(len(stats)):
+            if axis_aligned[index]:
+                if keep[index]:
+                    boxes.append(fast_boxes[index])
+                    box_scores.append(float(scores[index]))
                 continue
-            box = np.array(box)
-
-            box[:, 0] = np.clip(
-                np.round(box[:, 0] / width * dest_width), 0, dest_width)
-            box[:, 1] = np.clip(
-                np.round(box[:, 1] / height * dest_height), 0, dest_height)
-            boxes.append(box.astype(np.int16))
-            scores.append(score)
-        return np.array(boxes, dtype=np.int16), scores
+            # rotated region: contour of the region only, in its bounding rect
+            x, y = left[index], top[index]
+            region = (labels[y:bottom[index] + 1, x:right[index] + 1] == index + 1)
+            outs = cv2.findContours(region.astype(np.uint8), cv2.RETR_EXTERNAL,
+                                    cv2.CHAIN_APPROX_SIMPLE, offset=(int(x), int(y)))
+            contours = outs[1] if len(outs) == 3 else outs[0]
+            for contour in contours:
+                result = self.box_from_contour(pred, contour, width, height,
+                                               dest_width, dest_height)
+                if result is not None:
+                    boxes.append(result[0])
+                    box_scores.append(result[1])
+        return np.array(boxes, dtype=np.int16).reshape(-1, 4, 2), box_scores
 
     def unclip(self, box):
         unclip_ratio = self.unclip_ratio
@@ -185,8 +279,12 @@ class DBPostProcess(object):
                     self.dilation_kernel)
             else:
                 mask = segmentation[batch_index]
-            boxes, scores = self.boxes_from_bitmap(pred[batch_index], mask,
-                                                   src_w, src_h)
+            if self.use_components:
+                boxes, scores = self.boxes_from_components(
+                    pred[batch_index], mask, src_w, src_h)
+            else:
+                boxes, scores = self.boxes_from_bitmap(pred[batch_index], mask,
+                                                       src_w, src_h)
 
             boxes_batch.append({'points': boxes})
         return boxes_batch
@@ -44,12 +44,80 @@ class BaseRecLabelDecode(object):
         for i, char in enumerate(dict_character):
             self.dict[char] = i
         self.character = dict_character
+        # numpy lookup tables used by the batched decode path
+        self.character_array = np.array(dict_character, dtype=object)
+        self.character_len = np.array(
+            [len(char) for char in dict_character], dtype=np.int64)
 
     def add_special_char(self, dict_character):
         return dict_character
 
-    def decode(self, text_index, text_prob=None, is_remove_duplicate=False):
-        """ convert text-index into text-label. """
+    def decode(self, text_index, text_prob=None, is_remove_duplicate=False,
+               return_char_prob=False):
+        """ convert text-index into text-label.
+        return_char_prob: also return the probability of every character of
+        the text as a third item, aligned with the code points of the text.
+        """
+        if not isinstance(text_index, np.ndarray) or text_index.ndim != 2:
+            return self.decode_per_item(text_index, text_prob,
+                                        is_remove_duplicate, return_char_prob)
+        selection = self.get_selection(text_index, is_remove_duplicate)
+        batch_size, seq_len = text_index.shape
+        # number of kept characters of every sequence
+        counts = selection.sum(axis=1)
+        kept_index = text_index[selection]
+        # join all kept characters once and cut the sequences out of it,
+        # dictionary entries may be longer than one code point
+        joined = ''.join(self.character_array[kept_index].tolist())
+        str_ends = np.cumsum(
+            np.bincount(
+                np.repeat(np.arange(batch_size), counts),
+                weights=self.character_len[kept_index],
+                minlength=batch_size)).astype(np.int64).tolist()
+        if text_prob is not None:
+            row_ids = np.nonzero(selection)[0]
+            conf_sum = np.bincount(
+                row_ids, weights=text_prob[selection], minlength=batch_size)
+            conf = np.divide(
+                conf_sum,
+                counts,
+                out=np.zeros(batch_size, dtype=np.float64),
+                where=counts > 0)
+        else:
+            conf = np.ones(batch_size, dtype=np.float64)
+        conf = conf.tolist()
+        char_prob = None
+        if return_char_prob:
+            kept_prob = text_prob[selection] if text_prob is not None \
+                else np.ones(len(kept_index))
+            # an entry longer than one code point repeats its probability
+            char_prob = np.repeat(kept_prob,
+                                  self.character_len[kept_index]).tolist()
+
+        result_list = []
+        beg = 0
+        for batch_idx in range(batch_size):
+            end = str_ends[batch_idx]
+            if char_prob is None:
+                result_list.append((joined[beg:end], conf[batch_idx]))
+            else:
+                result_list.append((joined[beg:end], conf[batch_idx],
+                                    char_prob[beg:end]))
+            beg = end
+        return result_list
+
+    def get_selection(self, text_index, is_remove_duplicate=False):
+        """ mask of the time steps kept after collapsing repeats and removing ignored tokens. """
+        selection = np.ones(text_index.shape, dtype=bool)
+        if is_remove_duplicate:
+            selection[..., 1:] = text_index[..., 1:] != text_index[..., :-1]
+        for ignored_token in self.get_ignored_tokens():
+            selection &= text_index != ignored_token
+        return selection
+
+    def decode_per_item(self, text_index, text_prob=None,
+                        is_remove_duplicate=False, return_char_prob=False):
+        """ convert ragged text-index sequences into text-label one by one. """
         result_list = []
         ignored_tokens = self.get_ignored_tokens()
         batch_size = len(text_index)
@@ -73,7 +141,13 @@ class BaseRecLabelDecode(object):
                 conf_list = [0]
 
             text = ''.join(char_list)
-            result_list.append((text, np.mean(conf_list).tolist()))
+            if not return_char_prob:
+                result_list.append((text, np.mean(conf_list).tolist()))
+                continue
+            char_prob = []
+            for char, prob in zip(char_list, conf_list):
+                char_prob.extend([float(prob)] * len(char))
+            result_list.append((text, np.mean(conf_list).tolist(), char_prob))
         return result_list
 
     def get_ignored_tokens(self):
@@ -88,19 +162,54 @@ class CTCLabelDecode(BaseRecLabelDecode):
         super(CTCLabelDecode, self).__init__(character_dict_path,
                                              use_space_char)
 
-    def __call__(self, preds, label=None, *args, **kwargs):
+    def __call__(self, preds, label=None, *args, return_char_prob=False,
+                 **kwargs):
         if isinstance(preds, tuple) or isinstance(preds, list):
             preds = preds[-1]
         if isinstance(preds, paddle.Tensor):
             preds = preds.numpy()
         preds_idx = preds.argmax(axis=2)
-        preds_prob = preds.max(axis=2)
-        text = self.decode(preds_idx, preds_prob, is_remove_duplicate=True)
+        preds_prob = np.take_along_axis(
+            preds, preds_idx[..., np.newaxis], axis=2)[..., 0]
+        text = self.decode(preds_idx, preds_prob, is_remove_duplicate=True,
+                           return_char_prob=return_char_prob)
         if label is None:
             return text
         label = self.decode(label)
         return text, label
 
+    def decode_topk(self, preds, topk=3):
+        """
+        Per-character alternatives of the greedy CTC path.
+        For every sequence return a list with one entry per decoded character,
+        each entry being the top-k (char, prob) candidates of that time step.
+        """
+        if isinstance(preds, tuple) or isinstance(preds, list):
+            preds = preds[-1]
+        if isinstance(preds, paddle.Tensor):
+            preds = preds.numpy()
+        topk = min(topk, preds.shape[2])
+        preds_idx = preds.argmax(axis=2)
+        selection = self.get_selection(preds_idx, is_remove_duplicate=True)
+        # top-k classes of the kept time steps only, ordered by probability
+        kept = preds[selection]
+        topk_idx = np.argpartition(-kept, topk - 1, axis=1)[:, :topk]
+        topk_prob = np.take_along_axis(kept, topk_idx, axis=1)
+        order = np.argsort(-topk_prob, axis=1)
+        topk_idx = np.take_along_axis(topk_idx, order, axis=1)
+        topk_prob = np.take_along_axis(topk_prob, order, axis=1).tolist()
+        topk_char = self.character_array[topk_idx].tolist()
+
+        result_list = []
+        beg = 0
+        for count in selection.sum(axis=1).tolist():
+            result_list.append([
+                list(zip(topk_char[i], topk_prob[i]))
+                for i in range(beg, beg + count)
+            ])
+            beg += count
+        return result_list
+
     def add_special_char(self, dict_character):
         dict_character = ['blank'] + dict_character
         return dict_character
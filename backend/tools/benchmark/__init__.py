@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: __init__.py
+@desc: 端到端性能与精度基准测试
+synth: 生成带有已知字幕、水印与场景文字的合成视频
+metrics: 字幕识别精度(CER)与时间轴误差
+run: 按分辨率、时长与提取模式运行测试并输出报告
+autotune: 检测/识别模型推理参数微基准与自动调优
+"""
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: autotune.py
+@desc: 文本检测/识别模型推理参数微基准与自动调优
+对当前配置的DET_MODEL_PATH/REC_MODEL_PATH，遍历cpu_threads、MKL-DNN开关、det_limit_side_len、
+rec_batch_num以及不同的输入尺寸，统计延迟分位数与吞吐量，并将最优参数写入config.TUNE_PROFILE_PATH，
+字幕提取启动时会自动加载(见tools/infer/utility.py apply_tune_profile)
+
+用法(在backend目录下执行):
+    python tools/benchmark/autotune.py
+    python tools/benchmark/autotune.py --quick --output my_profile.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+from PIL import ImageFont
+import config
+from tools.infer import utility
+from tools.infer.predict_det import TextDetector
+from tools.infer.predict_rec import TextRecognizer
+from tools.benchmark import synth
+
+# 检测模型输入尺寸(宽x高)：字幕区域裁剪后的常见尺寸以及整帧
+DET_SHAPES = ['1280x180', '1920x270', '1280x720']
+DET_LIMIT_SIDE_LENS = [480, 640, 960, 1280]
+# 识别模型输入：不同长度的文本行
+REC_TEXT_LENGTHS = [4, 10, 20]
+REC_BATCH_NUMS = [1, 2, 4, 6, 8, 12, 16]
+
+
+def percentiles(values):
+    """
+    :return {'mean', 'p50', 'p90', 'p99'}，单位为毫秒
+    """
+    values = sorted(values)
+    n = len(values)
+    return {
+        'mean': sum(values) / n * 1000,
+        'p50': values[int(0.5 * (n - 1))] * 1000,
+        'p90': values[int(0.9 * (n - 1))] * 1000,
+        'p99': values[int(0.99 * (n - 1))] * 1000,
+    }
+
+
+def thread_candidates():
+    cpu_count = os.cpu_count() or 1
+    candidates = [1]
+    while candidates[-1] * 2 <= cpu_count:
+        candidates.append(candidates[-1] * 2)
+    if cpu_count not in candidates:
+        candidates.append(cpu_count)
+    return candidates
+
+
+def base_args():
+    """
+    与OcrRecogniser一致的推理参数，但不加载已有的调优结果
+    """
+    args = utility.init_args().parse_args([])
+    args.use_gpu = config.USE_GPU
+    args.det_algorithm = 'DB'
+    args.det_model_dir = config.DET_MODEL_PATH
+    args.rec_model_dir = config.REC_MODEL_PATH
+    args.rec_char_dict_path = config.DICT_PATH
+    args.rec_image_shape = config.REC_IMAGE_SHAPE
+    args.rec_char_type = config.REC_CHAR_TYPE
+    args.rec_batch_num = config.REC_BATCH_NUM
+    args.max_batch_size = config.MAX_BATCH_SIZE
+    args.tune_profile = None
+    return args
+
+
+def make_det_images(shapes, rng):
+    """
+    生成带字幕文本的检测输入图像
+    """
+    images = []
+    for shape in shapes:
+        w, h = map(int, shape.split('x'))
+        background = synth.Background(w, h, rng)
+        font = ImageFont.truetype(synth.FONT_PATH, max(16, min(h // 3, w // 24)))
+        img = background.frame(rng.randint(0, 1000))
+        patch, alpha = synth.render_text(rng.choice(synth.SENTENCES['ch']), font)
+        synth.blend(img, patch, alpha, (w - patch.shape[1]) // 2, h - patch.shape[0] - h // 10)
+        images.append((shape, img))
+    return images
+
+
+def make_rec_crops(count, rng):
+    """
+    生成不同长度的文本行图像，模拟检测框裁剪结果
+    """
+    font = ImageFont.truetype(synth.FONT_PATH, 40)
+    text = ''.join(synth.SENTENCES['ch'])
+    crops = []
+    for i in range(count):
+        length = REC_TEXT_LENGTHS[i % len(REC_TEXT_LENGTHS)]
+        start = rng.randint(0, len(text) - length)
+        patch, alpha = synth.render_text(text[start:start + length], font)
+        background = np.full_like(patch, rng.randint(0, 120))
+        crops.append((patch * alpha + background * (1 - alpha)).astype(np.uint8))
+    return crops
+
+
+def bench_det(args, images, warmup, repeat):
+    """
+    :return (每种输入尺寸的延迟统计, 每种输入尺寸检测到的文本框数量)
+    """
+    detector = TextDetector(args)
+    latencies = {}
+    boxes = {}
+    for shape, img in images:
+        for _ in range(warmup):
+            detector(img)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            dt_boxes, _ = detector(img)
+            times.append(time.perf_counter() - start)
+        latencies[shape] = percentiles(times)
+        boxes[shape] = 0 if dt_boxes is None else len(dt_boxes)
+    return latencies, boxes
+
+
+def bench_rec(args, crops, warmup, repeat):
+    """
+    :return (每次调用的延迟统计, 每秒识别的文本行数)
+    """
+    recognizer = TextRecognizer(args)
+    for _ in range(warmup):
+        recognizer(crops)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        recognizer(crops)
+        times.append(time.perf_counter() - start)
+    return percentiles(times), len(crops) * repeat / sum(times)
+
+
+def sweep_det(args, quick, warmup, repeat, rng):
+    images = make_det_images(DET_SHAPES, rng)
+    threads = [args.cpu_threads] if args.use_gpu else thread_candidates()
+    mkldnn = [False] if args.use_gpu else [False, True]
+    side_lens = DET_LIMIT_SIDE_LENS[1:3] if quick else DET_LIMIT_SIDE_LENS
+    # 以默认的det_limit_side_len检测到的文本框数量作为参考，缩小输入尺寸不能漏检
+    reference_args = base_args()
+    _, reference_boxes = bench_det(reference_args, images, 0, 1)
+    results = []
+    for cpu_threads, enable_mkldnn, side_len in itertools.product(threads, mkldnn, side_lens):
+        trial = base_args()
+        trial.cpu_threads, trial.enable_mkldnn, trial.det_limit_side_len = cpu_threads, enable_mkldnn, side_len
+        latencies, boxes = bench_det(trial, images, warmup, repeat)
+        valid = all(boxes[shape] >= reference_boxes[shape] for shape in boxes)
+        score = sum(latency['p50'] for latency in latencies.values())
+        params = {'cpu_threads': cpu_threads, 'enable_mkldnn': enable_mkldnn, 'det_limit_side_len': side_len}
+        results.append({'params': params, 'latency_ms': latencies, 'boxes': boxes, 'valid': valid, 'score': score})
+        print(f"det {params} p50 sum {score:.1f}ms {'' if valid else '(missed boxes)'}")
+    candidates = [r for r in results if r['valid']] or results
+    return min(candidates, key=lambda r: r['score']), results
+
+
+def sweep_rec(args, quick, warmup, repeat, rng):
+    crops = make_rec_crops(48, rng)
+    threads = [args.cpu_threads] if args.use_gpu else thread_candidates()
+    mkldnn = [False] if args.use_gpu else [False, True]
+    batch_nums = [1, 6, 12] if quick else REC_BATCH_NUMS
+    results = []
+    for cpu_threads, enable_mkldnn, batch_num in itertools.product(threads, mkldnn, batch_nums):
+        trial = base_args()
+        trial.cpu_threads, trial.enable_mkldnn, trial.rec_batch_num = cpu_threads, enable_mkldnn, batch_num
+        latency, throughput = bench_rec(trial, crops, warmup, repeat)
+        params = {'cpu_threads': cpu_threads, 'enable_mkldnn': enable_mkldnn, 'rec_batch_num': batch_num}
+        results.append({'params': params, 'latency_ms': latency, 'throughput': throughput})
+        print(f"rec {params} {throughput:.1f} lines/s p50 {latency['p50']:.1f}ms p99 {latency['p99']:.1f}ms")
+    return max(results, key=lambda r: r['throughput']), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='tune det/rec inference params for this machine')
+    parser.add_argument('--output', default=config.TUNE_PROFILE_PATH or os.path.join(BACKEND_DIR, 'tune_profile.json'))
+    parser.add_argument('--stages', default='det,rec', help='comma separated: det, rec')
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--quick', action='store_true', help='sweep fewer side lengths and batch sizes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    default_args = base_args()
+    profile = {}
+    if os.path.exists(args.output):
+        with open(args.output, mode='r', encoding='utf-8') as f:
+            profile = json.load(f)
+    for stage in args.stages.split(','):
+        if stage == 'det':
+            best, results = sweep_det(default_args, args.quick, args.warmup, args.repeat, rng)
+            model_dir = default_args.det_model_dir
+        elif stage == 'rec':
+            best, results = sweep_rec(default_args, args.quick, args.warmup, args.repeat, rng)
+            model_dir = default_args.rec_model_dir
+        else:
+            parser.error(f'unknown stage: {stage}')
+        profile[stage] = {
+            'model_dir': model_dir,
+            'use_gpu': bool(default_args.use_gpu),
+            'params': best['params'],
+            'latency_ms': best['latency_ms'],
+            'tuned_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'trials': results,
+        }
+        print(f'best {stage}: {best["params"]}')
+    with open(args.output, mode='w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    print(args.output)
+
+
+if __name__ == '__main__':
+    main()
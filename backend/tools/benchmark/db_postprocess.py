@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: db_postprocess.py
+@desc: DB后处理基准测试
+生成包含大量水平文本行(以及少量倾斜文本行)的检测概率图，对比基于轮廓的boxes_from_bitmap
+与基于连通域的boxes_from_components的耗时，并检查两者输出的文本框是否一致
+
+用法(在backend目录下执行):
+    python tools/benchmark/db_postprocess.py --lines 10,50,200 --rotated 0.1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import cv2
+import numpy as np
+from ppocr.postprocess.db_postprocess import DBPostProcess
+
+
+def make_prob_map(width, height, lines, rotated_ratio, rng):
+    """
+    模拟检测模型输出：文本行互不重叠，区域内概率较高，边缘平滑过渡
+    :return (概率图, 输入图像尺寸对应的shape_list)
+    """
+    prob = np.zeros((height, width), dtype=np.float32)
+    occupied = np.zeros((height, width), dtype=np.uint8)
+    placed = 0
+    for _ in range(lines * 20):
+        if placed == lines:
+            break
+        h = rng.randint(6, 20)
+        w = rng.randint(3 * h, 15 * h)
+        cx, cy = rng.randint(w // 2, width - w // 2), rng.randint(h, height - h)
+        angle = rng.uniform(-30, 30) if rng.random() < rotated_ratio else 0
+        points = cv2.boxPoints(((cx, cy), (w, h), angle)).astype(np.int32)
+        x, y, bw, bh = cv2.boundingRect(points)
+        # 与已有文本行保持间距，避免连成一片
+        if occupied[max(0, y - 4):y + bh + 4, max(0, x - 4):x + bw + 4].any():
+            continue
+        cv2.fillPoly(occupied, [points], 1)
+        cv2.fillPoly(prob, [points], rng.uniform(0.7, 0.95))
+        placed += 1
+    prob = cv2.GaussianBlur(prob, (5, 5), 0)
+    noise = np.random.default_rng(rng.randint(0, 1 << 30)).uniform(0, 0.05, prob.shape).astype(np.float32)
+    shape_list = np.array([[height * 2, width * 2, 0.5, 0.5]])
+    return np.clip(prob + noise, 0, 1)[np.newaxis, np.newaxis], shape_list
+
+
+def bbox_iou(a, b):
+    ax0, ay0 = a.min(axis=0)
+    ax1, ay1 = a.max(axis=0)
+    bx0, by0 = b.min(axis=0)
+    bx1, by1 = b.max(axis=0)
+    iw = max(0, min(ax1, bx1) - max(ax0, bx0))
+    ih = max(0, min(ay1, by1) - max(ay0, by0))
+    inter = iw * ih
+    union = (ax1 - ax0) * (ay1 - ay0) + (bx1 - bx0) * (by1 - by0) - inter
+    return inter / union if union > 0 else 0
+
+
+def agreement(reference, boxes, iou=0.8):
+    """
+    :return 参考文本框中能在boxes中找到IoU >= iou的比例
+    """
+    if len(reference) == 0:
+        return 1.0
+    boxes = [b.astype(np.float64) for b in boxes]
+    matched = sum(1 for r in reference if any(bbox_iou(r.astype(np.float64), b) >= iou for b in boxes))
+    return matched / len(reference)
+
+
+def time_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark DB post-processing: contours vs connected components')
+    parser.add_argument('--size', default='1280x736', help='probability map size, WxH')
+    parser.add_argument('--lines', default='10,50,200', help='comma separated text line counts')
+    parser.add_argument('--rotated', type=float, default=0.1, help='ratio of rotated text lines')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split('x'))
+    rng = random.Random(args.seed)
+    contour_op = DBPostProcess(thresh=0.3, box_thresh=0.6, unclip_ratio=1.5, use_components=False)
+    component_op = DBPostProcess(thresh=0.3, box_thresh=0.6, unclip_ratio=1.5, use_components=True)
+    print(f"{'lines':>6} {'boxes':>6} {'contours(ms)':>13} {'components(ms)':>15} {'speedup':>8} {'agreement':>10}")
+    for lines in map(int, args.lines.split(',')):
+        prob, shape_list = make_prob_map(width, height, lines, args.rotated, rng)
+        reference = contour_op({'maps': prob}, shape_list)[0]['points']
+        boxes = component_op({'maps': prob}, shape_list)[0]['points']
+        contour_ms = time_ms(lambda: contour_op({'maps': prob}, shape_list), args.repeat)
+        component_ms = time_ms(lambda: component_op({'maps': prob}, shape_list), args.repeat)
+        print(f'{lines:>6} {len(reference):>6} {contour_ms:>13.2f} {component_ms:>15.2f} '
+              f'{contour_ms / component_ms:>7.1f}x {agreement(reference, boxes):>10.1%}')
+
+
+if __name__ == '__main__':
+    main()
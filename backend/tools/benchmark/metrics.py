@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: metrics.py
+@desc: 字幕精度评估：按时间重叠将识别结果与真值对齐，计算字符错误率(CER)与起止时间误差
+"""
+import pysrt
+from Levenshtein import distance
+
+
+def load_cues(srt_path):
+    """
+    读取SRT字幕
+    :return [(start_ms, end_ms, text), ...]
+    """
+    subs = pysrt.open(srt_path, encoding='utf-8')
+    return [(sub.start.ordinal, sub.end.ordinal, sub.text) for sub in subs]
+
+
+def normalize(text):
+    return text.replace(' ', '').replace('\n', '')
+
+
+def overlap(a, b):
+    return max(0, min(a[1], b[1]) - max(a[0], b[0]))
+
+
+def match_cues(gt_cues, pred_cues):
+    """
+    为每条真值字幕匹配时间重叠最多的识别字幕，每条识别字幕最多匹配一次
+    :return [(gt_index, pred_index or None), ...]
+    """
+    candidates = []
+    for i, gt in enumerate(gt_cues):
+        for j, pred in enumerate(pred_cues):
+            o = overlap(gt, pred)
+            if o > 0:
+                candidates.append((o, i, j))
+    # 按重叠时长从大到小贪心匹配
+    candidates.sort(reverse=True)
+    gt_match = {}
+    used = set()
+    for _, i, j in candidates:
+        if i in gt_match or j in used:
+            continue
+        gt_match[i] = j
+        used.add(j)
+    return [(i, gt_match.get(i)) for i in range(len(gt_cues))]
+
+
+def evaluate(gt_srt, pred_srt):
+    """
+    :return dict:
+        cer 字符错误率，未匹配的真值字幕计为全部删除，多余的识别字幕计为全部插入
+        timing_error_ms 已匹配字幕的起止时间平均绝对误差
+        matched / missed / extra 匹配、漏识别、多识别的字幕条数
+    """
+    gt_cues = load_cues(gt_srt)
+    pred_cues = load_cues(pred_srt)
+    pairs = match_cues(gt_cues, pred_cues)
+    errors = 0
+    chars = 0
+    timing = []
+    matched = set()
+    for i, j in pairs:
+        gt_text = normalize(gt_cues[i][2])
+        chars += len(gt_text)
+        if j is None:
+            errors += len(gt_text)
+            continue
+        matched.add(j)
+        errors += distance(gt_text, normalize(pred_cues[j][2]))
+        timing.append(abs(gt_cues[i][0] - pred_cues[j][0]))
+        timing.append(abs(gt_cues[i][1] - pred_cues[j][1]))
+    extra = [j for j in range(len(pred_cues)) if j not in matched]
+    errors += sum(len(normalize(pred_cues[j][2])) for j in extra)
+    return {
+        'cer': errors / chars if chars > 0 else 0.0,
+        'timing_error_ms': sum(timing) / len(timing) if timing else None,
+        'matched': len(matched),
+        'missed': len(gt_cues) - len(matched),
+        'extra': len(extra),
+    }
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: run.py
+@desc: 端到端基准测试入口
+按分辨率 x 时长 x 提取模式运行字幕提取，统计处理速度(帧/秒)、OCR调用次数、峰值内存、
+字符错误率(CER)与时间轴误差，用于判断优化是否真正提升了端到端性能且没有损失精度
+
+用法(在backend目录下执行):
+    python tools/benchmark/run.py --resolutions 360p,720p --durations 30,120 --modes fps,det,auto-area
+每个用例在独立的子进程中运行，保证内存统计与配置互不影响
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from tools.benchmark import synth
+
+# 测试模式 -> (视频帧提取方式, 是否指定字幕区域)
+MODES = {
+    'fps': ('fps', True),
+    'det': ('det', True),
+    # 不指定字幕区域，由程序自动检测字幕区域并过滤场景文字
+    'auto-area': ('fps', False),
+}
+
+# auto-area模式下对交互提问的回答：不删除水印区域，删除非字幕区域
+AUTO_AREA_ANSWERS = 'n\ny\n'
+
+
+def peak_rss_mb():
+    """
+    当前进程与已结束子进程的峰值内存(MB)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    unit = 1 if sys.platform == 'darwin' else 1024
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 1024 / 1024
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 1024 / 1024
+    return self_rss, children_rss
+
+
+def run_case(case):
+    """
+    在当前进程中运行单个用例，由子进程调用
+    """
+    import multiprocessing
+    multiprocessing.set_start_method('spawn', force=True)
+    from main import SubtitleExtractor
+    from tools import instrument
+    from tools.benchmark import metrics
+
+    # 推理模块通过argparse读取命令行参数，避免解析到本脚本的参数
+    sys.argv = sys.argv[:1]
+    extract_mode, with_area = MODES[case['mode']]
+    sub_area = tuple(case['sub_area']) if with_area else None
+    se = SubtitleExtractor(case['video_path'], sub_area)
+    se.extract_mode = extract_mode
+    se.profile = True
+    start = time.time()
+    se.run()
+    wall = time.time() - start
+
+    pred_srt = os.path.splitext(case['video_path'])[0] + '.srt'
+    kept_srt = os.path.splitext(case['video_path'])[0] + f".{case['mode']}.srt"
+    shutil.move(pred_srt, kept_srt)
+    stages = instrument.get_instrument().summary()
+    self_rss, children_rss = peak_rss_mb()
+    result = {
+        'scenario': case['scenario'],
+        'mode': case['mode'],
+        'wall_seconds': wall,
+        'frame_count': se.frame_count,
+        'frames_per_second': se.frame_count / wall if wall > 0 else None,
+        'det_calls': stages.get(instrument.SPAN_DET_INFER, {}).get('count', 0),
+        'rec_calls': stages.get(instrument.SPAN_REC_INFER, {}).get('count', 0),
+        'peak_rss_mb': self_rss,
+        'peak_rss_ocr_mb': children_rss,
+        'srt': kept_srt,
+        'stages': stages,
+    }
+    result.update(metrics.evaluate(case['gt_path'], kept_srt))
+    return result
+
+
+def spawn_case(case, case_path, result_path, timeout):
+    """
+    在独立子进程中运行单个用例
+    """
+    with open(case_path, mode='w', encoding='utf-8') as f:
+        json.dump(case, f, ensure_ascii=False)
+    answers = AUTO_AREA_ANSWERS if case['mode'] == 'auto-area' else ''
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', case_path, '--result', result_path],
+                          input=answers, text=True, cwd=BACKEND_DIR, timeout=timeout)
+    if proc.returncode != 0 or not os.path.exists(result_path):
+        return {'scenario': case['scenario'], 'mode': case['mode'], 'error': f'exit code {proc.returncode}'}
+    with open(result_path, mode='r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_report(results):
+    header = f"{'scenario':<16}{'mode':<11}{'frames/s':>10}{'det':>7}{'rec':>7}{'rss(MB)':>9}{'ocr rss':>9}" \
+             f"{'CER':>8}{'time err(ms)':>14}{'miss':>6}{'extra':>6}"
+    lines = [header]
+    for r in results:
+        if 'error' in r:
+            lines.append(f"{r['scenario']:<16}{r['mode']:<11}  {r['error']}")
+            continue
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else format('-', '>' + spec.split('.')[0].lstrip('>'))
+
+        lines.append(f"{r['scenario']:<16}{r['mode']:<11}{fmt(r['frames_per_second'], '>10.1f')}{r['det_calls']:>7}"
+                     f"{r['rec_calls']:>7}{fmt(r['peak_rss_mb'], '>9.0f')}{fmt(r['peak_rss_ocr_mb'], '>9.0f')}"
+                     f"{r['cer']:>8.3f}{fmt(r['timing_error_ms'], '>14.0f')}{r['missed']:>6}{r['extra']:>6}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='video-subtitle-extractor end-to-end benchmark')
+    parser.add_argument('--output', default=os.path.join(BACKEND_DIR, 'benchmark_output'),
+                        help='directory for synthetic videos and reports')
+    parser.add_argument('--resolutions', default='360p,720p,1080p',
+                        help=f"comma separated, choices: {','.join(synth.RESOLUTIONS)}")
+    parser.add_argument('--durations', default='30', help='comma separated video durations in seconds')
+    parser.add_argument('--modes', default=','.join(MODES), help=f"comma separated, choices: {','.join(MODES)}")
+    parser.add_argument('--lang', default='ch', choices=list(synth.SENTENCES))
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=int, default=3600, help='timeout of a single case in seconds')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        with open(args.case, mode='r', encoding='utf-8') as f:
+            case = json.load(f)
+        result = run_case(case)
+        with open(args.result, mode='w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        return
+
+    modes = [m for m in args.modes.split(',') if m]
+    for m in modes:
+        if m not in MODES:
+            parser.error(f'unknown mode: {m}')
+    os.makedirs(args.output, exist_ok=True)
+    results = []
+    for resolution in args.resolutions.split(','):
+        width, height = synth.RESOLUTIONS[resolution]
+        for duration in args.durations.split(','):
+            name = f'{resolution}_{duration}s_{args.lang}'
+            scenario = synth.Scenario(name, width, height, float(duration), fps=args.fps, lang=args.lang,
+                                      seed=args.seed)
+            video_path = os.path.join(args.output, name + '.mp4')
+            gt_path = os.path.join(args.output, name + '.gt.srt')
+            # 相同参数生成的视频完全一致，已存在时直接复用
+            if not (os.path.exists(video_path) and os.path.exists(gt_path)):
+                print(f'synthesizing {video_path}')
+                synth.synthesize(scenario, args.output)
+            for mode in modes:
+                print(f'running {name} [{mode}]')
+                case = {'scenario': name, 'mode': mode, 'video_path': video_path, 'gt_path': gt_path,
+                        'sub_area': scenario.sub_area}
+                case_path = os.path.join(args.output, f'{name}.{mode}.case.json')
+                result_path = os.path.join(args.output, f'{name}.{mode}.result.json')
+                if os.path.exists(result_path):
+                    os.remove(result_path)
+                try:
+                    results.append(spawn_case(case, case_path, result_path, args.timeout))
+                except subprocess.TimeoutExpired:
+                    results.append({'scenario': name, 'mode': mode, 'error': 'timeout'})
+
+    report = format_report(results)
+    print(report)
+    report_path = os.path.join(args.output, f"report_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, mode='w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(report_path)
+
+
+if __name__ == '__main__':
+    main()
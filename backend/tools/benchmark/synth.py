@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: synth.py
+@desc: 合成测试视频：在运动背景上绘制已知的字幕、固定位置的水印以及随机出现的场景文字，
+       同时输出字幕真值(SRT)与场景描述，用于端到端基准测试
+"""
+import json
+import os
+import random
+import cv2
+import numpy as np
+import pysrt
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'NotoSansCJK-Bold.otf')
+
+RESOLUTIONS = {
+    '360p': (640, 360),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+}
+
+SENTENCES = {
+    'ch': [
+        '今天的天气真不错', '我们明天一起去看电影吧', '你到底想说什么', '这件事情没有那么简单',
+        '快点跟上，别掉队了', '我一直在这里等你', '谢谢你的帮助', '这是我们最后的机会',
+        '他已经离开很久了', '相信我，一切都会好起来的', '欢迎来到我们的城市', '不要忘记你的承诺',
+        '时间不多了，赶紧出发', '这个问题我们稍后再讨论', '你听说过这个故事吗', '我们必须马上离开这里',
+    ],
+    'en': [
+        'Nice weather today', 'Let us go to the movies tomorrow', 'What are you trying to say',
+        'It is not that simple', 'Hurry up and keep up', 'I have been waiting here for you',
+        'Thank you for your help', 'This is our last chance', 'He has been gone for a long time',
+        'Trust me, everything will be fine', 'Welcome to our city', 'Do not forget your promise',
+    ],
+}
+
+WATERMARK_TEXT = {'ch': '字幕测试台', 'en': 'BENCH TV'}
+SCENE_TEXTS = {'ch': ['出口', '便利店', '停车场', '医院', '火车站'], 'en': ['EXIT', 'STORE', 'PARKING', 'HOTEL']}
+
+
+class Scenario:
+    """
+    合成视频的参数
+    """
+
+    def __init__(self, name, width, height, duration, fps=25, lang='ch', watermark=True, scene_text=True, seed=0):
+        self.name = name
+        self.width = width
+        self.height = height
+        # 视频时长(秒)
+        self.duration = duration
+        self.fps = fps
+        self.lang = lang
+        self.watermark = watermark
+        self.scene_text = scene_text
+        self.seed = seed
+
+    @property
+    def frame_count(self):
+        return int(self.duration * self.fps)
+
+    @property
+    def font_size(self):
+        return max(16, int(self.height * 0.055))
+
+    @property
+    def subtitle_baseline(self):
+        """
+        字幕底边所在的y坐标
+        """
+        return int(self.height * 0.9)
+
+    @property
+    def sub_area(self):
+        """
+        字幕区域(ymin, ymax, xmin, xmax)，覆盖字幕所在位置并留出余量
+        """
+        return int(self.height * 0.75), self.height, 0, self.width
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+
+def make_cues(scenario, rng):
+    """
+    生成字幕时间轴[(start_ms, end_ms, text), ...]
+    """
+    cues = []
+    sentences = SENTENCES[scenario.lang]
+    t = rng.uniform(0.5, 1.5)
+    while True:
+        length = rng.uniform(1.5, 4.0)
+        if t + length > scenario.duration - 0.2:
+            break
+        cues.append((int(t * 1000), int((t + length) * 1000), rng.choice(sentences)))
+        t += length + rng.uniform(0.3, 1.5)
+    return cues
+
+
+def render_text(text, font, fill=(255, 255, 255), stroke_fill=(0, 0, 0), stroke_width=2):
+    """
+    将文本渲染为BGR图块与alpha通道，每段文本只渲染一次，之后逐帧贴图
+    :return (patch, alpha) patch为uint8 BGR图像，alpha为[0, 1]的float32
+    """
+    left, top, right, bottom = font.getbbox(text, stroke_width=stroke_width)
+    w, h = right - left + 2, bottom - top + 2
+    img = Image.new('RGBA', (w, h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.text((1 - left, 1 - top), text, font=font, fill=fill + (255,),
+              stroke_width=stroke_width, stroke_fill=stroke_fill + (255,))
+    rgba = np.asarray(img)
+    patch = np.ascontiguousarray(rgba[:, :, 2::-1])
+    alpha = rgba[:, :, 3:4].astype(np.float32) / 255
+    return patch, alpha
+
+
+def blend(frame, patch, alpha, x, y):
+    """
+    将图块按alpha混合到帧的(x, y)位置，超出画面的部分裁剪
+    """
+    h, w = patch.shape[:2]
+    fh, fw = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, fw), min(y + h, fh)
+    if x0 >= x1 or y0 >= y1:
+        return
+    p = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+    a = alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+    roi = frame[y0:y1, x0:x1]
+    roi[:] = (p * a + roi * (1 - a)).astype(np.uint8)
+
+
+class Background:
+    """
+    运动背景：在一张比画面大的平滑噪声图上平移取景，并叠加缓慢运动的色块，
+    使相邻帧之间存在真实视频那样的变化，避免解码与帧差逻辑过于理想
+    """
+
+    def __init__(self, width, height, rng):
+        self.width = width
+        self.height = height
+        np_rng = np.random.default_rng(rng.randint(0, 2 ** 31))
+        small = np_rng.integers(40, 200, size=(height // 16 + 8, width // 16 + 8, 3), dtype=np.uint8)
+        self.canvas = cv2.resize(small, ((width // 16 + 8) * 32, (height // 16 + 8) * 32),
+                                 interpolation=cv2.INTER_CUBIC)
+        self.blocks = []
+        for _ in range(6):
+            bw, bh = rng.randint(width // 10, width // 4), rng.randint(height // 10, height // 4)
+            self.blocks.append((rng.uniform(0, width), rng.uniform(0, height * 0.6), rng.uniform(-3, 3),
+                                rng.uniform(-1, 1), bw, bh, tuple(rng.randint(0, 255) for _ in range(3))))
+
+    def frame(self, idx):
+        max_dx = self.canvas.shape[1] - self.width
+        max_dy = self.canvas.shape[0] - self.height
+        dx = int(max_dx / 2 + max_dx / 2 * np.sin(idx / 200))
+        dy = int(max_dy / 2 + max_dy / 2 * np.cos(idx / 300))
+        img = self.canvas[dy:dy + self.height, dx:dx + self.width].copy()
+        for x, y, vx, vy, bw, bh, color in self.blocks:
+            cx = int(x + vx * idx) % self.width
+            cy = int(y + vy * idx) % self.height
+            cv2.rectangle(img, (cx, cy), (cx + bw, cy + bh), color, -1)
+        return img
+
+
+def synthesize(scenario, output_dir):
+    """
+    生成合成视频、字幕真值与场景描述
+    :return (video_path, gt_srt_path, meta_path)
+    """
+    if not os.path.exists(FONT_PATH):
+        raise FileNotFoundError(f'font not found: {FONT_PATH}')
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(scenario.seed)
+    base = os.path.join(output_dir, scenario.name)
+    video_path = base + '.mp4'
+    gt_path = base + '.gt.srt'
+    meta_path = base + '.json'
+
+    w, h = scenario.width, scenario.height
+    font = ImageFont.truetype(FONT_PATH, scenario.font_size)
+    small_font = ImageFont.truetype(FONT_PATH, max(12, scenario.font_size * 2 // 3))
+    cues = make_cues(scenario, rng)
+    # 每条字幕预先渲染，字幕水平居中，底边对齐
+    cue_patches = []
+    for start, end, text in cues:
+        patch, alpha = render_text(text, font)
+        x = (w - patch.shape[1]) // 2
+        y = scenario.subtitle_baseline - patch.shape[0]
+        cue_patches.append((start, end, patch, alpha, x, y))
+
+    watermark = None
+    if scenario.watermark:
+        patch, alpha = render_text(WATERMARK_TEXT[scenario.lang], small_font, fill=(230, 230, 230), stroke_width=1)
+        watermark = (patch, alpha * 0.8, w - patch.shape[1] - w // 40, h // 30)
+
+    # 场景文字：画面上半部分随机出现一段时间，并缓慢移动
+    scene_events = []
+    if scenario.scene_text:
+        t = rng.uniform(1, 4)
+        while t < scenario.duration - 1:
+            length = rng.uniform(1, 3)
+            patch, alpha = render_text(rng.choice(SCENE_TEXTS[scenario.lang]), font, fill=(0, 220, 255))
+            scene_events.append((int(t * scenario.fps), int((t + length) * scenario.fps), patch, alpha,
+                                 rng.randint(0, max(1, w - patch.shape[1])), rng.randint(h // 8, h // 2),
+                                 rng.uniform(-2, 2)))
+            t += length + rng.uniform(2, 6)
+
+    background = Background(w, h, rng)
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), scenario.fps, (w, h))
+    if not writer.isOpened():
+        raise RuntimeError(f'cannot open video writer: {video_path}')
+    cue_idx = 0
+    try:
+        for idx in range(scenario.frame_count):
+            frame = background.frame(idx)
+            for start, end, patch, alpha, x, y, vx in scene_events:
+                if start <= idx < end:
+                    blend(frame, patch, alpha, int(x + vx * (idx - start)), y)
+            if watermark is not None:
+                patch, alpha, x, y = watermark
+                blend(frame, patch, alpha, x, y)
+            ms = idx * 1000 / scenario.fps
+            while cue_idx < len(cue_patches) and cue_patches[cue_idx][1] <= ms:
+                cue_idx += 1
+            if cue_idx < len(cue_patches) and cue_patches[cue_idx][0] <= ms:
+                _, _, patch, alpha, x, y = cue_patches[cue_idx]
+                blend(frame, patch, alpha, x, y)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+    subs = pysrt.SubRipFile()
+    for i, (start, end, text) in enumerate(cues):
+        subs.append(pysrt.SubRipItem(index=i + 1, start=pysrt.SubRipTime(milliseconds=start),
+                                     end=pysrt.SubRipTime(milliseconds=end), text=text))
+    subs.save(gt_path, encoding='utf-8')
+    with open(meta_path, mode='w', encoding='utf-8') as f:
+        json.dump({'scenario': scenario.to_dict(), 'sub_area': scenario.sub_area, 'cues': len(cues)},
+                  f, ensure_ascii=False, indent=2)
+    return video_path, gt_path, meta_path
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: inference_queue.py
+@desc: 动态批处理推理队列
+多个线程逐个提交推理请求，后台线程将请求合并为批次：批次达到最大数量，或最早的请求等待超过最长等待时间时执行推理，
+每个请求通过Future取回自己的结果。可以按桶(e.g. 文本行图片的宽度)分组，同一批次内的输入尺寸接近，减少padding
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# 识别模型输入宽度分桶(按高度缩放到模型输入高度后的宽度)
+REC_WIDTH_BUCKETS = (160, 320, 640, 960)
+# 超过最大分桶宽度的文本行，宽度按此步长向上取整
+REC_WIDTH_STEP = 320
+
+
+class InferenceQueue:
+    """
+    e.g.
+        q = InferenceQueue(lambda images: model.predict_batch(images), max_batch_size=8, max_wait=0.01)
+        future = q.submit(image)
+        result = future.result()
+    """
+
+    def __init__(self, batch_fn, max_batch_size, max_wait=0.01, bucket_fn=None, name='inference-queue'):
+        """
+        :param batch_fn 批量推理函数，输入请求列表，返回等长的结果列表
+        :param max_batch_size 每批最多请求数
+        :param max_wait 批次中最早的请求最多等待的时间(秒)
+        :param bucket_fn 请求分桶函数，只有同一个桶的请求会合并为一批，为None时不分桶
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+        self.bucket_fn = bucket_fn
+        self.cond = threading.Condition()
+        # bucket -> [(item, future, deadline), ...]，按桶第一次出现的顺序排列
+        self.pending = OrderedDict()
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        future = Future()
+        bucket = self.bucket_fn(item) if self.bucket_fn is not None else None
+        with self.cond:
+            if self.closed:
+                raise RuntimeError('inference queue is closed')
+            self.pending.setdefault(bucket, []).append((item, future, time.perf_counter() + self.max_wait))
+            self.cond.notify()
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def close(self):
+        """
+        不再接收新请求，已提交的请求全部处理完后后台线程退出
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.worker.join()
+
+    def _take_batch(self):
+        """
+        取出下一批请求，没有可执行的批次时等待
+        :return 请求列表，队列关闭且没有剩余请求时返回None
+        """
+        with self.cond:
+            while True:
+                if not self.pending:
+                    if self.closed:
+                        return None
+                    self.cond.wait()
+                    continue
+                now = time.perf_counter()
+                found = False
+                earliest = math.inf
+                for bucket, requests in self.pending.items():
+                    # 桶已满、最早的请求已超时，或者队列已关闭时立即执行
+                    if len(requests) >= self.max_batch_size or requests[0][2] <= now or self.closed:
+                        found = True
+                        ready = bucket
+                        break
+                    earliest = min(earliest, requests[0][2])
+                if not found:
+                    self.cond.wait(earliest - now)
+                    continue
+                requests = self.pending[ready]
+                batch = requests[:self.max_batch_size]
+                if len(requests) > len(batch):
+                    self.pending[ready] = requests[len(batch):]
+                    # 剩余请求排到后面，避免一个桶一直占用
+                    self.pending.move_to_end(ready)
+                else:
+                    del self.pending[ready]
+                return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            # 调用方已取消的请求不再推理；其余请求标记为运行中，之后无法取消，设置结果时不会出错
+            batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            if len(results) != len(batch):
+                # 结果数量不一致时无法对应到请求，整批失败，避免调用方一直等待
+                error = RuntimeError(f'{len(batch)} requests but batch_fn returned {len(results)} results')
+                for _, future, _ in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+
+def rec_bucket_width(width, buckets=REC_WIDTH_BUCKETS):
+    """
+    缩放后的文本行宽度向上取整到分桶宽度
+    """
+    for bound in buckets:
+        if width <= bound:
+            return bound
+    return int(math.ceil(width / REC_WIDTH_STEP)) * REC_WIDTH_STEP
+
+
+def padded_batch_size(n, max_batch_size):
+    """
+    批次大小向上取整到2的幂(不超过max_batch_size)，推理模型只会遇到少数几种批次大小
+    """
+    size = 1
+    while size < n:
+        size *= 2
+    return min(size, max(n, max_batch_size))
+
+
+def rec_shape_count(max_batch_size, buckets=REC_WIDTH_BUCKETS):
+    """
+    分桶后识别模型常见的输入形状数量：(分桶数 + 超宽文本行的若干宽度) x 批次大小种类
+    """
+    batch_sizes = {padded_batch_size(n, max_batch_size) for n in range(1, max(1, max_batch_size) + 1)}
+    return (len(buckets) + 2) * len(batch_sizes)
+
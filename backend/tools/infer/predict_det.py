@@ -30,12 +30,61 @@ from ppocr.utils.logging import get_logger
 from ppocr.utils.utility import get_image_file_list, check_and_read_gif
 from ppocr.data import create_operators, transform
 from ppocr.postprocess import build_post_process
+from tools import instrument
 import json
 logger = get_logger()
 
 
+class DetPreprocess(object):
+    """
+    检测模型预处理：与DetResizeForTest -> NormalizeImage -> ToCHWImage结果一致，
+    但缩放结果与NCHW输入数组按尺寸预分配并复用，归一化通过uint8 -> float32查找表直接写入输入数组，
+    同一尺寸的视频帧预处理不再分配内存
+    """
+    # 最多缓存的输入尺寸数量
+    MAX_CACHED_SHAPES = 4
+
+    def __init__(self, resize_op, normalize_op):
+        self.resize_op = resize_op
+        # (x * scale - mean) / std，每个通道一张256项的查找表
+        values = np.arange(256, dtype=np.float32) * normalize_op.scale
+        mean = normalize_op.mean.reshape(-1)
+        std = normalize_op.std.reshape(-1)
+        self.lut = np.stack([(values - mean[c]) / std[c] for c in range(3)]).astype(np.float32)
+        self.buffers = {}
+        self.shape_list = np.zeros((1, 4), dtype=np.float64)
+
+    def get_buffers(self, resize_h, resize_w):
+        key = (resize_h, resize_w)
+        buffers = self.buffers.get(key)
+        if buffers is None:
+            if len(self.buffers) >= self.MAX_CACHED_SHAPES:
+                self.buffers.clear()
+            buffers = (np.empty((resize_h, resize_w, 3), dtype=np.uint8),
+                       np.empty((1, 3, resize_h, resize_w), dtype=np.float32))
+            self.buffers[key] = buffers
+        return buffers
+
+    def __call__(self, img):
+        """
+        :return (1x3xHxW输入数组, 1x4的[src_h, src_w, ratio_h, ratio_w])，两者在下一次调用时会被覆盖
+        """
+        src_h, src_w = img.shape[:2]
+        resize_h, resize_w = self.resize_op.resize_shape(src_h, src_w)
+        resized, tensor = self.get_buffers(resize_h, resize_w)
+        if (resize_h, resize_w) == (src_h, src_w):
+            resized = img
+        else:
+            cv2.resize(img, (resize_w, resize_h), dst=resized)
+        for c in range(3):
+            np.take(self.lut[c], resized[:, :, c], out=tensor[0, c])
+        self.shape_list[0] = (src_h, src_w, resize_h / float(src_h), resize_w / float(src_w))
+        return tensor, self.shape_list
+
+
 class TextDetector(object):
     def __init__(self, args):
+        args = utility.apply_tune_profile(args, 'det')
         self.args = args
         self.det_algorithm = args.det_algorithm
         self.use_onnx = args.use_onnx
@@ -67,6 +116,7 @@ class TextDetector(object):
             postprocess_params["unclip_ratio"] = args.det_db_unclip_ratio
             postprocess_params["use_dilation"] = args.use_dilation
             postprocess_params["score_mode"] = args.det_db_score_mode
+            postprocess_params["use_components"] = args.det_db_use_components
         elif self.det_algorithm == "EAST":
             postprocess_params['name'] = 'EASTPostProcess'
             postprocess_params["score_thresh"] = args.det_east_score_thresh
@@ -128,6 +178,7 @@ class TextDetector(object):
                     }
                 }
         self.preprocess_op = create_operators(pre_process_list)
+        self.fused_preprocess = DetPreprocess(self.preprocess_op[0], self.preprocess_op[1])
 
         if args.benchmark:
             import auto_log
@@ -189,37 +240,41 @@ class TextDetector(object):
         return dt_boxes
 
     def __call__(self, img):
-        ori_im = img.copy()
-        data = {'image': img}
+        ori_shape = img.shape
+        inst = instrument.get_instrument()
 
         st = time.time()
 
         if self.args.benchmark:
             self.autolog.times.start()
 
-        data = transform(data, self.preprocess_op)
-        img, shape_list = data
-        if img is None:
-            return None, 0
-        img = np.expand_dims(img, axis=0)
-        shape_list = np.expand_dims(shape_list, axis=0)
-        img = img.copy()
+        with inst.span(instrument.SPAN_DET_PREPROCESS):
+            if img.ndim == 3 and img.shape[2] == 3 and img.dtype == np.uint8:
+                img, shape_list = self.fused_preprocess(img)
+            else:
+                img, shape_list = transform({'image': img}, self.preprocess_op)
+                if img is None:
+                    return None, 0
+                img = np.expand_dims(img, axis=0)
+                shape_list = np.expand_dims(shape_list, axis=0)
+                img = img.copy()
 
         if self.args.benchmark:
             self.autolog.times.stamp()
-        if self.use_onnx:
-            input_dict = {}
-            input_dict[self.input_tensor.name] = img
-            outputs = self.predictor.run(self.output_tensors, input_dict)
-        else:
-            self.input_tensor.copy_from_cpu(img)
-            self.predictor.run()
-            outputs = []
-            for output_tensor in self.output_tensors:
-                output = output_tensor.copy_to_cpu()
-                outputs.append(output)
-            if self.args.benchmark:
-                self.autolog.times.stamp()
+        with inst.span(instrument.SPAN_DET_INFER):
+            if self.use_onnx:
+                input_dict = {}
+                input_dict[self.input_tensor.name] = img
+                outputs = self.predictor.run(self.output_tensors, input_dict)
+            else:
+                self.input_tensor.copy_from_cpu(img)
+                self.predictor.run()
+                outputs = []
+                for output_tensor in self.output_tensors:
+                    output = output_tensor.copy_to_cpu()
+                    outputs.append(output)
+                if self.args.benchmark:
+                    self.autolog.times.stamp()
 
         preds = {}
         if self.det_algorithm == "EAST":
@@ -239,14 +294,15 @@ class TextDetector(object):
             raise NotImplementedError
 
         #self.predictor.try_shrink_memory()
-        post_result = self.postprocess_op(preds, shape_list)
-        dt_boxes = post_result[0]['points']
-        if (self.det_algorithm == "SAST" and self.det_sast_polygon) or (
-                self.det_algorithm in ["PSE", "FCE"] and
-                self.postprocess_op.box_type == 'poly'):
-            dt_boxes = self.filter_tag_det_res_only_clip(dt_boxes, ori_im.shape)
-        else:
-            dt_boxes = self.filter_tag_det_res(dt_boxes, ori_im.shape)
+        with inst.span(instrument.SPAN_DET_POSTPROCESS):
+            post_result = self.postprocess_op(preds, shape_list)
+            dt_boxes = post_result[0]['points']
+            if (self.det_algorithm == "SAST" and self.det_sast_polygon) or (
+                    self.det_algorithm in ["PSE", "FCE"] and
+                    self.postprocess_op.box_type == 'poly'):
+                dt_boxes = self.filter_tag_det_res_only_clip(dt_boxes, ori_shape)
+            else:
+                dt_boxes = self.filter_tag_det_res(dt_boxes, ori_shape)
 
         if self.args.benchmark:
             self.autolog.times.end(stamp=True)
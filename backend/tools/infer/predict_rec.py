@@ -31,12 +31,15 @@ import tools.infer.utility as utility
 from ppocr.postprocess import build_post_process
 from ppocr.utils.logging import get_logger
 from ppocr.utils.utility import get_image_file_list, check_and_read_gif
+from tools import instrument
+from tools.infer.inference_queue import rec_bucket_width, padded_batch_size
 
 logger = get_logger()
 
 
 class TextRecognizer(object):
     def __init__(self, args):
+        args = utility.apply_tune_profile(args, 'rec')
         self.rec_image_shape = [int(v) for v in args.rec_image_shape.split(",")]
         self.rec_batch_num = args.rec_batch_num
         self.rec_algorithm = args.rec_algorithm
@@ -70,10 +73,21 @@ class TextRecognizer(object):
                 "use_space_char": args.use_space_char
             }
         self.postprocess_op = build_post_process(postprocess_params)
+        # CTC解码同时返回每个字符的置信度，识别结果为(text, score, char_probs)，用于多帧识别结果逐字融合
+        self.postprocess_kwargs = {'return_char_prob': True} if postprocess_params['name'] == 'CTCLabelDecode' else {}
         self.predictor, self.input_tensor, self.output_tensors, self.config = \
             utility.create_predictor(args, 'rec', logger)
         self.benchmark = args.benchmark
         self.use_onnx = args.use_onnx
+        # CTC识别模型支持任意输入宽度：按宽度分桶组批，输入宽度取整到桶宽度，批次大小取整到2的幂，
+        # 推理模型只会遇到少数几种固定的输入形状，输入数组按形状预分配并复用
+        self.use_width_bucket = self.rec_algorithm not in ('SRN', 'RARE', 'NRTR', 'SAR', 'SVTR')
+        if self.use_onnx:
+            w = self.input_tensor.shape[3:][0]
+            if isinstance(w, int) and w > 0:
+                # 固定输入宽度的onnx模型
+                self.use_width_bucket = False
+        self.input_buffers = {}
         if args.benchmark:
             import auto_log
             pid = os.getpid()
@@ -132,6 +146,52 @@ class TextRecognizer(object):
         padding_im[:, :, 0:resized_w] = resized_image
         return padding_im
 
+    def bucket_batches(self, img_list):
+        """
+        按缩放到模型输入高度后的宽度分桶，桶内按宽度排序后每rec_batch_num张为一批
+        :return [(图片序号列表, 桶宽度), ...]
+        """
+        imgH = self.rec_image_shape[1]
+        widths = [int(math.ceil(imgH * img.shape[1] / float(img.shape[0]))) for img in img_list]
+        buckets = {}
+        for ino in np.argsort(np.array(widths)):
+            buckets.setdefault(rec_bucket_width(widths[ino]), []).append(int(ino))
+        batches = []
+        for bucket_w in sorted(buckets):
+            indices = buckets[bucket_w]
+            for beg_img_no in range(0, len(indices), self.rec_batch_num):
+                batches.append((indices[beg_img_no:beg_img_no + self.rec_batch_num], bucket_w))
+        return batches
+
+    def get_input_buffer(self, batch_size, width):
+        key = (batch_size, width)
+        buffer = self.input_buffers.get(key)
+        if buffer is None:
+            imgC, imgH, _ = self.rec_image_shape
+            buffer = np.empty((batch_size, imgC, imgH, width), dtype=np.float32)
+            self.input_buffers[key] = buffer
+        return buffer
+
+    def norm_img_bucket(self, img_list, indices, bucket_w):
+        """
+        缩放、归一化后直接写入复用的输入数组，文本行右侧以及补齐批次的空行填0
+        """
+        imgC, imgH, _ = self.rec_image_shape
+        norm_img_batch = self.get_input_buffer(padded_batch_size(len(indices), self.rec_batch_num), bucket_w)
+        for row, ino in enumerate(indices):
+            img = img_list[ino]
+            assert imgC == img.shape[2]
+            h, w = img.shape[:2]
+            resized_w = min(bucket_w, int(math.ceil(imgH * w / float(h))))
+            resized_image = cv2.resize(img, (resized_w, imgH))
+            # (x / 255 - 0.5) / 0.5
+            dst = norm_img_batch[row, :, :, :resized_w]
+            np.multiply(resized_image.transpose((2, 0, 1)), 1 / 127.5, out=dst, casting='unsafe')
+            dst -= 1.0
+            norm_img_batch[row, :, :, resized_w:] = 0
+        norm_img_batch[len(indices):] = 0
+        return norm_img_batch
+
     def resize_norm_img_svtr(self, img, image_shape):
 
         imgC, imgH, imgW = image_shape
@@ -252,64 +312,72 @@ class TextRecognizer(object):
 
     def __call__(self, img_list):
         img_num = len(img_list)
-        # Calculate the aspect ratio of all text bars
-        width_list = []
-        for img in img_list:
-            width_list.append(img.shape[1] / float(img.shape[0]))
-        # Sorting can speed up the recognition process
-        indices = np.argsort(np.array(width_list))
+        if self.use_width_bucket:
+            batches = self.bucket_batches(img_list)
+        else:
+            # Calculate the aspect ratio of all text bars
+            width_list = []
+            for img in img_list:
+                width_list.append(img.shape[1] / float(img.shape[0]))
+            # Sorting can speed up the recognition process
+            indices = np.argsort(np.array(width_list))
+            batches = [(indices[beg_img_no:beg_img_no + self.rec_batch_num], None)
+                       for beg_img_no in range(0, img_num, self.rec_batch_num)]
         rec_res = [['', 0.0]] * img_num
-        batch_num = self.rec_batch_num
+        inst = instrument.get_instrument()
         st = time.time()
         if self.benchmark:
             self.autolog.times.start()
-        for beg_img_no in range(0, img_num, batch_num):
-            end_img_no = min(img_num, beg_img_no + batch_num)
-            norm_img_batch = []
-            imgC, imgH, imgW = self.rec_image_shape
-            max_wh_ratio = imgW / imgH
-            # max_wh_ratio = 0
-            for ino in range(beg_img_no, end_img_no):
-                h, w = img_list[indices[ino]].shape[0:2]
-                wh_ratio = w * 1.0 / h
-                max_wh_ratio = max(max_wh_ratio, wh_ratio)
-            for ino in range(beg_img_no, end_img_no):
-
-                if self.rec_algorithm == "SAR":
-                    norm_img, _, _, valid_ratio = self.resize_norm_img_sar(
-                        img_list[indices[ino]], self.rec_image_shape)
-                    norm_img = norm_img[np.newaxis, :]
-                    valid_ratio = np.expand_dims(valid_ratio, axis=0)
-                    valid_ratios = []
-                    valid_ratios.append(valid_ratio)
-                    norm_img_batch.append(norm_img)
-                elif self.rec_algorithm == "SRN":
-                    norm_img = self.process_image_srn(
-                        img_list[indices[ino]], self.rec_image_shape, 8, 25)
-                    encoder_word_pos_list = []
-                    gsrm_word_pos_list = []
-                    gsrm_slf_attn_bias1_list = []
-                    gsrm_slf_attn_bias2_list = []
-                    encoder_word_pos_list.append(norm_img[1])
-                    gsrm_word_pos_list.append(norm_img[2])
-                    gsrm_slf_attn_bias1_list.append(norm_img[3])
-                    gsrm_slf_attn_bias2_list.append(norm_img[4])
-                    norm_img_batch.append(norm_img[0])
-                elif self.rec_algorithm == "SVTR":
-                    norm_img = self.resize_norm_img_svtr(img_list[indices[ino]],
-                                                         self.rec_image_shape)
-                    norm_img = norm_img[np.newaxis, :]
-                    norm_img_batch.append(norm_img)
-                else:
-                    norm_img = self.resize_norm_img(img_list[indices[ino]],
-                                                    max_wh_ratio)
-                    norm_img = norm_img[np.newaxis, :]
-                    norm_img_batch.append(norm_img)
-            norm_img_batch = np.concatenate(norm_img_batch)
-            norm_img_batch = norm_img_batch.copy()
+        for batch_indices, bucket_w in batches:
+            if bucket_w is not None:
+                norm_img_batch = self.norm_img_bucket(img_list, batch_indices, bucket_w)
+            else:
+                norm_img_batch = []
+                imgC, imgH, imgW = self.rec_image_shape
+                max_wh_ratio = imgW / imgH
+                # max_wh_ratio = 0
+                for ino in batch_indices:
+                    h, w = img_list[ino].shape[0:2]
+                    wh_ratio = w * 1.0 / h
+                    max_wh_ratio = max(max_wh_ratio, wh_ratio)
+                for ino in batch_indices:
+
+                    if self.rec_algorithm == "SAR":
+                        norm_img, _, _, valid_ratio = self.resize_norm_img_sar(
+                            img_list[ino], self.rec_image_shape)
+                        norm_img = norm_img[np.newaxis, :]
+                        valid_ratio = np.expand_dims(valid_ratio, axis=0)
+                        valid_ratios = []
+                        valid_ratios.append(valid_ratio)
+                        norm_img_batch.append(norm_img)
+                    elif self.rec_algorithm == "SRN":
+                        norm_img = self.process_image_srn(
+                            img_list[ino], self.rec_image_shape, 8, 25)
+                        encoder_word_pos_list = []
+                        gsrm_word_pos_list = []
+                        gsrm_slf_attn_bias1_list = []
+                        gsrm_slf_attn_bias2_list = []
+                        encoder_word_pos_list.append(norm_img[1])
+                        gsrm_word_pos_list.append(norm_img[2])
+                        gsrm_slf_attn_bias1_list.append(norm_img[3])
+                        gsrm_slf_attn_bias2_list.append(norm_img[4])
+                        norm_img_batch.append(norm_img[0])
+                    elif self.rec_algorithm == "SVTR":
+                        norm_img = self.resize_norm_img_svtr(img_list[ino],
+                                                             self.rec_image_shape)
+                        norm_img = norm_img[np.newaxis, :]
+                        norm_img_batch.append(norm_img)
+                    else:
+                        norm_img = self.resize_norm_img(img_list[ino],
+                                                        max_wh_ratio)
+                        norm_img = norm_img[np.newaxis, :]
+                        norm_img_batch.append(norm_img)
+                norm_img_batch = np.concatenate(norm_img_batch)
+                norm_img_batch = norm_img_batch.copy()
             if self.benchmark:
                 self.autolog.times.stamp()
 
+            infer_st = time.perf_counter()
             if self.rec_algorithm == "SRN":
                 encoder_word_pos_list = np.concatenate(encoder_word_pos_list)
                 gsrm_word_pos_list = np.concatenate(gsrm_word_pos_list)
@@ -391,9 +459,15 @@ class TextRecognizer(object):
                         preds = outputs
                     else:
                         preds = outputs[0]
-            rec_result = self.postprocess_op(preds)
-            for rno in range(len(rec_result)):
-                rec_res[indices[beg_img_no + rno]] = rec_result[rno]
+            inst.add_span(instrument.SPAN_REC_INFER, infer_st, time.perf_counter() - infer_st)
+            if len(batch_indices) < len(norm_img_batch):
+                # 补齐批次的空行不需要解码
+                n = len(batch_indices)
+                preds = [pred[:n] for pred in preds] if isinstance(preds, list) else preds[:n]
+            with inst.span(instrument.SPAN_CTC_DECODE):
+                rec_result = self.postprocess_op(preds, **self.postprocess_kwargs)
+            for ino, result in zip(batch_indices, rec_result):
+                rec_res[ino] = result
             if self.benchmark:
                 self.autolog.times.end(stamp=True)
         return rec_res, time.time() - st
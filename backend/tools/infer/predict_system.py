@@ -22,7 +22,6 @@ sys.path.insert(0, os.path.abspath(os.path.join(__dir__, '../..')))
 os.environ["FLAGS_allocator_strategy"] = 'auto_growth'
 
 import cv2
-import copy
 import numpy as np
 import json
 import time
@@ -34,7 +33,8 @@ import tools.infer.predict_det as predict_det
 import tools.infer.predict_cls as predict_cls
 from ppocr.utils.utility import get_image_file_list, check_and_read_gif
 from ppocr.utils.logging import get_logger
-from tools.infer.utility import draw_ocr_box_txt, get_rotate_crop_image
+from tools.infer.utility import draw_ocr_box_txt, crop_text_images
+from tools import instrument
 logger = get_logger()
 
 
@@ -64,32 +64,62 @@ class TextSystem(object):
             logger.debug(f"{bno}, {rec_res[bno]}")
         self.crop_image_res_index += bbox_num
 
-    def __call__(self, img, cls=True):
-        ori_im = img.copy()
+    def detect_and_crop(self, img, cls=True):
+        """
+        detect text boxes and crop them from the image
+        return: (dt_boxes, img_crop_list), dt_boxes is None when detection failed.
+        horizontal crops are views of img, img must not be modified until they are recognized
+        """
         dt_boxes, elapse = self.text_detector(img)
 
         if dt_boxes is None:
-            return None, None
-        img_crop_list = []
+            return None, []
 
         dt_boxes = sorted_boxes(dt_boxes)
 
-        for bno in range(len(dt_boxes)):
-            tmp_box = copy.deepcopy(dt_boxes[bno])
-            img_crop = get_rotate_crop_image(ori_im, tmp_box)
-            img_crop_list.append(img_crop)
+        with instrument.get_instrument().span(instrument.SPAN_CROP_ROTATE):
+            img_crop_list = crop_text_images(img, dt_boxes)
         if self.use_angle_cls and cls:
             img_crop_list, angle_list, elapse = self.text_classifier(
                 img_crop_list)
+        return dt_boxes, img_crop_list
 
+    def __call__(self, img, cls=True):
+        dt_boxes, img_crop_list = self.detect_and_crop(img, cls)
+        if dt_boxes is None:
+            return None, None
 
         rec_res, elapse = self.text_recognizer(img_crop_list)
         if self.args.save_crop_res:
             self.draw_crop_rec_res(self.args.crop_res_save_dir, img_crop_list,
                                    rec_res)
+        return self.filter_by_score(dt_boxes, rec_res)
+
+    def predict_batch(self, img_list, cls=True):
+        """
+        detect each image, then recognize the crops of all images in one call,
+        so that crops from different images share the same rec batches
+        return: [(dt_boxes, rec_res), ...] in the order of img_list
+        """
+        detected = [self.detect_and_crop(img, cls) for img in img_list]
+        all_crops = [crop for _, crops in detected for crop in crops]
+        rec_res = []
+        if len(all_crops) > 0:
+            rec_res, elapse = self.text_recognizer(all_crops)
+        results = []
+        offset = 0
+        for dt_boxes, crops in detected:
+            if dt_boxes is None:
+                results.append((None, None))
+                continue
+            results.append(self.filter_by_score(dt_boxes, rec_res[offset:offset + len(crops)]))
+            offset += len(crops)
+        return results
+
+    def filter_by_score(self, dt_boxes, rec_res):
         filter_boxes, filter_rec_res = [], []
         for box, rec_result in zip(dt_boxes, rec_res):
-            text, score = rec_result
+            text, score = rec_result[:2]
             if score >= self.drop_score:
                 filter_boxes.append(box)
                 filter_rec_res.append(rec_result)
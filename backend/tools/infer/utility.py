@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import argparse
+import copy
+import json
 import os
 import sys
 import platform
@@ -54,6 +56,7 @@ def init_args():
     parser.add_argument("--max_batch_size", type=int, default=10)
     parser.add_argument("--use_dilation", type=str2bool, default=False)
     parser.add_argument("--det_db_score_mode", type=str, default="fast")
+    parser.add_argument("--det_db_use_components", type=str2bool, default=False)
     # EAST parmas
     parser.add_argument("--det_east_score_thresh", type=float, default=0.8)
     parser.add_argument("--det_east_cover_thresh", type=float, default=0.1)
@@ -135,6 +138,9 @@ def init_args():
 
     parser.add_argument("--show_log", type=str2bool, default=False)
     parser.add_argument("--use_onnx", type=str2bool, default=False)
+
+    # tuned inference params, written by tools/benchmark/autotune.py
+    parser.add_argument("--tune_profile", type=str, default=None)
     return parser
 
 
@@ -143,6 +149,54 @@ def parse_args():
     return parser.parse_args()
 
 
+# params that autotune may override for each predictor
+TUNABLE_PARAMS = {
+    'det': ('cpu_threads', 'enable_mkldnn', 'det_limit_side_len'),
+    'rec': ('cpu_threads', 'enable_mkldnn', 'rec_batch_num'),
+}
+
+_tune_profile_cache = {}
+
+
+def load_tune_profile(path):
+    """
+    load the tune profile json, cached by path and modify time
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _tune_profile_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, mode='r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        profile = None
+    _tune_profile_cache[path] = (mtime, profile)
+    return profile
+
+
+def apply_tune_profile(args, mode):
+    """
+    return a copy of args with the tuned params of the given predictor mode,
+    the profile is ignored when it was tuned for another model or device
+    """
+    profile = load_tune_profile(getattr(args, 'tune_profile', None))
+    if not profile or mode not in profile:
+        return args
+    stage = profile[mode]
+    model_dir = args.det_model_dir if mode == 'det' else args.rec_model_dir
+    if model_dir is None or os.path.abspath(stage.get('model_dir', '')) != os.path.abspath(model_dir) \
+            or stage.get('use_gpu') != bool(args.use_gpu):
+        return args
+    args = copy.copy(args)
+    for name in TUNABLE_PARAMS[mode]:
+        if name in stage.get('params', {}):
+            setattr(args, name, stage['params'][name])
+    return args
+
+
 def create_predictor(args, mode, logger):
     if mode == "det":
         model_dir = args.det_model_dir
@@ -294,7 +348,12 @@ def create_predictor(args, mode, logger):
                 config.set_cpu_math_library_num_threads(10)
             if args.enable_mkldnn:
                 # cache 10 different shapes for mkldnn to avoid memory leak
-                config.set_mkldnn_cache_capacity(10)
+                if mode == 'rec':
+                    # 识别模型输入按宽度与批次大小分桶(见predict_rec.TextRecognizer.bucket_batches)，缓存所有分桶形状
+                    from tools.infer.inference_queue import rec_shape_count
+                    config.set_mkldnn_cache_capacity(max(10, rec_shape_count(args.rec_batch_num)))
+                else:
+                    config.set_mkldnn_cache_capacity(10)
                 config.enable_mkldnn()
                 if args.precision == "fp16":
                     config.enable_mkldnn_bfloat16()
@@ -635,6 +694,44 @@ def get_rotate_crop_image(img, points):
     return dst_img
 
 
+def crop_text_images(img, boxes, tolerance=1.0):
+    """
+    crop text boxes from img for recognition.
+    boxes whose edges are axis-aligned (within tolerance pixels) are returned as
+    slices of img without resampling, the recognizer resizes them once to its
+    input height; only rotated boxes go through get_rotate_crop_image.
+    args:
+        img(array): image with shape [h, w, c], must not be modified while the crops are in use
+        boxes(list|array): clockwise boxes with shape [4, 2] (top-left first)
+    return: list of crops in the order of boxes
+    """
+    if len(boxes) == 0:
+        return []
+    points = np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+    xs, ys = points[:, :, 0], points[:, :, 1]
+    axis_aligned = (np.abs(ys[:, 0] - ys[:, 1]) <= tolerance) & (np.abs(ys[:, 2] - ys[:, 3]) <= tolerance) & \
+                   (np.abs(xs[:, 0] - xs[:, 3]) <= tolerance) & (np.abs(xs[:, 1] - xs[:, 2]) <= tolerance)
+    # same output size as get_rotate_crop_image
+    widths = np.maximum(np.linalg.norm(points[:, 0] - points[:, 1], axis=1),
+                        np.linalg.norm(points[:, 2] - points[:, 3], axis=1)).astype(np.int32)
+    heights = np.maximum(np.linalg.norm(points[:, 0] - points[:, 3], axis=1),
+                         np.linalg.norm(points[:, 1] - points[:, 2], axis=1)).astype(np.int32)
+    img_height, img_width = img.shape[0:2]
+    crops = []
+    for bno in range(len(points)):
+        left, top = int(round(xs[bno, 0])), int(round(ys[bno, 0]))
+        right, bottom = left + int(widths[bno]), top + int(heights[bno])
+        if not axis_aligned[bno] or widths[bno] <= 0 or heights[bno] <= 0 or left < 0 or top < 0 \
+                or right > img_width or bottom > img_height:
+            crops.append(get_rotate_crop_image(img, points[bno].copy()))
+            continue
+        crop = img[top:bottom, left:right]
+        if heights[bno] * 1.0 / widths[bno] >= 1.5:
+            crop = np.rot90(crop)
+        crops.append(crop)
+    return crops
+
+
 def check_gpu(use_gpu):
     if use_gpu and not paddle.is_compiled_with_cuda():
         use_gpu = False
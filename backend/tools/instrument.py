@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: instrument.py
+@desc: 轻量级性能埋点：按名称记录各阶段耗时、计数器与队列深度，
+       可汇总为各阶段耗时报告，并导出为JSON或Chrome trace(chrome://tracing, Perfetto)格式
+"""
+import json
+import os
+import threading
+import time
+
+# 流水线中使用的阶段名称
+SPAN_DECODE = 'decode'
+SPAN_SEEK = 'seek'
+SPAN_CROP = 'crop'
+SPAN_DET_PREPROCESS = 'det-preprocess'
+SPAN_DET_INFER = 'det-infer'
+SPAN_DET_POSTPROCESS = 'det-postprocess'
+SPAN_CROP_ROTATE = 'crop-rotate'
+SPAN_REC_INFER = 'rec-infer'
+SPAN_CTC_DECODE = 'ctc-decode'
+SPAN_QUEUE_WAIT = 'queue-wait'
+SPAN_DEDUP = 'dedup'
+SPAN_SRT_WRITE = 'srt-write'
+
+# 计数器名称
+COUNTER_FRAMES_SAMPLED = 'frames_sampled'
+COUNTER_FRAMES_SKIPPED = 'frames_skipped'
+COUNTER_FRAMES_CACHED = 'frames_cached'
+
+
+class _NullSpan:
+    """
+    未开启埋点时使用的空上下文，几乎没有开销
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('instrument', 'name', 'start')
+
+    def __init__(self, instrument, name):
+        self.instrument = instrument
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.instrument.add_span(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class Instrument:
+    """
+    埋点记录器，每个进程一个实例(见get_instrument)
+    子进程记录的数据可以通过dump写入文件，再由主进程load合并
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        # (name, ts_us, dur_us, pid, tid)
+        self.spans = []
+        # name -> value
+        self.counters = {}
+        # name -> [(ts_us, value), ...]
+        self.gauges = {}
+        # 以墙上时间为基准，保证不同进程记录的时间可以对齐
+        self._wall_anchor = time.time()
+        self._perf_anchor = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+            self.counters = {}
+            self.gauges = {}
+
+    def _to_us(self, perf_ts):
+        return (self._wall_anchor + perf_ts - self._perf_anchor) * 1e6
+
+    def span(self, name):
+        """
+        记录一段代码的耗时
+        e.g. with instrument.span(SPAN_DECODE): ret, frame = cap.read()
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def add_span(self, name, start, duration):
+        """
+        添加一段已经测量好的耗时
+        :param name 阶段名称
+        :param start time.perf_counter()起始时间
+        :param duration 耗时(秒)
+        """
+        if not self.enabled:
+            return
+        event = (name, self._to_us(start), duration * 1e6, os.getpid(), threading.get_ident())
+        with self.lock:
+            self.spans.append(event)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        """
+        记录某个数值随时间的变化，e.g. 队列深度
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges.setdefault(name, []).append((self._to_us(time.perf_counter()), value))
+
+    def summary(self):
+        """
+        按阶段汇总耗时
+        :return {name: {'count', 'total', 'mean', 'p50', 'p95', 'max'}}，单位为秒
+        """
+        durations = {}
+        with self.lock:
+            for name, _, dur, _, _ in self.spans:
+                durations.setdefault(name, []).append(dur / 1e6)
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            n = len(values)
+            total = sum(values)
+            result[name] = {
+                'count': n,
+                'total': total,
+                'mean': total / n,
+                'p50': values[int(0.5 * (n - 1))],
+                'p95': values[int(0.95 * (n - 1))],
+                'max': values[-1],
+            }
+        return result
+
+    def report(self):
+        """
+        生成各阶段耗时报告文本
+        """
+        summary = self.summary()
+        lines = [f"{'stage':<16}{'count':>8}{'total(s)':>12}{'mean(ms)':>12}{'p50(ms)':>12}{'p95(ms)':>12}{'max(ms)':>12}"]
+        for name, s in sorted(summary.items(), key=lambda x: -x[1]['total']):
+            lines.append(f"{name:<16}{s['count']:>8}{s['total']:>12.3f}{s['mean'] * 1000:>12.2f}"
+                         f"{s['p50'] * 1000:>12.2f}{s['p95'] * 1000:>12.2f}{s['max'] * 1000:>12.2f}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<16}{value:>8}")
+        for name, values in sorted(self.gauges.items()):
+            depth = [v for _, v in values]
+            lines.append(f"{name:<16}{len(depth):>8} samples, mean {sum(depth) / len(depth):.1f}, max {max(depth)}")
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """
+        将原始记录写入文件，用于子进程向主进程传递数据
+        """
+        with self.lock:
+            data = {'spans': self.spans, 'counters': self.counters, 'gauges': self.gauges}
+            with open(path, mode='w', encoding='utf-8') as f:
+                json.dump(data, f)
+
+    def load(self, path):
+        """
+        合并dump写入的记录
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, mode='r', encoding='utf-8') as f:
+            data = json.load(f)
+        with self.lock:
+            self.spans.extend(tuple(s) for s in data['spans'])
+            for name, value in data['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, values in data['gauges'].items():
+                self.gauges.setdefault(name, []).extend(tuple(v) for v in values)
+
+    def export_json(self, path, **extra):
+        """
+        导出汇总报告
+        """
+        data = dict(extra)
+        data['stages'] = self.summary()
+        data['counters'] = dict(self.counters)
+        data['gauges'] = {name: [list(v) for v in values] for name, values in self.gauges.items()}
+        with open(path, mode='w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def export_chrome_trace(self, path):
+        """
+        导出Chrome trace格式，可用chrome://tracing或Perfetto打开
+        """
+        events = []
+        with self.lock:
+            for name, ts, dur, pid, tid in self.spans:
+                events.append({'name': name, 'ph': 'X', 'ts': ts, 'dur': dur, 'pid': pid, 'tid': tid})
+            for name, values in self.gauges.items():
+                for ts, value in values:
+                    events.append({'name': name, 'ph': 'C', 'ts': ts, 'pid': os.getpid(), 'args': {name: value}})
+        with open(path, mode='w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+_instrument = None
+
+
+def get_instrument():
+    """
+    获取当前进程的埋点记录器
+    """
+    global _instrument
+    if _instrument is None:
+        _instrument = Instrument()
+    return _instrument
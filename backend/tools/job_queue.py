@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: job_queue.py
+@desc: 后台处理任务队列
+任务保存在SQLite中(服务重启后排队中的任务继续处理)，固定数量的工作线程依次领取任务，
+每个工作线程调用一次create_worker创建处理函数，可在其中创建线程内复用的对象；处理函数通过JobContext汇报进度并检查是否已取消，
+完成的任务保留一段时间后连同结果文件一起清理。只依赖标准库，可以直接在本地测试
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# 任务状态
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_CANCELLING = 'cancelling'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+JOB_FIELDS = ('id', 'filename', 'input_path', 'output_path', 'status', 'progress', 'error', 'created', 'updated',
+              'finished')
+
+
+class JobCancelled(Exception):
+    """
+    处理函数检查到任务已取消时抛出
+    """
+    pass
+
+
+class JobStore:
+    """
+    SQLite任务表，所有方法线程安全
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, filename TEXT, input_path TEXT, output_path TEXT, status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0, error TEXT, created REAL NOT NULL, updated REAL NOT NULL, finished REAL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)')
+
+    def create(self, filename, input_path, output_path, job_id=None):
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT INTO jobs (id, filename, input_path, output_path, status, created, updated) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (job_id, filename, input_path, output_path, STATUS_QUEUED, now, now))
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list(self, status=None, limit=100):
+        with self.lock:
+            if status is None:
+                rows = self.conn.execute('SELECT * FROM jobs ORDER BY created DESC LIMIT ?', (limit,)).fetchall()
+            else:
+                rows = self.conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?',
+                                         (status, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id, **fields):
+        """
+        :return 是否找到任务
+        """
+        fields = {k: v for k, v in fields.items() if k in JOB_FIELDS and k != 'id'}
+        fields['updated'] = time.time()
+        if fields.get('status') in FINISHED_STATUSES:
+            fields.setdefault('finished', fields['updated'])
+        columns = ', '.join(f'{k} = ?' for k in fields)
+        with self.lock:
+            cursor = self.conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+        return cursor.rowcount > 0
+
+    def set_progress(self, job_id, progress):
+        with self.lock:
+            self.conn.execute('UPDATE jobs SET progress = ?, updated = ? WHERE id = ? AND status = ?',
+                              (progress, time.time(), job_id, STATUS_RUNNING))
+
+    def claim(self):
+        """
+        领取最早的排队任务并标记为running
+        :return 任务，没有排队任务时返回None
+        """
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1',
+                                        (STATUS_QUEUED,)).fetchone()
+                if row is not None:
+                    self.conn.execute('UPDATE jobs SET status = ?, updated = ? WHERE id = ?',
+                                      (STATUS_RUNNING, time.time(), row['id']))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job['status'] = STATUS_RUNNING
+        return job
+
+    def cancel(self, job_id):
+        """
+        排队中的任务直接取消，处理中的任务标记为cancelling，由处理函数在下次检查时停止
+        :return 取消后的任务，任务不存在时返回None
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute('UPDATE jobs SET status = ?, updated = ?, finished = ? WHERE id = ? AND status = ?',
+                              (STATUS_CANCELLED, now, now, job_id, STATUS_QUEUED))
+            self.conn.execute('UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?',
+                              (STATUS_CANCELLING, now, job_id, STATUS_RUNNING))
+        return self.get(job_id)
+
+    def recover(self):
+        """
+        服务重启后，上次处理中的任务重新排队(输入文件还在时)，正在取消的任务标记为已取消
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute('UPDATE jobs SET status = ?, updated = ?, finished = ? WHERE status = ?',
+                              (STATUS_CANCELLED, now, now, STATUS_CANCELLING))
+            rows = self.conn.execute('SELECT id, input_path FROM jobs WHERE status = ?', (STATUS_RUNNING,)).fetchall()
+        for row in rows:
+            if row['input_path'] and os.path.exists(row['input_path']):
+                self.update(row['id'], status=STATUS_QUEUED, progress=0)
+            else:
+                self.update(row['id'], status=STATUS_FAILED, error='Service restarted while processing')
+
+    def evict(self, retention, max_finished=None):
+        """
+        删除完成时间超过retention秒的任务，以及超出max_finished数量的最早完成的任务
+        :return 被删除的任务
+        """
+        deadline = time.time() - retention
+        with self.lock:
+            rows = self.conn.execute('SELECT * FROM jobs WHERE finished IS NOT NULL ORDER BY finished DESC').fetchall()
+            expired = [dict(row) for i, row in enumerate(rows)
+                       if row['finished'] < deadline or (max_finished is not None and i >= max_finished)]
+            self.conn.executemany('DELETE FROM jobs WHERE id = ?', [(job['id'],) for job in expired])
+        return expired
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class JobContext:
+    """
+    传给处理函数，用于汇报进度与检查取消
+    """
+
+    def __init__(self, store, job):
+        self.store = store
+        self.job = job
+        self.job_id = job['id']
+
+    def progress(self, value):
+        """
+        :param value 0-100
+        """
+        self.store.set_progress(self.job_id, max(0.0, min(100.0, float(value))))
+
+    def cancelled(self):
+        job = self.store.get(self.job_id)
+        return job is None or job['status'] in (STATUS_CANCELLING, STATUS_CANCELLED)
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled(self.job_id)
+
+
+class JobRunner:
+    """
+    e.g.
+        runner = JobRunner(JobStore('jobs.db'), create_worker, num_workers=2)
+        runner.start()
+        job = runner.submit('a.mp4', input_path, output_path)
+    create_worker在每个工作线程中调用一次，返回处理函数process(job, ctx)
+    """
+
+    def __init__(self, store, create_worker, num_workers=1, retention=24 * 3600, max_finished=None,
+                 poll_interval=1.0, evict_interval=60.0):
+        """
+        :param retention 完成的任务与结果文件保留的时间(秒)
+        :param max_finished 最多保留的完成任务数量，为None时不限制
+        """
+        self.store = store
+        self.create_worker = create_worker
+        self.num_workers = max(1, int(num_workers))
+        self.retention = retention
+        self.max_finished = max_finished
+        self.poll_interval = poll_interval
+        self.evict_interval = evict_interval
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def start(self):
+        if self.threads:
+            return
+        self.store.recover()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        thread = threading.Thread(target=self._evict_loop, name='job-evict', daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def submit(self, filename, input_path, output_path, job_id=None):
+        job = self.store.create(filename, input_path, output_path, job_id)
+        with self.cond:
+            self.cond.notify()
+        return job
+
+    def cancel(self, job_id):
+        job = self.store.cancel(job_id)
+        if job is not None and job['status'] == STATUS_CANCELLED:
+            remove_files(job['input_path'])
+        return job
+
+    def stop(self, timeout=None):
+        """
+        不再领取新任务，等待处理中的任务结束
+        """
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        self.stop_event.clear()
+
+    def _next_job(self):
+        while not self.stop_event.is_set():
+            job = self.store.claim()
+            if job is not None:
+                return job
+            with self.cond:
+                self.cond.wait(self.poll_interval)
+        return None
+
+    def _work(self):
+        # 每个工作线程只初始化一次
+        process = self.create_worker()
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            ctx = JobContext(self.store, job)
+            try:
+                ctx.check_cancelled()
+                process(job, ctx)
+                ctx.check_cancelled()
+                self.store.update(job['id'], status=STATUS_DONE, progress=100)
+            except JobCancelled:
+                self.store.update(job['id'], status=STATUS_CANCELLED)
+                remove_files(job['output_path'])
+            except Exception as e:
+                self.store.update(job['id'], status=STATUS_FAILED, error=str(e) or repr(e))
+                remove_files(job['output_path'])
+            finally:
+                remove_files(job['input_path'])
+
+    def evict(self):
+        for job in self.store.evict(self.retention, self.max_finished):
+            remove_files(job['input_path'], job['output_path'])
+
+    def _evict_loop(self):
+        while not self.stop_event.wait(self.evict_interval):
+            self.evict()
+
+
+def remove_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: model_assets.py
+@desc: 模型分片合并缓存与完整性校验
+仓库中较大的模型参数文件被拆分为多个分片(见各模型目录下的fs_manifest.csv)，
+首次使用时按清单合并到以内容哈希命名的缓存目录中，校验大小与sha256后硬链接到模型目录，
+多个进程同时启动时通过文件锁保证只合并一次，所有写入都先写临时文件再原子重命名
+"""
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+MANIFEST_NAME = 'fs_manifest.csv'
+PARAMS_NAME = 'inference.pdiparams'
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class ModelAssetError(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    跨进程文件锁，阻塞直到获得锁
+    """
+    with open(path, mode='a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            import time
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK最多重试10秒，超时后继续等待
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def temp_path(path):
+    """
+    与目标文件位于同一目录的临时文件名，保证os.replace为原子操作
+    """
+    return f'{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp'
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, mode='rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_manifest(model_dir):
+    """
+    读取分片清单
+    :return [(filename, filesize, encoding, header), ...]，不存在清单时返回None
+    """
+    manifest_path = os.path.join(model_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, mode='r', encoding='utf-8', newline='') as f:
+        return [(row['filename'], int(row['filesize']), row.get('encoding') or '', row.get('header') or '')
+                for row in csv.DictReader(f)]
+
+
+def manifest_key(model_dir):
+    """
+    清单内容的哈希，相同分片(无论在哪个模型目录)对应同一个缓存项
+    """
+    with open(os.path.join(model_dir, MANIFEST_NAME), mode='rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def merged_name(shard_name):
+    """
+    inference_1.pdiparams -> inference.pdiparams
+    """
+    stem, ext = os.path.splitext(shard_name)
+    return stem.rsplit('_', 1)[0] + ext
+
+
+def write_json_atomic(path, data):
+    tmp = temp_path(path)
+    with open(tmp, mode='w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    try:
+        with open(path, mode='r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def link_into_place(src, dst):
+    """
+    将缓存文件硬链接到模型目录，不支持硬链接(e.g. 跨文件系统)时复制
+    先链接到临时文件再原子重命名，其他进程不会看到不完整的文件
+    """
+    tmp = temp_path(dst)
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class ModelAssetManager:
+    """
+    模型分片合并缓存
+    缓存目录结构:
+        blobs/<sha256>          合并后的文件，以内容哈希命名
+        index/<manifest>.json   分片清单哈希 -> {sha256, size}
+        locks/<manifest>.lock   合并时使用的文件锁
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_dir = os.path.join(cache_dir, 'index')
+        self.lock_dir = os.path.join(cache_dir, 'locks')
+
+    def ensure(self, model_dir, verify=False):
+        """
+        保证模型目录下存在完整且校验通过的参数文件
+        :param model_dir 模型目录
+        :param verify 已存在的文件是否重新计算sha256，默认只校验大小
+        :return 参数文件路径
+        """
+        target = os.path.join(model_dir, PARAMS_NAME)
+        manifest = read_manifest(model_dir)
+        if manifest is None:
+            # 没有分片清单，参数文件本身就是完整的
+            if not os.path.exists(target):
+                raise ModelAssetError(f'{target} not found and no {MANIFEST_NAME} to merge from')
+            return target
+        if len(manifest) == 0 or merged_name(manifest[0][0]) != PARAMS_NAME:
+            raise ModelAssetError(f'unexpected manifest in {model_dir}')
+        key = manifest_key(model_dir)
+        expected_size = sum(size for _, size, _, _ in manifest)
+        # 快速路径：已合并且大小一致，不需要加锁
+        if self._is_valid(target, key, expected_size, verify):
+            return target
+
+        for d in (self.blob_dir, self.index_dir, self.lock_dir):
+            os.makedirs(d, exist_ok=True)
+        with file_lock(os.path.join(self.lock_dir, f'{key}.lock')):
+            # 等锁期间其他进程可能已经完成合并
+            if self._is_valid(target, key, expected_size, verify):
+                return target
+            blob = self._cached_blob(key, expected_size)
+            if blob is None:
+                blob = self._merge(model_dir, manifest, key, expected_size)
+            link_into_place(blob, target)
+        return target
+
+    def _index_path(self, key):
+        return os.path.join(self.index_dir, f'{key}.json')
+
+    def _is_valid(self, target, key, expected_size, verify):
+        if not os.path.exists(target) or os.path.getsize(target) != expected_size:
+            return False
+        if not verify:
+            return True
+        entry = read_json(self._index_path(key))
+        return entry is not None and sha256_file(target) == entry['sha256']
+
+    def _cached_blob(self, key, expected_size):
+        """
+        查找并校验缓存中已合并的文件，损坏时删除
+        """
+        entry = read_json(self._index_path(key))
+        if entry is None:
+            return None
+        blob = os.path.join(self.blob_dir, entry['sha256'])
+        if not os.path.exists(blob):
+            return None
+        if entry['size'] != expected_size or os.path.getsize(blob) != expected_size \
+                or sha256_file(blob) != entry['sha256']:
+            os.remove(blob)
+            return None
+        return blob
+
+    def _merge(self, model_dir, manifest, key, expected_size):
+        """
+        按清单顺序拼接分片，边写边计算sha256
+        """
+        if any(encoding or header for _, _, encoding, header in manifest):
+            # 带编码或表头的分片(文本文件切分)交给filesplit处理
+            return self._merge_with_filesplit(model_dir, key)
+        tmp = temp_path(os.path.join(self.blob_dir, key))
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, mode='wb') as out:
+                for filename, filesize, _, _ in manifest:
+                    shard = os.path.join(model_dir, filename)
+                    if not os.path.exists(shard) or os.path.getsize(shard) != filesize:
+                        raise ModelAssetError(f'shard {shard} is missing or has wrong size')
+                    with open(shard, mode='rb') as f:
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            h.update(chunk)
+                            out.write(chunk)
+                            size += len(chunk)
+            if size != expected_size:
+                raise ModelAssetError(f'merged size {size} != manifest size {expected_size}')
+            digest = h.hexdigest()
+            blob = os.path.join(self.blob_dir, digest)
+            os.replace(tmp, blob)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        write_json_atomic(self._index_path(key), {'sha256': digest, 'size': size, 'source': model_dir})
+        return blob
+
+    def _merge_with_filesplit(self, model_dir, key):
+        from fsplit.filesplit import Filesplit
+        target = os.path.join(model_dir, PARAMS_NAME)
+        Filesplit().merge(input_dir=model_dir)
+        digest = sha256_file(target)
+        blob = os.path.join(self.blob_dir, digest)
+        link_into_place(target, blob)
+        write_json_atomic(self._index_path(key), {'sha256': digest, 'size': os.path.getsize(target),
+                                                  'source': model_dir})
+        return blob
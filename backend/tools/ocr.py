@@ -1,89 +1,43 @@
-from tools.infer import utility
-from tools.infer.predict_system import TextSystem
+from tools import reading_order
 import config
-import importlib
 
 
 # 加载文本检测+识别模型
 class OcrRecogniser:
     def __init__(self):
+        # paddle只在加载模型时导入
+        from tools.infer import utility
         # 获取参数对象
-        importlib.reload(config)
         self.args = utility.parse_args()
         self.recogniser = self.init_model()
-
-    @staticmethod
-    def y_round(y):
-        y_min = y + 10 - y % 10
-        y_max = y - y % 10
-        if abs(y - y_min) < abs(y - y_max):
-            return y_min
-        else:
-            return y_max
+        # 文本框阅读顺序策略
+        self.reading_order = get_reading_order(config.REC_CHAR_TYPE)
 
     def predict(self, image):
         detection_box, recognise_result = self.recogniser(image)
-        if len(detection_box) > 0:
-            coordinate_list = list()
-            if isinstance(detection_box, list):
-                for i in detection_box:
-                    i = list(i)
-                    (x1, y1) = int(i[0][0]), int(i[0][1])
-                    (x2, y2) = int(i[1][0]), int(i[1][1])
-                    (x3, y3) = int(i[2][0]), int(i[2][1])
-                    (x4, y4) = int(i[3][0]), int(i[3][1])
-                    xmin = max(x1, x4)
-                    xmax = min(x2, x3)
-                    ymin = max(y1, y2)
-                    ymax = min(y3, y4)
-                    coordinate_list.append([xmin, xmax, ymin, ymax])
+        return self.sort_result(detection_box, recognise_result)
 
-            # 计算有多少行字幕，将每行字幕最小的ymin值放入lines
-            lines = []
-            for i in coordinate_list:
-                if len(lines) < 1:
-                    lines.append(self.y_round(i[2]))
-                else:
-                    if self.y_round(i[2]) not in lines \
-                            and self.y_round(i[2]) + 10 not in lines \
-                            and self.y_round(i[2]) - 10 not in lines:
-                        lines.append(self.y_round(i[2]))
-            lines = sorted(lines)
+    def predict_batch(self, images):
+        """
+        批量识别多张图片，所有图片的文本框合并在一起做文本识别
+        :return [(dt_box, rec_res), ...]
+        """
+        return [self.sort_result(detection_box, recognise_result)
+                for detection_box, recognise_result in self.recogniser.predict_batch(images)]
 
-            for i in coordinate_list:
-                for j in lines:
-                    if abs(j - self.y_round(i[2])) <= 10:
-                        i[2] = j
-
-            to_rank_res = list(zip(coordinate_list, recognise_result))
-            ranked_res = []
-            for line in lines:
-                tmp_list = []
-                for i in to_rank_res:
-                    if i[0][2] == line:
-                        tmp_list.append(i)
-                # 先根据纵坐标排序
-                for k in range(1, len(tmp_list)):
-                    for j in range(0, len(tmp_list) - k):
-                        if tmp_list[j][0][2] > tmp_list[j + 1][0][2]:
-                            print(tmp_list[j][0][2])
-                            tmp_list[j], tmp_list[j + 1] = tmp_list[j + 1], tmp_list[j]
-                # 再根据横坐标排列
-                for l in range(1, len(tmp_list)):
-                    for j in range(0, len(tmp_list) - l):
-                        if tmp_list[j][0][0] > tmp_list[j + 1][0][0]:
-                            tmp_list[j], tmp_list[j + 1] = tmp_list[j + 1], tmp_list[j]
-                for m in tmp_list:
-                    ranked_res.append(m)
-            dt_box = []
-            for i in [j[0] for j in ranked_res]:
-                dt_box.append([(i[0], i[2]), (i[1], i[2]), (i[1], i[3]), (i[0], i[3])])
-            res = [i[1] for i in ranked_res]
-            return dt_box, res
+    def sort_result(self, detection_box, recognise_result):
+        if detection_box is None:
+            return [], []
+        if len(detection_box) > 0:
+            if not isinstance(detection_box, list):
+                return [], []
+            # 按阅读顺序排列文本框，并将同一行文本框的ymin对齐
+            return reading_order.sort_boxes(detection_box, recognise_result, self.reading_order)
         else:
             return detection_box, recognise_result
 
     def init_model(self):
+        from tools.infer.predict_system import TextSystem
         self.args.use_gpu = config.USE_GPU
         if not config.USE_GPU:
             import paddle
@@ -99,6 +53,9 @@ class OcrRecogniser:
         # 设置每张图文本框批处理数量
         self.args.rec_batch_num = config.REC_BATCH_NUM
         self.args.max_batch_size = config.MAX_BATCH_SIZE
+        self.args.det_db_use_components = config.DET_DB_USE_COMPONENTS
+        # 加载自动调优得到的推理参数
+        self.args.tune_profile = config.TUNE_PROFILE_PATH
         return TextSystem(self.args)
 
 
@@ -111,14 +68,16 @@ def get_coordinates(dt_box):
     coordinate_list = list()
     if isinstance(dt_box, list):
         for i in dt_box:
-            i = list(i)
-            (x1, y1) = int(i[0][0]), int(i[0][1])
-            (x2, y2) = int(i[1][0]), int(i[1][1])
-            (x3, y3) = int(i[2][0]), int(i[2][1])
-            (x4, y4) = int(i[3][0]), int(i[3][1])
-            xmin = max(x1, x4)
-            xmax = min(x2, x3)
-            ymin = max(y1, y2)
-            ymax = min(y3, y4)
-            coordinate_list.append((xmin, xmax, ymin, ymax))
+            coordinate_list.append(tuple(reading_order.box_to_coordinate(i)))
     return coordinate_list
+
+
+def get_reading_order(rec_char_type):
+    """
+    获取文本框阅读顺序策略，未配置时根据识别语言选择
+    """
+    if config.READING_ORDER is not None:
+        return config.READING_ORDER
+    if rec_char_type in config.ARABIC_LANG:
+        return reading_order.HORIZONTAL_RTL
+    return reading_order.HORIZONTAL_LTR
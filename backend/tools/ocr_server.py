@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: ocr_server.py
+@desc: 本机OCR模型服务
+多个字幕提取任务(进程)共享同一份已加载的文本检测与识别模型：
+客户端通过共享内存传递视频帧，通过Unix socket(Windows下为命名管道)发送请求，
+服务端把不同任务同时到达的请求合并为一批识别，内存占用与模型预热开销不再随任务数量增长
+
+启动服务(在backend目录下执行):
+    python tools/ocr_server.py --address /tmp/vse_ocr.sock
+并在config.py中设置 OCR_SERVER_ADDRESS = '/tmp/vse_ocr.sock'
+"""
+import argparse
+import os
+import sys
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from tools.ocr import OcrRecogniser
+from tools.infer.inference_queue import InferenceQueue
+
+
+def attach_shared_memory(name):
+    """
+    打开客户端创建的共享内存
+    共享内存由客户端负责释放，避免服务端退出时resource_tracker将其删除
+    """
+    shm = SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+class OcrServer:
+    """
+    OCR模型服务，每个客户端连接一个接收线程，一个批处理线程负责模型推理
+    """
+
+    def __init__(self, address, max_batch=8, max_wait=0.01):
+        """
+        :param address 监听地址，Unix socket路径或Windows命名管道
+        :param max_batch 每批最多合并的请求数
+        :param max_wait 收到第一个请求后最多等待其他请求的时间(秒)
+        """
+        self.address = address
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = None
+        self.recogniser = None
+        self.listener = None
+
+    def serve_forever(self):
+        self.recogniser = OcrRecogniser()
+        # 上次异常退出遗留的socket文件
+        if not self.address.startswith('\\\\') and os.path.exists(self.address):
+            os.remove(self.address)
+        self.listener = Listener(self.address)
+        # 不同客户端同时到达的请求合并为一批推理
+        self.queue = InferenceQueue(self.recogniser.predict_batch, self.max_batch, self.max_wait, name='ocr-server')
+        print(f'OCR server listening on {self.address}')
+        try:
+            while True:
+                conn = self.listener.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.listener.close()
+
+    def _handle(self, conn):
+        """
+        处理一个客户端连接的所有请求
+        请求: ('predict', shm_name, shape, dtype) 或 ('ping',)
+        响应: ('ok', result) 或 ('error', message)
+        """
+        shm_cache = {}
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if request[0] == 'ping':
+                    conn.send(('ok', {'max_batch': self.max_batch, 'max_wait': self.max_wait}))
+                    continue
+                _, shm_name, shape, dtype = request
+                shm = shm_cache.get(shm_name)
+                if shm is None:
+                    # 客户端换用了更大的共享内存，释放旧的
+                    for old in shm_cache.values():
+                        old.close()
+                    shm_cache = {shm_name: attach_shared_memory(shm_name)}
+                    shm = shm_cache[shm_name]
+                # 复制一份，客户端收到响应后可以立即复用共享内存
+                image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf).copy()
+                future = self.queue.submit(image)
+                try:
+                    conn.send(('ok', future.result()))
+                except Exception as e:
+                    conn.send(('error', repr(e)))
+        finally:
+            for shm in shm_cache.values():
+                shm.close()
+            conn.close()
+
+
+class OcrClient:
+    """
+    OCR模型服务客户端，接口与OcrRecogniser一致
+    每个客户端持有一块共享内存用于传递视频帧，同一客户端的请求是串行的
+    """
+
+    def __init__(self, address):
+        self.conn = Client(address)
+        self.shm = None
+        self.lock = threading.Lock()
+
+    def _ensure_buffer(self, nbytes):
+        if self.shm is not None and self.shm.size >= nbytes:
+            return
+        self._release_buffer()
+        self.shm = SharedMemory(create=True, size=nbytes)
+
+    def _release_buffer(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def _request(self, request):
+        self.conn.send(request)
+        status, payload = self.conn.recv()
+        if status != 'ok':
+            raise RuntimeError(f'OCR server error: {payload}')
+        return payload
+
+    def ping(self):
+        with self.lock:
+            return self._request(('ping',))
+
+    def predict(self, image):
+        image = np.ascontiguousarray(image)
+        with self.lock:
+            self._ensure_buffer(image.nbytes)
+            np.ndarray(image.shape, dtype=image.dtype, buffer=self.shm.buf)[:] = image
+            return self._request(('predict', self.shm.name, image.shape, image.dtype.str))
+
+    def predict_batch(self, images):
+        # 服务端负责跨任务合并批次，客户端逐张发送
+        return [self.predict(image) for image in images]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+            self._release_buffer()
+
+
+class LazyRecogniser:
+    """
+    第一次识别时才连接服务或加载模型
+    """
+
+    def __init__(self, address=None):
+        self.address = address
+        self.recogniser = None
+
+    def predict(self, image):
+        if self.recogniser is None:
+            self.recogniser = get_recogniser(self.address)
+        return self.recogniser.predict(image)
+
+
+def get_recogniser(address=None):
+    """
+    获取文本识别对象：配置了服务地址且服务可用时使用OcrClient，否则在当前进程加载模型
+    """
+    if address:
+        try:
+            client = OcrClient(address)
+            client.ping()
+            return client
+        except (OSError, EOFError) as e:
+            print(f'OCR server {address} unavailable ({e}), loading models locally')
+    return OcrRecogniser()
+
+
+def main():
+    import config
+    parser = argparse.ArgumentParser(description='video-subtitle-extractor shared OCR model server')
+    parser.add_argument('--address', default=config.OCR_SERVER_ADDRESS,
+                        help=r"unix socket path, or named pipe on Windows, e.g. \\.\pipe\vse_ocr")
+    parser.add_argument('--max-batch', type=int, default=config.OCR_SERVER_MAX_BATCH)
+    parser.add_argument('--max-wait', type=float, default=config.OCR_SERVER_MAX_WAIT, help='seconds')
+    args = parser.parse_args()
+    if not args.address:
+        parser.error('--address is required when config.OCR_SERVER_ADDRESS is None')
+    # 推理模块通过argparse读取命令行参数，避免解析到本脚本的参数
+    sys.argv = sys.argv[:1]
+    OcrServer(args.address, args.max_batch, args.max_wait).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
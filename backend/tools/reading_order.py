@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: reading_order.py
+@desc: 文本框阅读顺序排序，将检测框聚类成行(列)，并按照书写方向排列
+"""
+
+# 横排，从上到下，从左到右(中文、英文等)
+HORIZONTAL_LTR = 'horizontal_ltr'
+# 横排，从上到下，从右到左(阿拉伯语等)
+HORIZONTAL_RTL = 'horizontal_rtl'
+# 竖排，从右到左，从上到下(日文竖排字幕等)
+VERTICAL_RTL = 'vertical_rtl'
+# 竖排，从左到右，从上到下
+VERTICAL_LTR = 'vertical_ltr'
+
+POLICIES = (HORIZONTAL_LTR, HORIZONTAL_RTL, VERTICAL_RTL, VERTICAL_LTR)
+
+# 同一行(列)允许的像素偏差，坐标先按该粒度取整再聚类
+LINE_STEP = 10
+
+
+def y_round(y):
+    """
+    将坐标取整到最近的LINE_STEP倍数，恰好位于中间时向下取整
+    """
+    y_min = y + LINE_STEP - y % LINE_STEP
+    y_max = y - y % LINE_STEP
+    if abs(y - y_min) < abs(y - y_max):
+        return y_min
+    else:
+        return y_max
+
+
+def box_to_coordinate(box):
+    """
+    将四点检测框转换为(xmin, xmax, ymin, ymax)，取内接矩形
+    """
+    (x1, y1) = int(box[0][0]), int(box[0][1])
+    (x2, y2) = int(box[1][0]), int(box[1][1])
+    (x3, y3) = int(box[2][0]), int(box[2][1])
+    (x4, y4) = int(box[3][0]), int(box[3][1])
+    return [max(x1, x4), min(x2, x3), max(y1, y2), min(y3, y4)]
+
+
+def cluster_lines(keys):
+    """
+    将一组坐标聚类为行(列)
+    按输入顺序扫描取整后的坐标，若与已有行的距离超过一个步长则新建一行，
+    每个坐标归入距离不超过一个步长的最靠前(坐标最小)的行
+    :param keys 每个文本框用于聚类的坐标(横排为ymin, 竖排为xmin)
+    :return 每个文本框所属行的坐标值列表
+    """
+    lines = set()
+    rounded = []
+    for key in keys:
+        r = y_round(key)
+        rounded.append(r)
+        if r not in lines and r + LINE_STEP not in lines and r - LINE_STEP not in lines:
+            lines.add(r)
+    # 已有的行之间至少相隔两个步长，因此每个坐标只需检查相邻的三个候选行
+    line_of = []
+    for r in rounded:
+        for candidate in (r - LINE_STEP, r, r + LINE_STEP):
+            if candidate in lines:
+                line_of.append(candidate)
+                break
+    return line_of
+
+
+def rank(coordinate_list, policy=HORIZONTAL_LTR):
+    """
+    计算文本框的阅读顺序
+    :param coordinate_list 坐标列表[(xmin, xmax, ymin, ymax), ...]
+    :param policy 阅读顺序策略，取值见POLICIES
+    :return (order, line_of) 排序后的下标列表，以及每个文本框所属行(列)的坐标值
+    """
+    if policy not in POLICIES:
+        raise ValueError(f'unknown reading order policy: {policy}')
+    if policy in (HORIZONTAL_LTR, HORIZONTAL_RTL):
+        line_of = cluster_lines([c[2] for c in coordinate_list])
+        if policy == HORIZONTAL_LTR:
+            # 行从上到下，行内按xmin从左到右
+            key = lambda i: (line_of[i], coordinate_list[i][0])
+        else:
+            # 行从上到下，行内按xmax从右到左
+            key = lambda i: (line_of[i], -coordinate_list[i][1])
+    else:
+        line_of = cluster_lines([c[0] for c in coordinate_list])
+        if policy == VERTICAL_RTL:
+            # 列从右到左，列内按ymin从上到下
+            key = lambda i: (-line_of[i], coordinate_list[i][2])
+        else:
+            # 列从左到右，列内按ymin从上到下
+            key = lambda i: (line_of[i], coordinate_list[i][2])
+    # sorted为稳定排序，同一位置的文本框保持检测顺序
+    order = sorted(range(len(coordinate_list)), key=key)
+    return order, line_of
+
+
+def sort_boxes(detection_box, recognise_result, policy=HORIZONTAL_LTR):
+    """
+    对检测框与识别结果按阅读顺序排序，并将同一行(列)的文本框起始坐标对齐
+    :param detection_box 四点检测框列表
+    :param recognise_result 识别结果列表[(text, score), ...]
+    :param policy 阅读顺序策略
+    :return (dt_box, rec_res) 排序后的矩形检测框与识别结果
+    """
+    coordinate_list = [box_to_coordinate(box) for box in detection_box]
+    order, line_of = rank(coordinate_list, policy)
+    vertical = policy in (VERTICAL_RTL, VERTICAL_LTR)
+    dt_box = []
+    res = []
+    for i in order:
+        xmin, xmax, ymin, ymax = coordinate_list[i]
+        if vertical:
+            xmin = line_of[i]
+        else:
+            ymin = line_of[i]
+        dt_box.append([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)])
+        res.append(recognise_result[i])
+    return dt_box, res
@@ -5,149 +5,194 @@
 @time  : 2021/12/17 15:43
 @desc  : 将连起来的英文单词切分
 """
+import functools
 import json
 import os
-import sys
-
-import pysrt
-import wordsegment as ws
 import re
 
+from tools.subtitle_track import SubtitleTrack, save
+from tools.word_segmenter import get_segmenter
 
-def execute(path, lang='en'):
-    # fix "RecursionError: maximum recursion depth exceeded in comparison" in wordsegment.segment call
-    if sys.getrecursionlimit() < 100000:
-        sys.setrecursionlimit(100000)
-
-    wordsegment = ws.Segmenter()
-    wordsegment.load()
-    subs = pysrt.open(path)
-    verb_forms = ["I'm", "you're", "he's", "she's", "we're", "it's", "isn't", "aren't", "they're", "there's", "wasn't",
-                  "weren't", "I've", "you've", "we've", "they've", "hasn't", "haven't", "I'd", "you'd", "he'd", "she'd",
-                  "it'd", "we'd", "they'd", "doesn't", "don't", "didn't", "I'll", "you'll", "he'll", "she'll", "we'll",
-                  "they'll", "there'll", "there'd", "can't", "couldn't", "daren't", "hadn't", "mightn't", "mustn't",
-                  "needn't", "oughtn't", "shan't", "shouldn't", "usedn't", "won't", "wouldn't", "that's", "what's", "it'll"]
-    verb_form_map = {}
-
-    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'configs', 'typoMap.json'), 'r', encoding='utf-8') as load_f:
-        typo_map = json.load(load_f)
+TYPO_MAP_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'configs', 'typoMap.json')
 
-    for verb in verb_forms:
-        verb_form_map[verb.replace("'", "").lower()] = verb
+VERB_FORMS = ["I'm", "you're", "he's", "she's", "we're", "it's", "isn't", "aren't", "they're", "there's", "wasn't",
+              "weren't", "I've", "you've", "we've", "they've", "hasn't", "haven't", "I'd", "you'd", "he'd", "she'd",
+              "it'd", "we'd", "they'd", "doesn't", "don't", "didn't", "I'll", "you'll", "he'll", "she'll", "we'll",
+              "they'll", "there'll", "there'd", "can't", "couldn't", "daren't", "hadn't", "mightn't", "mustn't",
+              "needn't", "oughtn't", "shan't", "shouldn't", "usedn't", "won't", "wouldn't", "that's", "what's", "it'll"]
+VERB_FORM_MAP = {verb.replace("'", "").lower(): verb for verb in VERB_FORMS}
+
+# 分词前的处理
+RE_NEWLINE_I = re.compile("(\ni)([^\\s])", re.I)
+# 替换中文前的多个空格成单个空格, 避免中英文分行出错
+RE_SPACES_BEFORE_CH = re.compile(' +([\\u4e00-\\u9fa5])')
+# 分词后的清理规则，按顺序执行
+# 非大写字母的大写字母前加空格
+RE_SPACE_BEFORE_UPPER = re.compile("([^\\sA-Z\\-])([A-Z])")
+# 删除,?!,前的多个空格
+RE_SPACES_BEFORE_PUNCT = re.compile(" *([\\.\\?\\!\\,])")
+# 删除'的前后多个空格
+RE_SPACES_AROUND_QUOTE = re.compile(" *([\\']) *")
+# 删除换行后的多个空格(通常是第二行开始的多个空格)以及开始的多个空格
+RE_LEADING_SPACES = re.compile('(^|\n)\\s*')
+# 删除-左侧空格
+RE_SPACE_BEFORE_DASH = re.compile("([A-Za-z0-9]) (\\-[A-Za-z0-9])")
+# 删除%左侧空格
+RE_SPACE_BEFORE_PERCENT = re.compile("([A-Za-z0-9]) %")
+# 结尾·改成.
+RE_TRAILING_DOT = re.compile('·$')
+# 移除Dr.后的空格
+RE_DR = re.compile(r'\bDr\. *\b')
+# .,?后面加空格
+RE_SPACE_AFTER_PUNCT = re.compile('([\\.,\\!\\?])([A-Za-z0-9\\u4e00-\\u9fa5])')
+# 中文引号、逗号转英文
+PUNCT_TABLE = str.maketrans({'“': '"', '”': '"', '，': ','})
+# typoMap中包含以下字符的键按正则表达式处理
+REGEX_CHARS = set('.^$*+?{}[]\\|()')
 
-    def format_seg_list(seg_list):
-        new_seg = []
-        for seg in seg_list:
-            if seg in verb_form_map:
-                new_seg.append([seg, verb_form_map[seg]])
-            else:
-                new_seg.append([seg])
-        return new_seg
 
-    def typo_fix(text):
+class TypoFixer:
+    """
+    按typoMap修正常见识别错误
+    不含正则字符的键合并为一个忽略大小写的正则，一次扫描完成替换，匹配结果通过字典查找替换内容
+    """
+
+    def __init__(self, typo_map):
+        literals = {}
+        self.patterns = []
         for k, v in typo_map.items():
-            text = re.sub(re.compile(k, re.I), v, text)
+            if REGEX_CHARS.intersection(k):
+                self.patterns.append((re.compile(k, re.I), v))
+            else:
+                literals.setdefault(k.lower(), v)
+        self.literals = literals
+        # 较长的键优先匹配
+        keys = sorted(literals, key=len, reverse=True)
+        self.regex = re.compile('|'.join(re.escape(k) for k in keys), re.I) if keys else None
+
+    def _replace(self, match):
+        return self.literals[match.group(0).lower()]
+
+    def __call__(self, text):
+        if self.regex is not None:
+            text = self.regex.sub(self._replace, text)
+        for pattern, repl in self.patterns:
+            text = pattern.sub(repl, text)
         return text
 
-    # 逆向过滤seg
+
+@functools.lru_cache(maxsize=4096)
+def segment_regex(seg, prefix=''):
+    """
+    匹配分词结果(单词或单词的缩写形式)的正则，同一个单词在不同字幕行中重复出现，编译结果缓存
+    """
+    return re.compile(prefix + '(' + '|'.join(seg) + ')', re.I)
+
+
+class TextNormalizer:
+    """
+    字幕文本规范化：修正识别错误、切分连在一起的英文单词并清理标点与空格
+    每个进程只初始化一次，见get_normalizer
+    """
+
+    def __init__(self, typo_map):
+        # 分词结果缓存在分词器中，字幕中重复的行不需要重新分词
+        self.segment = get_segmenter().segment
+        self.typo_fix = TypoFixer(typo_map)
+
+    @staticmethod
+    def format_seg_list(seg_list):
+        return [(seg, VERB_FORM_MAP[seg]) if seg in VERB_FORM_MAP else (seg,) for seg in seg_list]
+
+    @staticmethod
     def remove_invalid_segment(seg, text):
-        seg_len = len(seg)
+        """
+        逆向过滤seg
+        """
         span = None
         new_seg = []
-        for i in range(seg_len - 1, -1, -1):
-            s = seg[i]
-            if len(s) > 1:
-                regex = re.compile(f"({s[0]}|{s[1]})", re.I)
-            else:
-                regex = re.compile(f"({s[0]})", re.I)
-            try:
-                ss = [(i) for i in re.finditer(regex, text)][-1]
-            except IndexError:
-                ss = None
+        for s in reversed(seg):
+            ss = None
+            for ss in segment_regex(s).finditer(text):
+                pass
             if ss is None:
                 continue
-            text = text[:ss.span()[0]]
-            if span is None:
-                span = ss.span()
-                new_seg.append(s)
-                continue
-            if span > ss.span():
+            text = text[:ss.start()]
+            if span is None or span > ss.span():
                 new_seg.append(s)
                 span = ss.span()
         return list(reversed(new_seg))
 
-    for sub in subs:
-        sub.text = typo_fix(sub.text)
-        seg = wordsegment.segment(sub.text)
+    def normalize(self, text, lang='en'):
+        text = self.typo_fix(text)
+        seg = self.segment(text)
         if len(seg) == 1:
-            seg = wordsegment.segment(re.sub(re.compile(f"(\ni)([^\\s])", re.I), "\\1 \\2", sub.text))
-        seg = format_seg_list(seg)
+            seg = self.segment(RE_NEWLINE_I.sub("\\1 \\2", text))
+        seg = self.format_seg_list(seg)
 
-        # 替换中文前的多个空格成单个空格, 避免中英文分行出错
-        sub.text = re.sub(' +([\\u4e00-\\u9fa5])', ' \\1', sub.text)
+        text = RE_SPACES_BEFORE_CH.sub(' \\1', text)
         # 中英文分行
         if lang in ["ch", "ch_tra"]:
-            sub.text = sub.text.replace("  ", "\n")
+            text = text.replace("  ", "\n")
         lines = []
-        remain = sub.text
-        seg = remove_invalid_segment(seg, sub.text)
+        remain = text
+        seg = self.remove_invalid_segment(seg, text)
         seg_len = len(seg)
-        for i in range(0, seg_len):
-            s = seg[i]
-            global regex
-            if len(s) > 1:
-                regex = re.compile(f"(.*?)({s[0]}|{s[1]})", re.I)
-            else:
-                regex = re.compile(f"(.*?)({s[0]})", re.I)
-            ss = re.search(regex, remain)
+        for i, s in enumerate(seg):
+            ss = segment_regex(s, '(.*?)').search(remain)
             if ss is None:
                 if i == seg_len - 1:
                     lines.append(remain.strip())
                 continue
-
-            lines.append(remain[:ss.span()[1]].strip())
-            remain = remain[ss.span()[1]:].strip()
+            lines.append(remain[:ss.end()].strip())
+            remain = remain[ss.end():].strip()
             if i == seg_len - 1:
                 lines.append(remain)
-        if seg_len > 0:
-            ss = " ".join(lines)
-        else:
-            ss = remain
+        ss = " ".join(lines) if seg_len > 0 else remain
         # again
-        ss = typo_fix(ss)
-        # 非大写字母的大写字母前加空格
-        ss = re.sub("([^\\sA-Z\\-])([A-Z])", "\\1 \\2", ss)
+        ss = self.typo_fix(ss)
+        return self.cleanup(ss)
+
+    @staticmethod
+    def cleanup(ss):
+        ss = RE_SPACE_BEFORE_UPPER.sub("\\1 \\2", ss)
         # 删除重复空格
-        ss = ss.replace("  ", " ")
-        ss = ss.replace("。", ".")
-        # 删除,?!,前的多个空格
-        ss = re.sub(" *([\\.\\?\\!\\,])", "\\1", ss)
-        # 删除'的前后多个空格
-        ss = re.sub(" *([\\']) *", "\\1", ss)
-        # 删除换行后的多个空格, 通常时第二行的开始的多个空格
-        ss = re.sub('\n\\s*', '\n', ss)
-        # 删除开始的多个空格
-        ss = re.sub('^\\s*', '', ss)
-        # 删除-左侧空格
-        ss = re.sub("([A-Za-z0-9]) (\\-[A-Za-z0-9])", '\\1\\2', ss)
-        # 删除%左侧空格
-        ss = re.sub("([A-Za-z0-9]) %", '\\1%', ss)
-        # 结尾·改成.
-        ss = re.sub('·$', '.', ss)
-        # 移除Dr.后的空格
-        ss = re.sub(r'\bDr\. *\b', "Dr.", ss)
-        # 中文引号转英文
-        ss = re.sub(r'[“”]', "\"", ss)
-        # 中文逗号转英文
-        ss = re.sub(r'，', ",", ss)
-        # .,?后面加空格
-        ss = re.sub('([\\.,\\!\\?])([A-Za-z0-9\\u4e00-\\u9fa5])', '\\1 \\2', ss)
+        ss = ss.replace("  ", " ").replace("。", ".")
+        ss = RE_SPACES_BEFORE_PUNCT.sub("\\1", ss)
+        ss = RE_SPACES_AROUND_QUOTE.sub("\\1", ss)
+        ss = RE_LEADING_SPACES.sub('\\1', ss)
+        ss = RE_SPACE_BEFORE_DASH.sub('\\1\\2', ss)
+        ss = RE_SPACE_BEFORE_PERCENT.sub('\\1%', ss)
+        ss = RE_TRAILING_DOT.sub('.', ss)
+        ss = RE_DR.sub("Dr.", ss)
+        ss = ss.translate(PUNCT_TABLE)
+        ss = RE_SPACE_AFTER_PUNCT.sub('\\1 \\2', ss)
         ss = ss.replace("\n\n", "\n")
-        sub.text = ss.strip()
-    subs.save(path, encoding='utf-8')
+        return ss.strip()
+
+
+@functools.lru_cache(maxsize=None)
+def get_normalizer():
+    with open(TYPO_MAP_PATH, 'r', encoding='utf-8') as load_f:
+        typo_map = json.load(load_f)
+    return TextNormalizer(typo_map)
+
+
+def normalize_track(track, lang='en'):
+    """
+    直接处理内存中的字幕轨道
+    :param track tools.subtitle_track.SubtitleTrack
+    """
+    normalizer = get_normalizer()
+    track.map_text(lambda text: normalizer.normalize(text, lang))
+    return track
+
+
+def execute(path, lang='en'):
+    track = normalize_track(SubtitleTrack.from_srt(path), lang)
+    save(track, os.path.splitext(path)[0], ['srt'])
 
 
 if __name__ == '__main__':
     path = "/home/yao/Videos/null.srt"
     execute(path)
-
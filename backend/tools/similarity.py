@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: similarity.py
+@desc: 字幕文本相似度判断与字幕片段切分
+在调用Levenshtein之前先用长度比例、字符集掩码与完全相等做快速判断，并实现随文本长度变化的相似度阈值
+"""
+from Levenshtein import ratio
+
+# 动态阈值的下限，避免单个字符的文本被判定为相似
+MIN_THRESHOLD = 0.5
+# 两段文本长度乘积超过该值时才使用字符集掩码做快速判断，短文本直接计算Levenshtein更快
+MASK_CHECK_MIN_AREA = 4096
+
+
+def normalize(text):
+    """
+    文本归一化：去除空格与换行
+    """
+    return text.replace(' ', '').replace('\n', '')
+
+
+def char_mask(text):
+    """
+    计算文本的字符集掩码，每个字符映射到64位整数中的一位
+    """
+    mask = 0
+    for c in set(text):
+        mask |= 1 << (ord(c) & 63)
+    return mask
+
+
+def popcount(x):
+    return bin(x).count('1')
+
+
+def similarity_threshold(length, threshold):
+    """
+    随文本长度变化的相似度阈值：长文本使用threshold，
+    短文本允许一个字识别错误，e.g. 人民、入民的相似度为0.5也算相似
+    :param length 文本长度(取两段文本中较长的)
+    :param threshold 长文本的相似度阈值
+    """
+    if length <= 0:
+        return threshold
+    return max(MIN_THRESHOLD, min(threshold, 1 - 1 / length))
+
+
+class SimilarityJudge:
+    """
+    相似度判断，缓存每个长度对应的动态阈值以及长文本的字符集掩码
+    输入的文本需要先经过normalize归一化
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.threshold_cache = {}
+        self.mask_cache = {}
+
+    def get_threshold(self, length):
+        t = self.threshold_cache.get(length)
+        if t is None:
+            t = similarity_threshold(length, self.threshold)
+            self.threshold_cache[length] = t
+        return t
+
+    def get_mask(self, text):
+        mask = self.mask_cache.get(text)
+        if mask is None:
+            mask = char_mask(text)
+            self.mask_cache[text] = mask
+        return mask
+
+    def __call__(self, a, b):
+        """
+        判断两段归一化后的文本是否相似
+        """
+        # 完全相同
+        if a == b:
+            return True
+        la, lb = len(a), len(b)
+        t = self.get_threshold(la if la > lb else lb)
+        total = (la + lb) * t
+        # 长度约束: 相似度最多为 2 * min(la, lb) / (la + lb)
+        if 2 * (la if la < lb else lb) < total:
+            return False
+        # 字符集约束: 对方没有的字符一定无法匹配
+        if la * lb >= MASK_CHECK_MIN_AREA:
+            mask_a, mask_b = self.get_mask(a), self.get_mask(b)
+            matched = min(la - popcount(mask_a & ~mask_b), lb - popcount(mask_b & ~mask_a))
+            if 2 * matched < total:
+                return False
+        return ratio(a, b) >= t
+
+
+def is_similar(text1, text2, threshold):
+    """
+    判断两段文本是否相似
+    """
+    return SimilarityJudge(threshold)(normalize(text1), normalize(text2))
+
+
+def segment(texts, threshold):
+    """
+    将按帧排列的字幕文本切分为片段，每个片段内的文本都与片段第一行相似
+    :param texts 文本列表
+    :param threshold 长文本的相似度阈值
+    :return [(start, end), ...] 每个片段首尾行的下标(包含end)
+    """
+    judge = SimilarityJudge(threshold)
+    spans = []
+    if len(texts) == 0:
+        return spans
+    # 每行只归一化一次
+    normalized = [normalize(text) for text in texts]
+    start = 0
+    start_text = normalized[0]
+    for idx in range(1, len(normalized)):
+        text = normalized[idx]
+        if text != start_text and not judge(start_text, text):
+            spans.append((start, idx - 1))
+            start = idx
+            start_text = text
+    spans.append((start, len(normalized) - 1))
+    return spans
@@ -4,11 +4,16 @@ from multiprocessing import Queue, Process
 import cv2
 from PIL import ImageFont, ImageDraw, Image
 from tqdm import tqdm
-from tools.ocr import OcrRecogniser, get_coordinates
+from tools.ocr import get_coordinates
+from tools.ocr_server import LazyRecogniser, get_recogniser
 from tools.constant import SubtitleArea
 from tools import constant
+from tools import instrument
+from tools import vsf
+from tools.infer.inference_queue import InferenceQueue
 from threading import Thread
 import queue
+from concurrent.futures import Future, ThreadPoolExecutor
 from shapely.geometry import Polygon
 from types import SimpleNamespace
 import shutil
@@ -16,6 +21,25 @@ import numpy as np
 from collections import namedtuple
 
 
+def char_probs_to_str(char_probs):
+    """
+    逐字置信度写入raw.txt第5列的格式, e.g. [0.998, 0.51] -> '1.00,0.51'
+    """
+    return ','.join(f'{p:.2f}' for p in char_probs)
+
+
+def char_probs_from_str(s):
+    """
+    :return 逐字置信度列表，为空或格式错误时返回None
+    """
+    if not s:
+        return None
+    try:
+        return [float(p) for p in s.split(',')]
+    except ValueError:
+        return None
+
+
 def extract_subtitles(data, text_recogniser, img, raw_subtitle_file,
                       sub_area, options, dt_box_arg, rec_res_arg, ocr_loss_debug_path):
     """
@@ -27,20 +51,27 @@ def extract_subtitles(data, text_recogniser, img, raw_subtitle_file,
     # 如果没有检测结果，则获取检测结果
     if dt_box is None or rec_res is None:
         dt_box, rec_res = text_recogniser.predict(img)
-        # rec_res格式为： ("hello", 0.997)
+        # rec_res格式为： ("hello", 0.997) 或带逐字置信度的 ("hello", 0.997, [0.99, 1.0, ...])
     # 获取文本坐标
     coordinates = get_coordinates(dt_box)
-    # 将结果写入txt文本中
-    if options.REC_CHAR_TYPE == 'en':
-        # 如果识别语言为英文，则去除中文
-        text_res = [(re.sub('[\u4e00-\u9fa5]', '', res[0]), res[1]) for res in rec_res]
-    else:
-        text_res = [(res[0], res[1]) for res in rec_res]
+    # 将结果写入txt文本中，第5列为逐字置信度
+    text_res = []
+    for res in rec_res:
+        text, prob = res[0], res[1]
+        char_probs = res[2] if len(res) > 2 and len(res[2]) == len(text) else None
+        if options.REC_CHAR_TYPE == 'en':
+            # 如果识别语言为英文，则去除中文
+            if char_probs is not None:
+                kept = [(c, p) for c, p in zip(text, char_probs) if not '\u4e00' <= c <= '\u9fa5']
+                char_probs = [p for _, p in kept]
+            text = re.sub('[\u4e00-\u9fa5]', '', text)
+        text_res.append((text, prob, char_probs_to_str(char_probs) if char_probs is not None else ''))
     line = ''
     loss_list = []
     for content, coordinate in zip(text_res, coordinates):
         text = content[0]
         prob = content[1]
+        char_probs = content[2]
         if sub_area is not None:
             selected = False
             # 初始化超界偏差为0
@@ -60,17 +91,22 @@ def extract_subtitles(data, text_recogniser, img, raw_subtitle_file,
                     # 保留该帧
                     selected = True
                     line += f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n'
-                    raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n')
+                    raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\t{prob:.4f}\t{char_probs}\n')
             # 保存丢掉的识别结果
             loss_info = namedtuple('loss_info', 'text prob overflow_area_rate coordinate selected')
             loss_list.append(loss_info(text, prob, overflow_area_rate, coordinate, selected))
         else:
-            raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n')
+            raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\t{prob:.4f}\t{char_probs}\n')
     # 输出调试信息
     dump_debug_info(options, line, img, loss_list, ocr_loss_debug_path, sub_area, data)
 
 
 def dump_debug_info(options, line, img, loss_list, ocr_loss_debug_path, sub_area, data):
+    """
+    :param img 视频帧，为None时(e.g. VSF字幕帧图片)不输出
+    """
+    if img is None:
+        return
     loss = False
     if options.DEBUG_OCR_LOSS and options.REC_CHAR_TYPE in ('ch', 'japan ', 'korea', 'ch_tra'):
         loss = len(line) > 0 and re.search(r'[\u4e00-\u9fa5\u3400-\u4db5\u3130-\u318F\uAC00-\uD7A3\u0800-\u4e00]', line) is None
@@ -104,7 +140,17 @@ def coordinate_to_polygon(coordinate):
 
 
 FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotoSansCJK-Bold.otf')
-FONT = ImageFont.truetype(FONT_PATH, 20)
+FONT = None
+
+
+def get_font():
+    """
+    字体仅在输出调试图片时加载
+    """
+    global FONT
+    if FONT is None:
+        FONT = ImageFont.truetype(FONT_PATH, 20)
+    return FONT
 
 
 def paint_chinese_opencv(im, chinese, pos, color):
@@ -112,36 +158,42 @@ def paint_chinese_opencv(im, chinese, pos, color):
     fill_color = color  # (color[2], color[1], color[0])
     position = pos
     draw = ImageDraw.Draw(img_pil)
-    draw.text(position, chinese, font=FONT, fill=fill_color)
+    draw.text(position, chinese, font=get_font(), fill=fill_color)
     img = np.asarray(img_pil)
     return img
 
 
 def ocr_task_consumer(ocr_queue, raw_subtitle_path, sub_area, video_path, options):
     """
-    消费者： 消费ocr_queue，将ocr队列中的数据取出，进行ocr识别，写入字幕文件中
-    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果)
+    消费者： 消费ocr_queue，将ocr队列中的数据取出，等待ocr识别结果，写入字幕文件中
+    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, result 识别结果(dt_box检测框, rec_res识别结果)的Future)
     :param raw_subtitle_path
     :param sub_area
     :param video_path
     :param options
     """
     data = {'i': 1}
-    # 初始化文本识别对象
-    text_recogniser = OcrRecogniser()
+    # 初始化文本识别对象，生产者已经给出识别结果时不需要加载模型
+    text_recogniser = LazyRecogniser(getattr(options, 'OCR_SERVER_ADDRESS', None))
     # 丢失字幕的存储路径
     ocr_loss_debug_path = os.path.join(os.path.abspath(os.path.splitext(video_path)[0]), 'loss')
     # 删除之前的缓存垃圾
     if os.path.exists(ocr_loss_debug_path):
         shutil.rmtree(ocr_loss_debug_path, True)
 
+    inst = instrument.get_instrument()
     with open(raw_subtitle_path, mode='w+', encoding='utf-8') as raw_subtitle_file:
         while True:
             try:
-                frame_no, frame, dt_box, rec_res = ocr_queue.get(block=True)
+                with inst.span(instrument.SPAN_QUEUE_WAIT):
+                    frame_no, frame, result = ocr_queue.get(block=True)
                 if frame_no == -1:
                     return
                 data['i'] = frame_no
+                dt_box, rec_res = result.result()
+                if isinstance(frame, Future):
+                    # VSF字幕帧图片只包含字幕区域，而检测框已换算为视频帧坐标，无法在图片上绘制调试信息
+                    frame = None
                 extract_subtitles(data, text_recogniser, frame, raw_subtitle_file, sub_area, options, dt_box,
                                   rec_res, ocr_loss_debug_path)
             except Exception as e:
@@ -149,51 +201,126 @@ def ocr_task_consumer(ocr_queue, raw_subtitle_path, sub_area, video_path, option
                 break
 
 
-def ocr_task_producer(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path):
+def read_vsf_image(path):
+    with instrument.get_instrument().span(instrument.SPAN_DECODE):
+        img = vsf.read_image(path)
+    if img is None:
+        print(f'failed to read {path}, skipped')
+    return img
+
+
+def submit_vsf_image(infer_queue, image, frame_size, sub_area):
     """
-    生产者：负责生产用于OCR识别的数据，将需要进行ocr识别的数据加入ocr_queue中
-    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果)
-    :param task_queue (total_frame_count总帧数, current_frame_no当前帧帧号, dt_box检测框, rec_res识别结果, subtitle_area字幕区域)
+    识别VSF字幕帧图片，并将检测框换算为视频帧坐标
+    :param infer_queue 识别队列
+    :param image 读取图片的Future
+    :param frame_size 视频帧尺寸(width, height)
+    :param sub_area 字幕区域(ymin, ymax, xmin, xmax)
+    :return 识别结果(dt_box检测框, rec_res识别结果)的Future
+    """
+    result = Future()
+
+    def on_recognised(future, transform):
+        try:
+            dt_box, rec_res = future.result()
+            result.set_result((vsf.transform_boxes(dt_box, transform), rec_res))
+        except Exception as e:
+            result.set_exception(e)
+
+    def on_loaded(future):
+        try:
+            img = future.result()
+            if img is None:
+                result.set_result(([], []))
+                return
+            transform = vsf.image_to_frame_transform(img.shape, frame_size, sub_area)
+            infer_queue.submit(img).add_done_callback(lambda f: on_recognised(f, transform))
+        except Exception as e:
+            result.set_exception(e)
+
+    image.add_done_callback(on_loaded)
+    return result
+
+
+def ocr_task_producer(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path, sub_area, options):
+    """
+    生产者：负责生产用于OCR识别的数据，将视频帧提交给识别队列，并按帧顺序将识别结果的Future加入ocr_queue中
+    识别在后台线程中进行，生产者可以继续读取下一帧，识别线程会把等待中的视频帧合并为一批
+    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, result 识别结果(dt_box检测框, rec_res识别结果)的Future)
+    :param task_queue (total_frame_count总帧数, current_frame_no当前帧帧号, dt_box检测框, rec_res识别结果, total_ms当前帧时间,
+                       subtitle_area字幕区域[, image_path VSF字幕帧图片])
     :param progress_queue
     :param video_path
     :param raw_subtitle_path
+    :param sub_area 字幕区域，用于将VSF字幕帧图片中的坐标换算为视频帧坐标
+    :param options
     """
     cap = cv2.VideoCapture(video_path)
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    # 模型只加载一次，配置了OCR模型服务时使用服务中已加载的模型
+    ocr = get_recogniser(getattr(options, 'OCR_SERVER_ADDRESS', None))
+    infer_queue = InferenceQueue(ocr.predict_batch, getattr(options, 'MAX_BATCH_SIZE', 1),
+                                 getattr(options, 'OCR_BATCH_MAX_WAIT', 0), name='ocr-queue')
+    # 并行读取VSF字幕帧图片
+    image_pool = ThreadPoolExecutor(max_workers=getattr(options, 'VSF_IMAGE_READ_THREADS', 4),
+                                    thread_name_prefix='vsf-image')
     tbar = None
+    inst = instrument.get_instrument()
     while True:
         try:
             # 从任务队列中提取任务信息
-            total_frame_count, current_frame_no, dt_box, rec_res, total_ms, default_subtitle_area = task_queue.get(block=True)
+            with inst.span(instrument.SPAN_QUEUE_WAIT):
+                task = task_queue.get(block=True)
+            total_frame_count, current_frame_no, dt_box, rec_res, total_ms, default_subtitle_area = task[:6]
+            image_path = task[6] if len(task) > 6 else None
             progress_queue.put(current_frame_no)
             if tbar is None:
                 tbar = tqdm(total=round(total_frame_count), position=1)
             # current_frame 等于-1说明所有视频帧已经读完
             if current_frame_no == -1:
                 # ocr识别队列加入结束标志
-                ocr_queue.put((-1, None, None, None))
+                ocr_queue.put((-1, None, None))
                 # 更新进度条
                 tbar.update(tbar.total - tbar.n)
                 break
             tbar.update(round(current_frame_no - tbar.n))
+            if image_path is not None and dt_box is None:
+                # VSF已经保存了字幕区域图片，直接识别图片，不需要从视频中解码
+                image = image_pool.submit(read_vsf_image, image_path)
+                result = submit_vsf_image(infer_queue, image, frame_size, sub_area)
+                ocr_queue.put((current_frame_no, image, result))
+                continue
             # 设置当前视频帧
             # 如果total_ms不为空，则使用了VSF提取字幕
-            if total_ms is not None:
-                cap.set(cv2.CAP_PROP_POS_MSEC, total_ms)
-            else:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame_no - 1)
+            with inst.span(instrument.SPAN_SEEK):
+                if total_ms is not None:
+                    cap.set(cv2.CAP_PROP_POS_MSEC, total_ms)
+                else:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame_no - 1)
             # 读取视频帧
-            ret, frame = cap.read()
-            ocr = OcrRecogniser()
-            dt_box, rec_res = ocr.predict(frame)
+            with inst.span(instrument.SPAN_DECODE):
+                ret, frame = cap.read()
             # 如果读取成功
             if ret:
+                if dt_box is not None and rec_res is not None:
+                    # 已有识别结果，不需要再次识别
+                    result = Future()
+                    result.set_result((dt_box, rec_res))
+                    inst.count(instrument.COUNTER_FRAMES_CACHED)
+                else:
+                    result = infer_queue.submit(frame)
                 # 根据默认字幕位置，则对视频帧进行裁剪，裁剪后处理
                 if default_subtitle_area is not None:
-                    frame = frame_preprocess(default_subtitle_area, frame)
-                ocr_queue.put((current_frame_no, frame, dt_box, rec_res))
+                    with inst.span(instrument.SPAN_CROP):
+                        frame = frame_preprocess(default_subtitle_area, frame)
+                ocr_queue.put((current_frame_no, frame, result))
+                inst.gauge('ocr_queue_depth', ocr_queue.qsize())
         except Exception as e:
             print(e)
             break
+    # 等待读取中的图片提交识别后再关闭识别队列
+    image_pool.shutdown(wait=True)
+    infer_queue.close()
     cap.release()
 
 
@@ -210,11 +337,15 @@ def subtitle_extract_handler(task_queue, progress_queue, video_path, raw_subtitl
     # 删除缓存
     if os.path.exists(raw_subtitle_path):
         os.remove(raw_subtitle_path)
+    # 开启性能埋点
+    inst = instrument.get_instrument()
+    inst.enable(getattr(options, 'PROFILE', False))
     # 创建一个OCR队列，大小建议值8-20
     ocr_queue = queue.Queue(20)
     # 创建一个OCR事件生产者线程
     ocr_event_producer_thread = Thread(target=ocr_task_producer,
-                                       args=(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path,),
+                                       args=(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path,
+                                             sub_area, options,),
                                        daemon=True)
     # 创建一个OCR事件消费者提取线程
     ocr_event_consumer_thread = Thread(target=ocr_task_consumer,
@@ -227,6 +358,16 @@ def subtitle_extract_handler(task_queue, progress_queue, video_path, raw_subtitl
     # join方法让主线程任务结束之后，进入阻塞状态，一直等待其他的子线程执行结束之后，主线程再终止
     ocr_event_producer_thread.join()
     ocr_event_consumer_thread.join()
+    # 将OCR进程的埋点数据写入文件，由主进程合并
+    if inst.enabled:
+        inst.dump(get_profile_path(raw_subtitle_path))
+
+
+def get_profile_path(raw_subtitle_path):
+    """
+    OCR进程埋点数据的存储路径
+    """
+    return os.path.join(os.path.dirname(raw_subtitle_path), 'profile_ocr.json')
 
 
 def async_start(video_path, raw_subtitle_path, sub_area, options):
@@ -236,6 +377,9 @@ def async_start(video_path, raw_subtitle_path, sub_area, options):
     options.DROP_SCORE
     options.SUB_AREA_DEVIATION_RATE
     options.DEBUG_OCR_LOSS
+    options.PROFILE (可选)
+    options.OCR_SERVER_ADDRESS (可选)
+    options.VSF_IMAGE_READ_THREADS (可选)
     """
     assert 'REC_CHAR_TYPE' in options, "options缺少参数：REC_CHAR_TYPE"
     assert 'DROP_SCORE' in options, "options缺少参数: DROP_SCORE'"
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: subtitle_track.py
+@desc: 内存中的字幕轨道
+字幕行保存为开始时间、结束时间(毫秒)数组与文本列表，分词等后处理直接修改内存中的文本，
+处理完成后一次性写出需要的格式(SRT, WebVTT, ASS, TXT, JSON lines)，不再反复写入并解析SRT文件
+"""
+import json
+import re
+from array import array
+
+# SRT时间轴, e.g. 00:01:02,345 --> 00:01:04,567，同时兼容.作为毫秒分隔符
+SRT_TIMING = re.compile(r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})')
+
+
+class SubtitleTrack:
+    """
+    e.g.
+        track = SubtitleTrack()
+        track.append(1000, 2500, 'Hello')
+        save(track, '/path/to/video', ['srt', 'txt'])
+    """
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.texts = []
+
+    def append(self, start_ms, end_ms, text):
+        self.starts.append(int(start_ms))
+        self.ends.append(int(end_ms))
+        self.texts.append(text)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends, self.texts)
+
+    def map_text(self, fn):
+        """
+        对每一行字幕文本执行fn，结果替换原文本
+        """
+        self.texts = [fn(text) for text in self.texts]
+
+    @classmethod
+    def from_srt(cls, path, encoding='utf-8'):
+        """
+        读取SRT文件，序号行被忽略，时间轴之后到空行之前为字幕文本
+        """
+        track = cls()
+        with open(path, mode='r', encoding=encoding, errors='replace') as f:
+            content = f.read().lstrip('\ufeff')
+        text_lines = None
+        for line in content.splitlines():
+            match = SRT_TIMING.search(line)
+            if match is not None:
+                if text_lines is not None:
+                    track.texts[-1] = '\n'.join(text_lines)
+                values = [int(v) for v in match.groups()]
+                track.append(to_ms(*values[:4]), to_ms(*values[4:]), '')
+                text_lines = []
+            elif text_lines is not None:
+                if line.strip():
+                    text_lines.append(line.rstrip())
+                else:
+                    track.texts[-1] = '\n'.join(text_lines)
+                    text_lines = None
+        if text_lines is not None:
+            track.texts[-1] = '\n'.join(text_lines)
+        return track
+
+
+def to_ms(hours, minutes, seconds, milliseconds):
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + milliseconds
+
+
+def split_ms(ms):
+    """
+    :return (时, 分, 秒, 毫秒)
+    """
+    ms = max(0, int(ms))
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return hours, minutes, seconds, ms
+
+
+def srt_time(ms):
+    return '%02d:%02d:%02d,%03d' % split_ms(ms)
+
+
+def vtt_time(ms):
+    return '%02d:%02d:%02d.%03d' % split_ms(ms)
+
+
+def ass_time(ms):
+    hours, minutes, seconds, ms = split_ms(ms)
+    return '%d:%02d:%02d.%02d' % (hours, minutes, seconds, ms // 10)
+
+
+def write_srt(track, f):
+    for index, (start, end, text) in enumerate(track, start=1):
+        f.write(f'{index}\n{srt_time(start)} --> {srt_time(end)}\n{text}\n\n')
+
+
+def write_vtt(track, f):
+    f.write('WEBVTT\n\n')
+    for start, end, text in track:
+        # WebVTT中&和<有特殊含义，空行会结束字幕
+        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        text = '\n'.join(line for line in text.split('\n') if line.strip())
+        f.write(f'{vtt_time(start)} --> {vtt_time(end)}\n{text}\n\n')
+
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: {width}
+PlayResY: {height}
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, \
+StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,{font_size},&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,2,1,2,10,10,\
+{margin_v},1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def write_ass(track, f, frame_size=None):
+    """
+    :param frame_size 视频尺寸(width, height)，字号与边距按视频高度设置
+    """
+    width, height = frame_size if frame_size else (1920, 1080)
+    f.write(ASS_HEADER.format(width=width, height=height, font_size=max(12, round(height * 0.055)),
+                              margin_v=max(10, round(height * 0.04))))
+    for start, end, text in track:
+        # ASS中{}为样式标签，换行使用\N
+        text = text.replace('{', '(').replace('}', ')').replace('\n', '\\N')
+        f.write(f'Dialogue: 0,{ass_time(start)},{ass_time(end)},Default,,0,0,0,,{text}\n')
+
+
+def write_txt(track, f):
+    for text in track.texts:
+        f.write(f'{text}\n')
+
+
+def write_jsonl(track, f):
+    for index, (start, end, text) in enumerate(track, start=1):
+        f.write(json.dumps({'index': index, 'start': start, 'end': end, 'text': text}, ensure_ascii=False) + '\n')
+
+
+# 输出格式 -> (文件扩展名, 写入函数)
+WRITERS = {
+    'srt': ('.srt', write_srt),
+    'vtt': ('.vtt', write_vtt),
+    'ass': ('.ass', write_ass),
+    'txt': ('.txt', write_txt),
+    'jsonl': ('.jsonl', write_jsonl),
+}
+
+
+def save(track, base_path, formats, frame_size=None):
+    """
+    将字幕轨道写出为指定格式
+    :param base_path 不含扩展名的输出路径, e.g. 视频路径去掉扩展名
+    :param formats 格式列表，见WRITERS
+    :param frame_size 视频尺寸(width, height)，ASS格式使用
+    :return 格式 -> 输出文件路径
+    """
+    paths = {}
+    for fmt in dict.fromkeys(fmt.lower() for fmt in formats):
+        if fmt not in WRITERS:
+            raise ValueError(f'unsupported subtitle format: {fmt}, expected one of {", ".join(WRITERS)}')
+        ext, writer = WRITERS[fmt]
+        path = base_path + ext
+        with open(path, mode='w', encoding='utf-8', newline='\n') as f:
+            if fmt == 'ass':
+                writer(track, f, frame_size)
+            else:
+                writer(track, f)
+        paths[fmt] = path
+    return paths
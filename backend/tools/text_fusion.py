@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: text_fusion.py
+@desc: 同一条字幕多帧识别结果的融合，按识别置信度加权，逐字对齐投票得到最终文本
+每个字符按该字符自身的识别置信度投票(CTC解码得到，保存在raw.txt第5列)，没有逐字置信度时使用整行的置信度
+"""
+from collections import defaultdict
+from Levenshtein import opcodes, ratio
+
+# 置信度下限，避免置信度为0的帧完全没有投票权
+MIN_WEIGHT = 1e-3
+
+
+def fuse_texts(candidates):
+    """
+    融合同一条字幕在多帧中的识别结果
+    1. 选取与其他候选加权相似度之和最大的文本作为骨架
+    2. 将每个候选与骨架逐字对齐，每一帧为每个字符位置(包括插入与删除)投票：
+       对应或插入的字符按该字符的置信度投票，删除与不插入按整行置信度投票
+    3. 每个位置取得票最高的结果拼接成最终文本
+    :param candidates 识别结果列表[(text, score), ...]或[(text, score, char_probs), ...]，
+                      score为该帧文本的识别置信度，char_probs为与text逐字对应的置信度，为None或长度不一致时按score投票
+    :return 融合后的文本
+    """
+    weights = defaultdict(float)
+    char_weights = {}
+    for text, score, *rest in candidates:
+        if not text:
+            continue
+        # 完全相同的文本合并权重
+        weights[text] += max(score, MIN_WEIGHT)
+        char_probs = rest[0] if rest and rest[0] is not None and len(rest[0]) == len(text) else [score] * len(text)
+        summed = char_weights.setdefault(text, [0.0] * len(text))
+        for i, p in enumerate(char_probs):
+            summed[i] += max(p, MIN_WEIGHT)
+    if len(weights) == 0:
+        return ''
+    if len(weights) == 1:
+        return next(iter(weights))
+    texts = list(weights)
+    backbone = max(texts, key=lambda t: sum(weights[o] * ratio(t, o) for o in texts))
+    # 骨架最先投票，平票时保留骨架上的字符
+    texts.remove(backbone)
+    texts.insert(0, backbone)
+
+    n = len(backbone)
+    # char_votes[i]: 骨架第i个字符位置的候选字符，''表示该位置被删除
+    char_votes = [defaultdict(float) for _ in range(n)]
+    # insert_votes[i]: 骨架第i个字符之前插入的字符串，''表示不插入
+    insert_votes = [defaultdict(float) for _ in range(n + 1)]
+    for text in texts:
+        w = weights[text]
+        cw = char_weights[text]
+        inserted = [''] * (n + 1)
+        # 插入的字符串按其中字符置信度的平均值投票
+        inserted_weight = [[] for _ in range(n + 1)]
+        for tag, i1, i2, j1, j2 in opcodes(backbone, text):
+            if tag == 'insert':
+                inserted[i1] += text[j1:j2]
+                inserted_weight[i1].extend(cw[j1:j2])
+                continue
+            if tag == 'delete':
+                for i in range(i1, i2):
+                    char_votes[i][''] += w
+                continue
+            # equal与replace: 一一对应的部分直接投票，多余的部分视为删除或插入
+            common = min(i2 - i1, j2 - j1)
+            for k in range(common):
+                char_votes[i1 + k][text[j1 + k]] += cw[j1 + k]
+            for i in range(i1 + common, i2):
+                char_votes[i][''] += w
+            inserted[i2] += text[j1 + common:j2]
+            inserted_weight[i2].extend(cw[j1 + common:j2])
+        for i, s in enumerate(inserted):
+            insert_votes[i][s] += sum(inserted_weight[i]) / len(inserted_weight[i]) if s else w
+
+    result = []
+    for i in range(n + 1):
+        result.append(max(insert_votes[i].items(), key=lambda x: x[1])[0])
+        if i < n:
+            result.append(max(char_votes[i].items(), key=lambda x: x[1])[0])
+    return ''.join(result)
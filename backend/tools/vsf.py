@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: vsf.py
+@desc: VideoSubFinder输出适配
+VSF运行过程中会在命令行输出每个字幕帧的帧名(Frame: 0_00_01_234__0_00_02_345)，
+并把字幕帧图片写入输出目录下的RGBImages目录，文件名以同样的时间开头。
+本模块负责解析命令行输出，或者定时检查RGBImages目录中新出现的图片(只处理新文件，不对整个目录重复排序)，
+字幕提取程序据此在VSF运行的同时把字幕帧加入OCR任务队列。
+RGBImages中的图片只包含字幕区域，OCR可以直接识别这些图片，再把文本框坐标换算回视频帧坐标，不需要重新解码视频
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+RGB_IMAGES_DIR = 'RGBImages'
+IMAGE_EXTS = ('.jpeg', '.jpg', '.png', '.bmp')
+FRAME_PREFIX = 'Frame: '
+
+
+def parse_frame_time(name):
+    """
+    VSF帧名或图片文件名中的开始时间
+    e.g. 0_00_01_234__0_00_02_345.jpeg -> 1234
+    :return 毫秒，无法解析时返回None
+    """
+    try:
+        h, m, s, ms = os.path.basename(name).split('__')[0].split('_')
+        return int(ms) + int(s) * 1000 + int(m) * 60 * 1000 + int(h) * 60 * 60 * 1000
+    except ValueError:
+        return None
+
+
+def iter_progress(stream):
+    """
+    解析VSF命令行输出
+    :param stream 二进制输出流(e.g. Popen.stderr)
+    :return 生成器，依次返回字幕帧的帧名，其他输出直接打印
+    """
+    for line in iter(stream.readline, b''):
+        line = line.decode('utf-8', errors='ignore').strip()
+        if line.startswith(FRAME_PREFIX):
+            yield line[len(FRAME_PREFIX):]
+        else:
+            print(line)
+    stream.close()
+
+
+class RGBImageWatcher:
+    """
+    检查RGBImages目录中新出现的字幕帧图片
+    目录的修改时间没有变化时不读取目录，已返回过的文件记录在集合中，每次只排序新文件
+    """
+
+    def __init__(self, rgb_dir, poll_interval=0.2):
+        self.rgb_dir = rgb_dir
+        self.poll_interval = poll_interval
+        self.seen = set()
+        # 开始时间 -> 图片文件名
+        self.by_time = {}
+        self.last_mtime = None
+
+    def poll(self, force=False):
+        """
+        :param force 忽略目录修改时间，重新读取目录
+        :return 上次调用之后新出现的图片文件名，按开始时间排序
+        """
+        try:
+            mtime = os.stat(self.rgb_dir).st_mtime_ns
+        except FileNotFoundError:
+            # VSF还没有创建目录，或者目录已经被清理
+            return []
+        # 部分文件系统修改时间精度较低，刚修改过的目录总是重新读取
+        if not force and mtime == self.last_mtime and time.time_ns() - mtime > 2 * 10 ** 9:
+            return []
+        self.last_mtime = mtime
+        new_images = []
+        try:
+            with os.scandir(self.rgb_dir) as entries:
+                for entry in entries:
+                    if entry.name in self.seen or not entry.name.lower().endswith(IMAGE_EXTS):
+                        continue
+                    start_ms = parse_frame_time(entry.name)
+                    if start_ms is None:
+                        continue
+                    self.seen.add(entry.name)
+                    self.by_time.setdefault(start_ms, entry.name)
+                    new_images.append(entry.name)
+        except FileNotFoundError:
+            return []
+        return sorted(new_images, key=parse_frame_time)
+
+    def watch(self, stop_event):
+        """
+        :param stop_event threading.Event，VSF结束后设置，此后再读取一次目录然后结束
+        :return 生成器，依次返回新出现的图片文件名
+        """
+        while not stop_event.wait(self.poll_interval):
+            yield from self.poll()
+        yield from self.poll(force=True)
+
+    def find(self, name):
+        """
+        查找VSF帧名对应的图片
+        :return 图片路径，VSF没有保存图片时返回None
+        """
+        start_ms = parse_frame_time(name)
+        if start_ms not in self.by_time:
+            self.poll(force=True)
+        image_name = self.by_time.get(start_ms)
+        return None if image_name is None else os.path.join(self.rgb_dir, image_name)
+
+
+def read_image(path, retries=5, interval=0.2):
+    """
+    读取VSF字幕帧图片，VSF可能还没写完文件，读取失败时稍后重试
+    :return BGR图像，读取失败时返回None
+    """
+    for i in range(retries):
+        # cv2.imread不支持中文路径
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR) if os.path.exists(path) else None
+        if img is not None:
+            return img
+        if i < retries - 1:
+            time.sleep(interval)
+    return None
+
+
+def image_to_frame_transform(image_shape, frame_size, sub_area):
+    """
+    VSF字幕帧图片坐标 -> 视频帧坐标
+    VSF按-te/-be/-le/-re裁剪字幕区域，图片尺寸与字幕区域一致的方向按字幕区域偏移，
+    与整帧一致的方向不偏移，其他情况按字幕区域缩放
+    :param image_shape 图片的shape
+    :param frame_size 视频帧尺寸(width, height)
+    :param sub_area 字幕区域(ymin, ymax, xmin, xmax)，为None时为整帧
+    :return (offset_x, offset_y, scale_x, scale_y)
+    """
+    frame_w, frame_h = frame_size
+    ymin, ymax, xmin, xmax = sub_area if sub_area is not None else (0, frame_h, 0, frame_w)
+
+    def axis(image_len, start, end, frame_len):
+        if abs(image_len - (end - start)) <= 2:
+            return start, (end - start) / image_len
+        if abs(image_len - frame_len) <= 2:
+            return 0, frame_len / image_len
+        return start, (end - start) / image_len
+
+    offset_x, scale_x = axis(image_shape[1], xmin, xmax, frame_w)
+    offset_y, scale_y = axis(image_shape[0], ymin, ymax, frame_h)
+    return offset_x, offset_y, scale_x, scale_y
+
+
+def transform_boxes(dt_box, transform):
+    """
+    将检测框从图片坐标换算为视频帧坐标
+    """
+    offset_x, offset_y, scale_x, scale_y = transform
+    scale = np.array([scale_x, scale_y], dtype=np.float32)
+    offset = np.array([offset_x, offset_y], dtype=np.float32)
+    return [np.asarray(box, dtype=np.float32) * scale + offset for box in dt_box]
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+@FileName: word_segmenter.py
+@desc: 英文分词
+使用wordsegment的unigram/bigram词频，按与wordsegment相同的评分规则迭代求最优切分(Viterbi)，
+不再递归，不需要调高递归深度限制，耗时与文本长度成线性关系。
+长文本按与wordsegment相同的方式分块处理，分块的切分结果缓存在有界的LRU中，同一进程内处理的所有字幕行与字幕文件共享
+"""
+import functools
+import math
+
+import wordsegment as ws
+
+# 缓存的分块切分结果数量
+CACHE_SIZE = 8192
+
+
+class WordSegmenter(ws.Segmenter):
+    """
+    e.g.
+        segmenter = get_segmenter()
+        segmenter.segment('thisisatest') -> ['this', 'is', 'a', 'test']
+    """
+    # 分块长度，分块之间携带上一块的最后几个单词，与wordsegment一致
+    CHUNK_SIZE = 250
+    CARRY_WORDS = 5
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        super().__init__()
+        # 存在bigram的前一个单词，其他单词作为前一个单词时只使用unigram评分
+        self.bigram_prevs = set()
+        self.search = functools.lru_cache(maxsize=cache_size)(self._search)
+
+    def load(self):
+        super().load()
+        self.bigram_prevs = {bigram.split(' ', 1)[0] for bigram in self.bigrams}
+        self.bigram_prevs.intersection_update(self.unigrams)
+        self.search.cache_clear()
+
+    def isegment(self, text):
+        clean_text = self.clean(text)
+        prefix = ''
+        for offset in range(0, len(clean_text), self.CHUNK_SIZE):
+            chunk_words = list(self.search(prefix + clean_text[offset:offset + self.CHUNK_SIZE]))
+            prefix = ''.join(chunk_words[-self.CARRY_WORDS:])
+            del chunk_words[-self.CARRY_WORDS:]
+            yield from chunk_words
+        yield from self.search(prefix)
+
+    def _search(self, text):
+        """
+        text的最优切分，与wordsegment的递归搜索结果一致
+        状态为(位置, 前一个单词)，前一个单词即以该位置结尾的长度不超过limit的子串(开头为'<s>')。
+        前一个单词没有bigram时，后续的最优切分与前一个单词无关，每个位置只计算一次
+        :return 单词元组
+        """
+        n = len(text)
+        limit = self.limit
+        unigrams = self.unigrams
+        bigrams = self.bigrams
+        total = self.total
+        # default[i]: 从位置i开始、前一个单词没有bigram时的(最优得分, 第一个单词长度)
+        default = [None] * n + [(0.0, 0)]
+        # special[(i, k)]: 前一个单词为text[i - k:i]且存在bigram时的(最优得分, 第一个单词长度)，k=0表示'<s>'
+        special = {(n, k): (0.0, 0) for k in range(limit + 1)}
+
+        def unigram_log(word):
+            if word in unigrams:
+                return math.log10(unigrams[word] / total)
+            return math.log10(10.0 / (total * 10 ** len(word)))
+
+        def next_state(i, j):
+            return special.get((i + j, j), default[i + j])
+
+        def words_from(i, k):
+            words = []
+            while i < n:
+                _, j = special.get((i, k), default[i])
+                words.append(text[i:i + j])
+                i, k = i + j, j
+            return words
+
+        def better(candidate, best, i, k):
+            if best is None or candidate[0] > best[0]:
+                return True
+            # 得分相同时按单词列表比较，与max((score, words), ...)一致
+            if candidate[0] == best[0]:
+                j = candidate[1]
+                current = words_from(i, k)
+                other = [text[i:i + j]] + words_from(i + j, j)
+                return other > current
+            return False
+
+        for i in range(n - 1, -1, -1):
+            max_j = min(n - i, limit)
+            uni_scores = []
+            best = None
+            for j in range(1, max_j + 1):
+                uni_score = unigram_log(text[i:i + j])
+                uni_scores.append(uni_score)
+                candidate = (uni_score + next_state(i, j)[0], j)
+                if better(candidate, best, i, -1):
+                    best = candidate
+                    default[i] = best
+            # 以位置i结尾、存在bigram的前一个单词
+            prevs = [(k, text[i - k:i]) for k in range(1, min(i, limit) + 1)]
+            if i == 0:
+                prevs = [(0, '<s>')]
+            for k, previous in prevs:
+                if previous not in self.bigram_prevs:
+                    continue
+                prev_score = unigrams[previous] / total
+                best = None
+                for j in range(1, max_j + 1):
+                    bigram = previous + ' ' + text[i:i + j]
+                    if bigram in bigrams:
+                        score = math.log10(bigrams[bigram] / total / prev_score)
+                    else:
+                        score = uni_scores[j - 1]
+                    candidate = (score + next_state(i, j)[0], j)
+                    if better(candidate, best, i, k):
+                        best = candidate
+                        special[(i, k)] = best
+        return tuple(words_from(0, 0))
+
+
+@functools.lru_cache(maxsize=None)
+def get_segmenter():
+    """
+    进程内共享的分词器，词频只加载一次
+    """
+    segmenter = WordSegmenter()
+    segmenter.load()
+    return segmenter
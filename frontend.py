@@ -1,12 +1,18 @@
 import os
 import requests
 import json
+import hashlib
 from tqdm import tqdm
-from threading import Thread, Event, Lock
+from threading import Thread, Event, Lock, Condition
+import heapq
+import itertools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import time  # 示例前端处理用
 import shutil  # 用于复制文件
 from pathlib import Path
 from backend.main import SubtitleExtractor  # 导入字幕提取模块的核心类
+from backend.tools.job_queue import STATUS_FAILED, STATUS_CANCELLED, FINISHED_STATUSES
 import configparser
 import cv2
 
@@ -16,11 +22,20 @@ TARGET_FOLDER = r'E:\Temp'  # 后端处理的目标文件夹（绝对路径）
 
 # 当前运行目录中的记录文件
 CURRENT_DIR = os.getcwd()
-PROCESSED_RECORD = os.path.join(CURRENT_DIR, 'processed.json')  # 后端已处理记录文件
+PROCESSED_RECORD = os.path.join(CURRENT_DIR, 'processed.jsonl')  # 后端已处理记录文件
 FAILED_LOG = os.path.join(CURRENT_DIR, 'failed.log')  # 后端处理失败日志文件
 FRONTEND_PROCESSED_FOLDER = os.path.join(CURRENT_DIR, 'FrontendProcessed')  # 前端处理结果文件夹
-FRONTEND_PROCESSED_RECORD = os.path.join(CURRENT_DIR, 'frontend_processed.json')  # 前端已处理记录文件
-SUBTITLE_RECORD = os.path.join(CURRENT_DIR, 'subtitle_processed.json')  # 字幕提取记录文件
+FRONTEND_PROCESSED_RECORD = os.path.join(CURRENT_DIR, 'frontend_processed.jsonl')  # 前端已处理记录文件
+SUBTITLE_RECORD = os.path.join(CURRENT_DIR, 'subtitle_processed.jsonl')  # 字幕提取记录文件
+# 处理记录为追加写入的日志(每行一条JSON)，追加的记录超过该数量且多于有效记录时重写(压缩)日志
+RECORD_COMPACT_THRESHOLD = 1000
+# 计算内容哈希时在文件开头、中间、结尾各读取的字节数
+HASH_SAMPLE_SIZE = 1024 * 1024
+# 视频库索引：缓存 (路径, 大小, 修改时间) -> 视频指纹，再次扫描时未变化的文件不需要重新读取
+LIBRARY_INDEX = os.path.join(CURRENT_DIR, 'library_index.db')
+# 并行扫描目录的线程数，以及并行计算新文件指纹的线程数
+SCAN_THREADS = 8
+FINGERPRINT_THREADS = 4
 
 SUBTITLE_CONFIG=os.path.join(CURRENT_DIR, 'subtitle.ini') #字幕区域配置
 
@@ -33,30 +48,172 @@ BACKEND_SERVERS = [
 # 支持的扩展名（常见视频格式）
 VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv'}
 
+# 下载时每次写入磁盘的数据块大小
+CHUNK_SIZE = 1024 * 1024
+# 查询后端任务状态的间隔（秒）
+POLL_INTERVAL = 5
+# 上传与下载的连接超时、读取超时（秒）
+REQUEST_TIMEOUT = (10, 300)
+# 下载中断后的重试次数
+DOWNLOAD_RETRIES = 3
+
+# 每台后端服务器最多同时处理的视频数，实际并发数根据测得的吞吐量在1到该值之间调整
+MAX_SERVER_CONCURRENCY = 4
+# 吞吐量变化超过该比例才调整并发数
+THROUGHPUT_MARGIN = 0.1
+# 处理失败后最多重试次数，第n次重试前等待 RETRY_BACKOFF * 2^(n-1) 秒
+MAX_RETRIES = 3
+RETRY_BACKOFF = 30
+# 服务器连续失败该次数后暂停分配任务 SERVER_COOLDOWN 秒
+SERVER_MAX_FAILURES = 2
+SERVER_COOLDOWN = 60
+# 任务耗时超过预计耗时的倍数(且超过最短时间)时，由空闲的服务器同时处理，先完成的结果生效
+STRAGGLER_FACTOR = 2.0
+STRAGGLER_MIN_SECONDS = 300
+
 # 停止事件，用于安全关闭线程
 STOP_EVENT = Event()
 
 # 线程锁
-PROCESS_LOCK = Lock()
 FAILED_LOCK = Lock()
 
-# 初始化已处理记录文件
-def load_processed_record(record_file):
+HASH_CACHE = {}
+HASH_CACHE_LOCK = Lock()
+
+
+def content_hash(file_path):
     """
-    加载处理记录文件。
+    视频内容哈希：文件大小与开头、中间、结尾各HASH_SAMPLE_SIZE字节的SHA-1，文件改名或移动后不变。
+    同一文件(路径、大小、修改时间不变)只计算一次。
     """
-    if os.path.exists(record_file):
-        with open(record_file, 'r') as f:
-            return set(json.load(f))
-    else:
-        return set()
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_size, stat.st_mtime_ns)
+    with HASH_CACHE_LOCK:
+        if key in HASH_CACHE:
+            return HASH_CACHE[key]
+    sha1 = hashlib.sha1(str(stat.st_size).encode())
+    with open(file_path, 'rb') as f:
+        for offset in sorted({0, max(0, stat.st_size // 2 - HASH_SAMPLE_SIZE // 2),
+                              max(0, stat.st_size - HASH_SAMPLE_SIZE)}):
+            f.seek(offset)
+            sha1.update(f.read(HASH_SAMPLE_SIZE))
+    digest = sha1.hexdigest()
+    with HASH_CACHE_LOCK:
+        HASH_CACHE[key] = digest
+    return digest
+
+
+class ProcessedJournal:
+    """
+    已处理记录：每完成一个视频向日志追加一行JSON(视频id、内容哈希、输出路径、耗时)，不再每次重写整个文件；
+    启动时读取到集合中，按视频id或内容哈希判断是否已处理，写入中断产生的不完整行在读取时忽略。
+    """
+
+    def __init__(self, record_file):
+        self.record_file = record_file
+        self.lock = Lock()
+        # 视频id -> 最近一次的记录
+        self.entries = {}
+        self.hashes = set()
+        self.lines = 0
+        # 旧版本的JSON列表记录，只读取
+        legacy_file = os.path.splitext(record_file)[0] + '.json'
+        if os.path.exists(legacy_file):
+            with open(legacy_file, 'r') as f:
+                for unique_id in json.load(f):
+                    self.entries[unique_id] = {'id': unique_id}
+        if os.path.exists(record_file):
+            with open(record_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._index(entry)
+                    self.lines += 1
+        if self.lines > RECORD_COMPACT_THRESHOLD and self.lines > 2 * len(self.entries):
+            self.compact()
+        self.file = open(record_file, 'a', encoding='utf-8')
+        # 上次写入中断留下的不完整行单独成行，避免与新记录连在一起
+        if self.file.tell() > 0:
+            with open(record_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.file.write('\n')
+
+    def _index(self, entry):
+        self.entries[entry['id']] = entry
+        if entry.get('hash'):
+            self.hashes.add(entry['hash'])
+
+    def __contains__(self, unique_id):
+        return unique_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def contains(self, unique_id, file_path=None):
+        """
+        视频id已记录，或file_path的内容哈希已记录(文件改名后)时返回True。
+        """
+        if unique_id in self.entries:
+            return True
+        if file_path is None or not self.hashes:
+            return False
+        try:
+            return content_hash(file_path) in self.hashes
+        except OSError:
+            return False
+
+    def add(self, unique_id, file_path=None, output_path=None, seconds=None):
+        """
+        追加一条记录并立即写入磁盘。
+        """
+        entry = {'id': unique_id, 'time': round(time.time(), 3)}
+        if file_path is not None:
+            try:
+                entry['hash'] = content_hash(file_path)
+            except OSError:
+                pass
+        if output_path is not None:
+            entry['output'] = output_path
+        if seconds is not None:
+            entry['seconds'] = round(seconds, 3)
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self.lock:
+            self._index(entry)
+            self.file.write(line)
+            self.file.flush()
+            self.lines += 1
+            if self.lines > RECORD_COMPACT_THRESHOLD and self.lines > 2 * len(self.entries):
+                self.file.close()
+                self.compact()
+                self.file = open(self.record_file, 'a', encoding='utf-8')
+
+    def compact(self):
+        """
+        每个视频只保留最近一次的记录，写入临时文件后替换原日志，中途崩溃不影响原日志。
+        """
+        temp_file = self.record_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.record_file)
+        self.lines = len(self.entries)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
 
-def save_processed_record(record_file, processed_files):
+
+# 初始化已处理记录文件
+def load_processed_record(record_file):
     """
-    保存处理记录文件。
+    加载处理记录文件。
     """
-    with open(record_file, 'w') as f:
-        json.dump(list(processed_files), f)
+    return ProcessedJournal(record_file)
 
 # 记录失败日志
 def log_failed_video(video_id, error_message):
@@ -64,26 +221,157 @@ def log_failed_video(video_id, error_message):
         with open(FAILED_LOG, 'a') as f:
             f.write(f"{video_id}: {error_message}\n")
 
+def scan_directory(path):
+    """
+    扫描一个目录。
+    :return (视频文件列表[(路径, 大小, 修改时间)], 子目录列表)
+    """
+    files, dirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS:
+                        stat = entry.stat()
+                        files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"[Scan] Cannot read {path}: {str(e)}")
+    return files, dirs
+
+
+def walk_parallel(root):
+    """
+    多线程遍历目录树，每个目录作为一个任务，网络存储上各目录的读取延迟可以重叠。
+    :return 生成器，依次返回视频文件(路径, 大小, 修改时间)
+    """
+    with ThreadPoolExecutor(max_workers=SCAN_THREADS) as pool:
+        pending = {pool.submit(scan_directory, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, dirs = future.result()
+                yield from files
+                pending |= {pool.submit(scan_directory, d) for d in dirs}
+
+
+def video_metadata(file_path):
+    """
+    从容器信息读取视频时长(秒)与帧率，不解码视频帧。
+    """
+    video_cap = cv2.VideoCapture(file_path)
+    try:
+        fps = video_cap.get(cv2.CAP_PROP_FPS) if video_cap.isOpened() else 0
+        frame_count = video_cap.get(cv2.CAP_PROP_FRAME_COUNT) if video_cap.isOpened() else 0
+    finally:
+        video_cap.release()
+    duration = frame_count / fps if fps > 0 else 0
+    return round(duration, 2), round(fps, 3)
+
+
+def video_fingerprint(file_path):
+    """
+    视频指纹：内容哈希 + 时长 + 帧率，内容相同而文件名不同的视频指纹相同。
+    :return (指纹, 内容哈希, 时长, 帧率)
+    """
+    digest = content_hash(file_path)
+    duration, fps = video_metadata(file_path)
+    return f"{digest}:{round(duration)}:{fps:g}", digest, duration, fps
+
+
+class LibraryIndex:
+    """
+    视频库索引(SQLite)，记录每个视频文件的大小、修改时间与指纹。
+    """
+
+    def __init__(self, index_file):
+        self.conn = sqlite3.connect(index_file)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, fingerprint TEXT, hash TEXT, duration REAL,
+            fps REAL)''')
+
+    def load(self):
+        """
+        :return 路径 -> (大小, 修改时间, 指纹, 内容哈希)
+        """
+        rows = self.conn.execute('SELECT path, size, mtime, fingerprint, hash FROM files')
+        return {row[0]: row[1:] for row in rows}
+
+    def update(self, rows, removed):
+        """
+        :param rows [(路径, 大小, 修改时间, 指纹, 内容哈希, 时长, 帧率)]
+        :param removed 已不存在的文件路径
+        """
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self.conn.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in removed])
+
+    def close(self):
+        self.conn.close()
+
+
 # 获取待处理的视频列表
-def get_video_list():
+def get_video_list(skip=None):
     """
     获取所有待处理的视频文件列表，仅保留支持的视频格式。
+    并行扫描SOURCE_FOLDER，只为新增或变化(大小、修改时间不同)的文件计算指纹，其余文件使用索引中的指纹；
+    指纹相同的视频只保留第一个。
+    :param skip 判断未变化的视频是否可以跳过(e.g. 已全部处理)，参数为(unique_id, file_path)
     """
+    start_time = time.time()
+    index = LibraryIndex(LIBRARY_INDEX)
+    known = index.load()
+    scanned = sorted(walk_parallel(SOURCE_FOLDER))
+    changed = [(path, size, mtime) for path, size, mtime in scanned
+               if path not in known or known[path][:2] != (size, mtime)]
+    rows = []
+    with ThreadPoolExecutor(max_workers=FINGERPRINT_THREADS) as pool:
+        futures = {pool.submit(video_fingerprint, path): (path, size, mtime) for path, size, mtime in changed}
+        for future in tqdm(futures, desc='Fingerprinting', disable=not futures):
+            path, size, mtime = futures[future]
+            try:
+                fingerprint, digest, duration, fps = future.result()
+            except OSError as e:
+                print(f"[Scan] Cannot read {path}: {str(e)}")
+                continue
+            rows.append((path, size, mtime, fingerprint, digest, duration, fps))
+            known[path] = (size, mtime, fingerprint, digest)
+    scanned_paths = {path for path, _, _ in scanned}
+    source_prefix = os.path.join(os.path.abspath(SOURCE_FOLDER), '')
+    removed = [path for path in known if path not in scanned_paths and os.path.abspath(path).startswith(source_prefix)]
+    index.update(rows, removed)
+    index.close()
+
+    changed_paths = {path for path, _, _ in changed}
+    seen_fingerprints = {}
     video_list = []
-    for root, _, files in os.walk(SOURCE_FOLDER):
+    skipped = 0
+    for path, size, mtime in scanned:
+        if path not in known or known[path][:2] != (size, mtime):
+            continue
+        _, _, fingerprint, digest = known[path]
+        # 已知内容哈希，处理记录判断改名文件时不需要再读取文件
+        with HASH_CACHE_LOCK:
+            HASH_CACHE[(path, size, mtime)] = digest
+        if fingerprint in seen_fingerprints:
+            print(f"[Scan] Skipping {path}, same content as {seen_fingerprints[fingerprint]}")
+            continue
+        seen_fingerprints[fingerprint] = path
+        root, file_name = os.path.split(path)
         relative_path = os.path.relpath(root, SOURCE_FOLDER)
         series_name = os.path.basename(root)
-        if not files:
+        unique_id = os.path.join(series_name, file_name)
+        if path not in changed_paths and skip is not None and skip(unique_id, path):
+            skipped += 1
             continue
-        for file_name in files:
-            # 检查扩展名是否为视频
-            if os.path.splitext(file_name)[1].lower() not in VIDEO_EXTENSIONS:
-                continue
-            unique_id = os.path.join(series_name, file_name)
-            file_path = os.path.join(root, file_name)
-            target_path = os.path.join(TARGET_FOLDER, relative_path, file_name)
-            frontend_processed_path = os.path.join(FRONTEND_PROCESSED_FOLDER, relative_path, file_name)
-            video_list.append((unique_id, file_path, target_path, frontend_processed_path))
+        target_path = os.path.join(TARGET_FOLDER, relative_path, file_name)
+        frontend_processed_path = os.path.join(FRONTEND_PROCESSED_FOLDER, relative_path, file_name)
+        video_list.append((unique_id, path, target_path, frontend_processed_path))
+    print(f"[Scan] {len(scanned)} videos, {len(changed)} new or changed, {skipped} unchanged and done, "
+          f"{len(video_list)} to process ({round(time.time() - start_time, 2)}s)")
     return video_list
 
 # 模拟前端处理模块
@@ -96,9 +384,10 @@ def frontend_process(video_list, frontend_processed_files):
         if STOP_EVENT.is_set():  # 检查是否收到停止信号
             print("[Frontend] frontend_process extraction interrupted.")
             break
-        if unique_id in frontend_processed_files:
+        if frontend_processed_files.contains(unique_id, file_path):
             print(f"[Frontend] Skipping {unique_id}, already processed.")
             continue
+        started = time.time()
         try:
             # 确保目标文件夹存在
             os.makedirs(os.path.dirname(frontend_processed_path), exist_ok=True)
@@ -109,8 +398,7 @@ def frontend_process(video_list, frontend_processed_files):
             shutil.copy(file_path, frontend_processed_path)  # 示例操作：复制文件
 
             # 标记为已处理
-            frontend_processed_files.add(unique_id)
-            save_processed_record(FRONTEND_PROCESSED_RECORD, frontend_processed_files)
+            frontend_processed_files.add(unique_id, file_path, frontend_processed_path, time.time() - started)
             print(f"[Frontend] Saved processed video to {frontend_processed_path}")
         except Exception as e:
             print(f"[Frontend] Error processing {unique_id}: {str(e)}")
@@ -133,9 +421,10 @@ def extract_subtitles(video_list, subtitle_processed_files):
         if STOP_EVENT.is_set():  # 检查是否收到停止信号
             print("[Frontend] Subtitle extraction interrupted.")
             break
-        if unique_id in subtitle_processed_files:
+        if subtitle_processed_files.contains(unique_id, file_path):
             print(f"[Frontend] Skipping {unique_id}, already processed.")
             continue
+        started = time.time()
         video_cap = cv2.VideoCapture(file_path)
         if video_cap is None:
             continue
@@ -174,70 +463,347 @@ def extract_subtitles(video_list, subtitle_processed_files):
                 target_srt_path = os.path.join(output_path, f"{video_name}.srt")
                 shutil.move(raw_srt_file, target_srt_path)
                 print(f"[Frontend] Subtitle saved to: {target_srt_path}")
-                subtitle_processed_files.add(unique_id)
-                save_processed_record(SUBTITLE_RECORD, subtitle_processed_files)
+                subtitle_processed_files.add(unique_id, file_path, target_srt_path, time.time() - started)
             else:
                 print(f"[Frontend] No subtitle generated for: {file_path}")
         except Exception as e:
             print(f"[Frontend] Error extracting subtitles for {file_path}: {str(e)}")
     print("[Frontend] Subtitle extraction complete.")
-# 添加一个全局的“正在处理”缓存标志
-IN_PROGRESS_CACHE = set()
-# 后端处理逻辑
-def backend_process(video_list, backend_processed_files, api_url):
+def server_url(api_url, path):
     """
-    处理指定后端服务器的任务，支持缓存以避免重复处理。
+    由后端处理接口地址得到同一服务器上其他接口的地址。
     """
-    print(f"[Backend] Starting processing with {api_url}...")
-    total_videos = len(video_list)
+    base = api_url[:-len('/process')] if api_url.endswith('/process') else api_url.rstrip('/')
+    return base + path
 
-    with tqdm(total=total_videos, desc=f'Processing with {api_url}') as pbar:
-        for unique_id, file_path, target_file_path, _ in video_list:
-            if STOP_EVENT.is_set():
-                print(f"[Backend] Processing with {api_url} interrupted.")
-                break
 
-            # 检查是否已处理或正在处理
-            with PROCESS_LOCK:
-                if unique_id in backend_processed_files or unique_id in IN_PROGRESS_CACHE:
-                    pbar.update(1)
-                    pbar.set_postfix({'Status': f"Skipped {unique_id}"})
-                    continue
-                # 标记为正在处理
-                IN_PROGRESS_CACHE.add(unique_id)
+def upload_video(api_url, file_path):
+    """
+    流式上传视频，请求体直接读取文件，不在内存中保存整个文件。
+    :return 后端返回的任务信息
+    """
+    with open(file_path, 'rb') as f:
+        response = requests.post(api_url, data=f, timeout=REQUEST_TIMEOUT,
+                                 headers={'Content-Type': 'application/octet-stream',
+                                          'X-Filename': os.path.basename(file_path)})
+    if response.status_code != 202:
+        raise RuntimeError(response.json().get('error', 'Unknown error'))
+    return response.json()
+
+
+def wait_for_job(api_url, job, abort_event=None):
+    """
+    轮询任务状态直到处理完成、失败或被取消。
+    :param abort_event 设置后不再等待(e.g. 其他服务器已完成同一视频)
+    :return 处理完成的任务信息，收到停止信号或abort_event时返回None
+    :raise RuntimeError 任务失败或在服务端被取消(e.g. 通过/jobs/<id>/cancel或服务重启)，由调用方重试
+    """
+    while job['status'] not in FINISHED_STATUSES:
+        if STOP_EVENT.wait(POLL_INTERVAL) or (abort_event is not None and abort_event.is_set()):
+            return None
+        response = requests.get(server_url(api_url, job['status_url']), timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        job = response.json()
+    if job['status'] == STATUS_FAILED:
+        raise RuntimeError(job.get('error', 'Unknown error'))
+    if job['status'] == STATUS_CANCELLED:
+        raise RuntimeError(f"Job {job.get('job_id')} was cancelled on the server")
+    return job
+
+
+def cancel_job(api_url, job):
+    """
+    通知后端取消任务，失败时忽略。
+    """
+    try:
+        requests.post(server_url(api_url, f"/jobs/{job['job_id']}/cancel"), timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        pass
+
+
+def download_result(api_url, job, target_file_path):
+    """
+    分块下载处理结果，先写入.part文件，连接中断时通过Range请求从已下载的位置继续。
+    """
+    part_path = target_file_path + '.part'
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with requests.get(server_url(api_url, job['result_url']), headers=headers, stream=True,
+                              timeout=REQUEST_TIMEOUT) as response:
+                # 416: 上次已经下载完整
+                if response.status_code not in (200, 206, 416):
+                    raise RuntimeError(response.json().get('error', f'HTTP {response.status_code}'))
+                if response.status_code != 416:
+                    # 服务端不支持Range时返回完整文件，从头写入
+                    mode = 'ab' if response.status_code == 206 else 'wb'
+                    with open(part_path, mode) as f_out:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f_out.write(chunk)
+            break
+        except requests.RequestException:
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+    os.replace(part_path, target_file_path)
+
+
+class ServerState:
+    """
+    后端服务器的并发数与吞吐量统计。
+    """
 
+    def __init__(self, api_url):
+        self.api_url = api_url
+        # 当前允许的并发数
+        self.limit = 1
+        # 正在处理的任务数
+        self.active = 0
+        # 并发数 -> 总吞吐量(字节/秒)的滑动平均
+        self.throughput = {}
+        # 单个任务的处理速度(字节/秒)的滑动平均，用于预计任务耗时
+        self.job_rate = None
+        self.failures = 0
+        # 暂停分配任务直到该时间
+        self.available_at = 0
+
+    def record_success(self, size, seconds, concurrency):
+        rate = size / max(seconds, 1e-3)
+        self.job_rate = rate if self.job_rate is None else 0.7 * self.job_rate + 0.3 * rate
+        total = rate * concurrency
+        old = self.throughput.get(concurrency)
+        self.throughput[concurrency] = total if old is None else 0.7 * old + 0.3 * total
+        self.failures = 0
+        self.adjust_limit()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= SERVER_MAX_FAILURES:
+            self.available_at = time.time() + SERVER_COOLDOWN
+            self.limit = max(1, self.limit - 1)
+            self.failures = 0
+
+    def adjust_limit(self):
+        """
+        当前并发数的吞吐量明显低于少一个并发时减少并发数；
+        明显高于少一个并发(或还没有比较对象)，且多一个并发尚未测量或更快时增加并发数。
+        """
+        current = self.throughput.get(self.limit)
+        if current is None:
+            return
+        lower = self.throughput.get(self.limit - 1)
+        higher = self.throughput.get(self.limit + 1)
+        if lower is not None and current < lower * (1 - THROUGHPUT_MARGIN):
+            self.limit -= 1
+        elif (lower is None or current > lower * (1 + THROUGHPUT_MARGIN)) and self.limit < MAX_SERVER_CONCURRENCY \
+                and (higher is None or higher > current):
+            self.limit += 1
+
+    def expected_seconds(self, size):
+        return size / self.job_rate if self.job_rate else None
+
+
+class DispatchTask:
+    """
+    一个待处理的视频。
+    """
+
+    def __init__(self, unique_id, file_path, target_path):
+        self.unique_id = unique_id
+        self.file_path = file_path
+        self.target_path = target_path
+        try:
+            self.size = os.path.getsize(file_path)
+        except OSError:
+            self.size = 0
+        self.attempts = 0
+        # 重试前需要等到该时间
+        self.not_before = 0
+        # 服务器地址 -> 开始处理的时间
+        self.running = {}
+        # 已完成或已放弃
+        self.finished = Event()
+
+
+class BackendDispatcher:
+    """
+    多台后端服务器共享一个按文件大小排序的任务队列(大文件优先)，每台服务器按测得的吞吐量调整并发数，
+    失败的任务退避后重试，队列为空时空闲的服务器重复处理明显慢于预期的任务，先完成的结果生效。
+    """
+
+    def __init__(self, api_urls, video_list, backend_processed_files):
+        self.servers = [ServerState(api_url) for api_url in api_urls]
+        self.backend_processed_files = backend_processed_files
+        self.cond = Condition()
+        self.counter = itertools.count()
+        self.queue = []
+        tasks = [DispatchTask(unique_id, file_path, target_path)
+                 for unique_id, file_path, target_path, _ in video_list
+                 if not backend_processed_files.contains(unique_id, file_path)]
+        for task in tasks:
+            self._push(task)
+        self.tasks = tasks
+        self.remaining = len(tasks)
+        self.pbar = None
+
+    def _push(self, task):
+        heapq.heappush(self.queue, (-task.size, next(self.counter), task))
+
+    def run(self):
+        print(f"[Backend] Dispatching {len(self.tasks)} videos to {len(self.servers)} servers...")
+        threads = []
+        with tqdm(total=len(self.tasks), desc='Processing with backend servers') as self.pbar:
+            for server in self.servers:
+                for _ in range(MAX_SERVER_CONCURRENCY):
+                    thread = Thread(target=self._work, args=(server,), daemon=True)
+                    thread.start()
+                    threads.append(thread)
+            for thread in threads:
+                thread.join()
+        print("[Backend] Dispatching complete.")
+
+    def _next_task(self, server):
+        """
+        为server取出下一个任务：优先取队列中最大的可执行任务，队列为空时选择其他服务器上的慢任务
+        :return (task, 是否为重复处理)，全部完成或收到停止信号时返回None
+        """
+        with self.cond:
+            while not STOP_EVENT.is_set() and self.remaining > 0:
+                now = time.time()
+                wait = 5
+                if server.available_at <= now and server.active < server.limit:
+                    task, next_ready = self._pop_ready(now)
+                    duplicate = False
+                    if task is None and next_ready is None:
+                        task = self._find_straggler(server, now)
+                        duplicate = task is not None
+                    if task is not None:
+                        task.running[server.api_url] = now
+                        server.active += 1
+                        return task, duplicate
+                    if next_ready is not None:
+                        wait = min(wait, next_ready - now)
+                elif server.available_at > now:
+                    # 服务器暂停分配任务中
+                    wait = min(wait, server.available_at - now)
+                self.cond.wait(max(wait, 0.1))
+            return None
+
+    def _pop_ready(self, now):
+        """
+        :return (最大的可执行任务, None)；没有可执行任务时返回(None, 最早的重试时间)，队列为空时为(None, None)
+        """
+        deferred = []
+        task = None
+        while self.queue:
+            item = heapq.heappop(self.queue)
+            if item[2].finished.is_set():
+                continue
+            if item[2].not_before <= now:
+                task = item[2]
+                break
+            deferred.append(item)
+        for item in deferred:
+            heapq.heappush(self.queue, item)
+        next_ready = min((item[2].not_before for item in deferred), default=None)
+        return task, (None if task is not None else next_ready)
+
+    def _find_straggler(self, server, now):
+        """
+        选择在其他服务器上已运行超过预计耗时STRAGGLER_FACTOR倍的任务，超出越多越优先
+        """
+        best, best_ratio = None, STRAGGLER_FACTOR
+        for task in self.tasks:
+            if task.finished.is_set() or len(task.running) != 1 or server.api_url in task.running:
+                continue
+            (api_url, started), = task.running.items()
+            elapsed = now - started
+            owner = next(s for s in self.servers if s.api_url == api_url)
+            expected = owner.expected_seconds(task.size) or server.expected_seconds(task.size)
+            if expected is None or elapsed < STRAGGLER_MIN_SECONDS:
+                continue
+            if elapsed / expected > best_ratio:
+                best, best_ratio = task, elapsed / expected
+        return best
+
+    def _work(self, server):
+        while True:
+            item = self._next_task(server)
+            if item is None:
+                return
+            task, duplicate = item
+            concurrency = server.active
+            started = time.time()
+            error = None
             try:
-                os.makedirs(os.path.dirname(target_file_path), exist_ok=True)
-
-                # 调用后端 API
-                with open(file_path, 'rb') as f:
-                    response = requests.post(api_url, files={'file': f})
-
-                if response.status_code == 200:
-                    with open(target_file_path, 'wb') as f_out:
-                        f_out.write(response.content)
-
-                    with PROCESS_LOCK:
-                        # 更新已处理记录
-                        backend_processed_files.add(unique_id)
-                        save_processed_record(PROCESSED_RECORD, backend_processed_files)
-
-                    pbar.set_postfix({'Status': f"Processed {unique_id}"})
-                else:
-                    error_message = response.json().get('error', 'Unknown error')
-                    log_failed_video(unique_id, error_message)
-                    pbar.set_postfix({'Status': f"Failed {unique_id}"})
+                completed = self._process(server, task)
             except Exception as e:
-                log_failed_video(unique_id, str(e))
-                pbar.set_postfix({'Status': f"Error {unique_id}"})
-            finally:
-                # 无论成功还是失败，都从缓存中移除
-                with PROCESS_LOCK:
-                    IN_PROGRESS_CACHE.remove(unique_id)
+                completed, error = False, str(e)
+            self._finish(server, task, completed, error, time.time() - started, concurrency, duplicate)
+
+    def _process(self, server, task):
+        """
+        :return 是否由本次处理得到结果；其他服务器先完成或收到停止信号时返回False
+        """
+        api_url = server.api_url
+        os.makedirs(os.path.dirname(task.target_path), exist_ok=True)
+        job = upload_video(api_url, task.file_path)
+        done_job = wait_for_job(api_url, job, task.finished)
+        if done_job is None:
+            cancel_job(api_url, job)
+            return False
+        # 每台服务器下载到各自的临时文件，先完成的替换目标文件
+        temp_path = f"{task.target_path}.{self.servers.index(server)}.tmp"
+        download_result(api_url, done_job, temp_path)
+        with self.cond:
+            if task.finished.is_set():
+                os.remove(temp_path)
+                return False
+            os.replace(temp_path, task.target_path)
+            task.finished.set()
+        return True
+
+    def _finish(self, server, task, completed, error, seconds, concurrency, duplicate):
+        with self.cond:
+            server.active -= 1
+            task.running.pop(server.api_url, None)
+            if completed:
+                server.record_success(task.size, seconds, concurrency)
+                self.remaining -= 1
+                # 更新已处理记录
+                self.backend_processed_files.add(task.unique_id, task.file_path, task.target_path, seconds)
+                self.pbar.update(1)
+                self.pbar.set_postfix({'Status': f"Processed {task.unique_id}" + (' (reassigned)' if duplicate else '')})
+            elif error is not None:
+                server.record_failure()
+                # 其他服务器仍在处理时不重试
+                if not task.finished.is_set() and not task.running:
+                    task.attempts += 1
+                    if task.attempts > MAX_RETRIES:
+                        log_failed_video(task.unique_id, error)
+                        task.finished.set()
+                        self.remaining -= 1
+                        self.pbar.update(1)
+                        self.pbar.set_postfix({'Status': f"Failed {task.unique_id}"})
+                    else:
+                        task.not_before = time.time() + RETRY_BACKOFF * 2 ** (task.attempts - 1)
+                        self._push(task)
+                        self.pbar.set_postfix({'Status': f"Retry {task.unique_id} ({task.attempts}/{MAX_RETRIES})"})
+            elif not task.finished.is_set() and not task.running:
+                # 收到停止信号而中断
+                self._push(task)
+            self.cond.notify_all()
+
 
-            pbar.update(1)
+# 后端处理逻辑
+def backend_process(video_list, backend_processed_files, api_urls):
+    """
+    将视频分配给多台后端服务器处理。
+    """
+    BackendDispatcher(api_urls, video_list, backend_processed_files).run()
 
-    print(f"[Backend] Processing with {api_url} complete.")
 
 if __name__ == '__main__':
     try:
@@ -250,17 +816,18 @@ if __name__ == '__main__':
         frontend_processed_files = load_processed_record(FRONTEND_PROCESSED_RECORD)
         subtitle_processed_files = load_processed_record(SUBTITLE_RECORD)
 
-        # 获取待处理文件列表
-        video_list = get_video_list()
+        # 获取待处理文件列表，未变化且字幕提取与后端处理都已完成的视频不再列出
+        video_list = get_video_list(skip=lambda unique_id, file_path: (
+            subtitle_processed_files.contains(unique_id, file_path)
+            and backend_processed_files.contains(unique_id, file_path)))
 
         # 启动前端、字幕提取和后端的独立线程
         #frontend_thread = Thread(target=frontend_process, args=(video_list, frontend_processed_files))
         subtitle_thread = Thread(target=extract_subtitles,daemon=True, args=(video_list, subtitle_processed_files))
         backend_threads = []
-        for api_url in BACKEND_SERVERS:
-            thread = Thread(target=backend_process, args=(video_list, backend_processed_files, api_url))
-            backend_threads.append(thread)
-            thread.start()
+        thread = Thread(target=backend_process, args=(video_list, backend_processed_files, BACKEND_SERVERS))
+        backend_threads.append(thread)
+        thread.start()
 
         #frontend_thread.start()
         subtitle_thread.start()